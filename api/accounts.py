@@ -0,0 +1,314 @@
+"""Several upstream accounts per provider, with load balancing.
+
+One account can only hunt so many trains at once (the upstream rate-limits
+it and refuses duplicate reservations), so watch work is spread over every
+configured account:
+
+* search and polling go to the account with the most rate budget left,
+  weighted by its recent health;
+* the reserve for a request always goes to the account that owns it, picked
+  by rendezvous (highest-random-weight) hashing on the request key, so retries
+  of one request never end up holding seats on two accounts. If the owner is
+  cooling down, the next account in that request's ranking takes over.
+
+Configure with environment variables (the single ``SRT_ID``/``SRT_PW`` and
+``KTX_ID``/``KTX_PW`` pairs still work and are added to the list)::
+
+    SRT_ACCOUNTS='[{"id": "010-1234-5678", "pw": "..."}, {"id": "...", "pw": "...", "rate": 0.5}]'
+    KTX_ACCOUNTS='[{"id": "...", "pw": "...", "handle": "family"}]'
+
+Accounts are shown to the browser by an opaque ``handle`` only: the
+configured one, or an HMAC of the login id under a server key
+(``server_keys``), which cannot be computed or checked without the key.
+
+A lease waits for its account's rate budget for at most ``MAX_LEASE_WAIT``
+and raises ``AccountBusyError`` beyond that. Logged-in clients are kept per
+account between leases (at most ``CLIENT_TTL``), so a lease logs in only when
+no idle client of that account is left.
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import server_keys
+
+RATE = 1.0  # requests per second, per account
+BURST = 5.0  # requests an idle account may send back to back
+HEALTH_DECAY = 0.2  # weight of the latest outcome in the health average
+MIN_HEALTH = 0.05
+COOLDOWN = 5.0  # seconds, doubled for every consecutive failure
+MAX_COOLDOWN = 5 * 60  # seconds
+MAX_LEASE_WAIT = 10.0  # seconds a lease may wait for rate budget
+CLIENT_TTL = 10 * 60  # seconds an idle client is reused
+
+ENV_VARS = {
+    "SRT": ("SRT_ACCOUNTS", "SRT_ID", "SRT_PW"),
+    "KTX": ("KTX_ACCOUNTS", "KTX_ID", "KTX_PW"),
+}
+
+_registries: Dict[str, "AccountRegistry"] = {}
+_registries_lock = threading.Lock()
+
+
+class NoAccountError(LookupError):
+    pass
+
+
+class AccountBusyError(RuntimeError):
+    """The account's rate budget is spent further ahead than ``MAX_LEASE_WAIT``."""
+
+
+class Account:
+    """One set of credentials plus its token bucket and health.
+
+    Args:
+        provider: "SRT" or "KTX"
+        account_id: Login id (membership number, e-mail or phone number)
+        password: Login password
+        rate: Sustained requests per second this account may send
+        burst: Token bucket size
+        handle: Configured ``handle``; derived from the login id if not given
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        account_id: str,
+        password: str,
+        rate: float = RATE,
+        burst: float = BURST,
+        handle: str | None = None,
+    ) -> None:
+        self.provider = provider
+        self.id = account_id
+        self.password = password
+        self._handle = handle
+        self.rate = rate
+        self.burst = burst
+        self.health = 1.0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def __repr__(self) -> str:
+        return f"Account({self.provider}, {self.masked_id})"
+
+    @property
+    def masked_id(self) -> str:
+        """For display only: different ids can mask to the same string."""
+        return self.id[:3] + "*" * max(0, len(self.id) - 5) + self.id[-2:]
+
+    @property
+    def handle(self) -> str:
+        """Opaque id handed to the frontend and resolved by ``AccountRegistry.get``.
+
+        The configured handle, or an HMAC of the login id under the server's
+        account-handle key: stable wherever ``SERVER_SECRET`` is shared, and
+        no help in guessing the id or the password.
+        """
+        if self._handle:
+            return self._handle
+        data = f"{self.provider}\0{self.id}".encode("utf-8")
+        return hmac.new(server_keys.key("account-handle"), data, hashlib.sha256).hexdigest()[:16]
+
+    def tokens(self, now: float) -> float:
+        return min(self.burst, self._tokens + (now - self._updated) * self.rate)
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def score(self, now: float) -> float:
+        """Preference for load-balanced work: remaining budget times health."""
+        return self.tokens(now) * self.health / (1 + self.in_flight)
+
+    def take(self, now: float, max_wait: float | None = None) -> float | None:
+        """Spend one token; return how long to wait before sending (0 if none).
+
+        Returns None, spending nothing, if that wait would exceed ``max_wait``.
+        """
+        tokens = self.tokens(now) - 1
+        wait = 0.0 if tokens >= 0 else -tokens / self.rate
+        if max_wait is not None and wait > max_wait:
+            return None
+        self._tokens, self._updated = tokens, now
+        return wait
+
+    def succeeded(self) -> None:
+        self.health += HEALTH_DECAY * (1 - self.health)
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    def failed(self, now: float) -> None:
+        self.health = max(MIN_HEALTH, self.health * (1 - HEALTH_DECAY))
+        self.failures += 1
+        self.cooldown_until = now + min(MAX_COOLDOWN, COOLDOWN * 2 ** (self.failures - 1))
+
+    def as_dict(self, now: float) -> dict:
+        return {
+            "account": self.masked_id,
+            "handle": self.handle,
+            "health": round(self.health, 3),
+            "tokens": round(self.tokens(now), 2),
+            "in_flight": self.in_flight,
+            "cooldown": round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+
+class AccountRegistry:
+    """Accounts of one provider and the policy that spreads work over them.
+
+    Args:
+        provider: "SRT" or "KTX"
+        accounts: Accounts to balance over
+        client_factory: Builds a logged-in client from ``(account_id, password)``
+
+    Examples:
+        >>> registry = AccountRegistry("SRT", accounts, srt_client)
+        >>> with registry.lease() as (account, client):
+        ...     client.search_train(...)
+        >>> with registry.lease(key="SRT:20250101:305") as (account, client):
+        ...     client.reserve(train)
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        accounts: List[Account],
+        client_factory: Callable[[str, str], Any],
+    ) -> None:
+        if not accounts:
+            raise NoAccountError(f"No {provider} accounts configured")
+        self.provider = provider
+        self.accounts = accounts
+        self._client_factory = client_factory
+        self._idle: Dict[str, List[Tuple[float, Any]]] = {}  # account id -> (created, client), reusable
+        self._lock = threading.Lock()
+
+    def get(self, account_id: str) -> Account:
+        """Account by login id or ``Account.handle``."""
+        for account in self.accounts:
+            if account_id in (account.id, account.handle):
+                return account
+        raise NoAccountError(f"Unknown {self.provider} account: {account_id}")
+
+    def ranking(self, key: str) -> List[Account]:
+        """Accounts ordered by rendezvous weight for ``key``; the first one owns it."""
+        def weight(account: Account) -> bytes:
+            return hashlib.sha256(f"{key}\0{account.id}".encode("utf-8")).digest()
+
+        return sorted(self.accounts, key=weight, reverse=True)
+
+    def owner(self, key: str) -> Account:
+        """Account that reserves for ``key``, skipping owners that are cooling down."""
+        now = time.monotonic()
+        ranking = self.ranking(key)
+        return next((a for a in ranking if a.available(now)), ranking[0])
+
+    def pick(self) -> Account:
+        """Account with the most budget and health left, for search/poll work."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [a for a in self.accounts if a.available(now)] or self.accounts
+            return max(candidates, key=lambda a: a.score(now))
+
+    @contextmanager
+    def lease(
+        self,
+        key: str | None = None,
+        account: Account | str | None = None,
+        neutral: Callable[[BaseException], bool] | None = None,
+    ) -> Iterator[tuple]:
+        """Yield ``(account, client)`` for one unit of work and record its outcome.
+
+        Args:
+            key: Request key; when given, the request owner is used
+            account: Use this account (or account id) instead
+            neutral: Returns True for errors that say nothing about the
+                account (e.g. sold out), which are not held against it
+
+        The call waits for the account's rate budget before yielding, for at
+        most ``MAX_LEASE_WAIT``; beyond that it raises ``AccountBusyError``.
+        The client is an idle one of the account if there is one, and goes
+        back to the idle clients unless the work failed on the account.
+        """
+        if isinstance(account, str):
+            account = self.get(account)
+        account = account or (self.owner(key) if key else self.pick())
+
+        with self._lock:
+            delay = account.take(time.monotonic(), MAX_LEASE_WAIT)
+            if delay is None:
+                raise AccountBusyError(f"{self.provider} account {account.masked_id} is busy; try again shortly")
+            account.in_flight += 1
+        created, client = None, None
+        try:
+            if delay:
+                time.sleep(delay)
+            created, client = self._checkout(account)
+            yield account, client
+        except BaseException as ex:
+            if not (neutral and neutral(ex)):
+                client = None  # its session may be what failed; log in afresh next time
+                with self._lock:
+                    account.failed(time.monotonic())
+            raise
+        else:
+            with self._lock:
+                account.succeeded()
+        finally:
+            with self._lock:
+                account.in_flight -= 1
+                if client is not None:
+                    self._idle.setdefault(account.id, []).append((created, client))
+
+    def _checkout(self, account: Account) -> Tuple[float, Any]:
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(account.id, [])
+            while idle:
+                created, client = idle.pop()
+                if now - created < CLIENT_TTL:
+                    return created, client
+        return now, self._client_factory(account.id, account.password)
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [account.as_dict(now) for account in self.accounts]
+
+
+def load_accounts(provider: str) -> List[Account]:
+    """Read the accounts configured for ``provider`` from the environment."""
+    list_var, id_var, pw_var = ENV_VARS[provider]
+    accounts: List[Account] = []
+    for entry in json.loads(os.environ.get(list_var) or "[]"):
+        accounts.append(
+            Account(
+                provider,
+                entry["id"],
+                entry["pw"],
+                rate=float(entry.get("rate", RATE)),
+                burst=float(entry.get("burst", BURST)),
+                handle=entry.get("handle"),
+            )
+        )
+
+    legacy_id, legacy_pw = os.environ.get(id_var), os.environ.get(pw_var)
+    if legacy_id and legacy_pw and all(a.id != legacy_id for a in accounts):
+        accounts.insert(0, Account(provider, legacy_id, legacy_pw))
+    return accounts
+
+
+def registry(provider: str, client_factory: Callable[[str, str], Any]) -> AccountRegistry:
+    """Return the process-wide registry for ``provider``, built on first use."""
+    with _registries_lock:
+        if provider not in _registries:
+            _registries[provider] = AccountRegistry(provider, load_accounts(provider), client_factory)
+        return _registries[provider]
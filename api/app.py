@@ -1,25 +1,50 @@
-import json # json 모듈 추가
-from pywebpush import webpush, WebPushException # pywebpush 추가
+import importlib
 import sys
 import os
+import threading
+from contextlib import contextmanager
 from flask import Flask, request, jsonify
 from enum import Enum
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
-import srt
-import ktx
-from dotenv import load_dotenv
+# 콜드 스타트를 줄이기 위해 여기서는 표준 라이브러리만 쓰는 모듈만 불러옵니다.
+# srt/ktx(curl_cffi, pycryptodome)와 pywebpush는 실제로 필요한 라우트에서 처음 쓸 때 불러옵니다.
+import train_handle
+import open_sale
+import group_booking
+import stations
+import payment_watchdog
+import standby_monitor
+import clock
+import transport
+import session_store
+import accounts
+import push
+import inflight
+import watch
+import availability
+import scheduler
+import reservation_cache as reservation_caches
+import round_trip
 
-from srt import SRTResponseError, SRTLoginError, SRTError
-from ktx import SoldOutError, KorailError, TrainType, NoResultsError
+# 배포 환경은 환경 변수를 직접 주입하므로 .env 파일이 있을 때만 python-dotenv를 불러옵니다.
+if (current_dir / '.env').exists() or (current_dir.parent / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv()
 
-load_dotenv()
 app = Flask(__name__)
-push_subscription = None
+push_service = push.from_env()
 
 # --- Helper to add to_dict() methods to classes ---
 def add_to_dict_method(cls):
+    # property 목록은 클래스마다 한 번만 계산해 두고 to_dict() 호출마다 MRO를 다시 훑지 않습니다.
+    property_names = list(dict.fromkeys(
+        attr for base_class in reversed(cls.__mro__)
+        for attr, value in base_class.__dict__.items() if isinstance(value, property)
+    ))
+
     def to_dict(self):
         d = {}
 
@@ -34,11 +59,8 @@ def add_to_dict_method(cls):
             return value
 
         # 클래스의 속성(property)들을 처리합니다.
-        for base_class in reversed(cls.__mro__):
-            for attr, value in base_class.__dict__.items():
-                if isinstance(value, property):
-                    prop_value = getattr(self, attr)
-                    d[attr] = serialize_value(prop_value) # 헬퍼 함수 사용
+        for attr in property_names:
+            d[attr] = serialize_value(getattr(self, attr)) # 헬퍼 함수 사용
 
         # 인스턴스 변수들을 처리합니다.
         for attr, value in self.__dict__.items():
@@ -53,15 +75,81 @@ def add_to_dict_method(cls):
     cls.to_dict = to_dict
     return cls
 
+class LazyProvider:
+    """열차 모듈을 첫 속성 접근 시에만 불러오고, 그때 한 번 필요한 클래스에 to_dict()를 붙입니다."""
+
+    def __init__(self, name, to_dict_classes):
+        self._name = name
+        self._to_dict_classes = to_dict_classes
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    for cls_name in self._to_dict_classes:
+                        add_to_dict_method(getattr(module, cls_name))
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
 # Add .to_dict() to necessary classes from libraries
-add_to_dict_method(srt.SRTTrain)
-add_to_dict_method(srt.SRTReservation)
-add_to_dict_method(srt.SRTTicket)
-add_to_dict_method(ktx.Schedule)
-add_to_dict_method(ktx.Train)
-add_to_dict_method(ktx.Reservation)
-add_to_dict_method(ktx.Ticket)
-add_to_dict_method(ktx.Seat)
+srt = LazyProvider('srt', ('SRTTrain', 'SRTReservation', 'SRTTicket'))
+ktx = LazyProvider('ktx', ('Schedule', 'Train', 'Reservation', 'Ticket', 'Seat'))
+
+def loaded_errors(*names):
+    """이미 불러온 열차 모듈의 예외 클래스들을 튜플로 돌려줍니다.
+
+    except 절에서 쓰면 예외를 검사할 때 평가되므로, 한 번도 쓰지 않은 모듈을 오류 처리 때문에 불러오지 않습니다.
+    불러오지 않은 모듈의 예외는 발생할 수 없으므로 빠져도 괜찮습니다.
+    """
+    modules = [sys.modules[name] for name in ('srt', 'ktx') if name in sys.modules]
+    return tuple(getattr(module, name) for module in modules for name in names if hasattr(module, name))
+
+def srt_client(srt_id=None, srt_pw=None):
+    """환경 변수의 SRT 계정으로 클라이언트를 만듭니다. SESSION_STORE가 설정되어 있으면 저장된 로그인 세션을 이어 씁니다."""
+    return srt.SRT(srt_id or os.environ.get('SRT_ID'), srt_pw or os.environ.get('SRT_PW'), session_store=session_store.from_env())
+
+def ktx_client(ktx_id=None, ktx_pw=None):
+    """환경 변수의 코레일 계정으로 클라이언트를 만듭니다. SESSION_STORE가 설정되어 있으면 저장된 로그인 세션을 이어 씁니다."""
+    return ktx.Korail(ktx_id or os.environ.get('KTX_ID'), ktx_pw or os.environ.get('KTX_PW'), session_store=session_store.from_env())
+
+def account_registry(train_type):
+    """열차 종류별 계정 레지스트리입니다. 설정된 계정이 없으면 accounts.NoAccountError가 발생합니다."""
+    if train_type not in ('SRT', 'KTX'):
+        raise ValueError(f"알 수 없는 열차 종류({train_type})입니다.")
+    return accounts.registry(train_type, srt_client if train_type == 'SRT' else ktx_client)
+
+def request_key(train_type, dep, arr, date, train_number):
+    """같은 열차를 노리는 요청은 항상 같은 계정이 예약하도록 묶는 키입니다."""
+    return f"{train_type}:{dep}:{arr}:{date}:{train_number}"
+
+_warmed_up = False
+
+@app.before_request
+def warm_up():
+    """첫 요청이 들어오면 예매 경로의 무거운 모듈을 백그라운드에서 미리 불러오고 업스트림 연결을 데워 둡니다."""
+    global _warmed_up
+    if _warmed_up:
+        return
+    _warmed_up = True
+
+    def preload():
+        for provider in (srt, ktx):
+            provider._load()
+        for name in ('Crypto.Cipher.AES', 'Crypto.Util.Padding', 'pywebpush', 'py_vapid'):
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+        # 업스트림 호스트에 미리 연결해 두고, 유휴 연결은 주기적으로 깨워 둡니다.
+        transport.start()
+
+    threading.Thread(target=preload, name='warm-up', daemon=True).start()
 
 # --- API Routes ---
 @app.route('/api/vapid_public_key')
@@ -73,32 +161,67 @@ def vapid_public_key():
 
 @app.route('/api/subscribe', methods=['POST'])
 def subscribe():
-    global push_subscription
-    push_subscription = request.json
+    """브라우저 구독을 (사용자, 기기)별로 저장합니다. 같은 기기가 다시 보내면 덮어씁니다.
+
+    사용자는 요청 본문이 아니라 서버가 서명한 watcher 쿠키로 정하므로 다른 사람의 알림을 구독할 수 없습니다.
+    쿠키가 없으면 새로 발급합니다. 같은 브라우저의 예약 요청에도 이 쿠키가 실려 오므로 예약 알림은 그 사용자에게만 갑니다.
+    """
+    data = request.json or {}
+    # 예전 프론트엔드는 구독 객체 자체를 보냅니다.
+    subscription = data.get('subscription', data)
+    user, set_cookie = request_user(), None
+    if user is None:
+        user, set_cookie = watch.issue_watcher()
+    try:
+        device = push_service.store.add(user, subscription)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error_message': f'잘못된 구독 정보입니다: {e}'}), 400
     app.logger.info("Subscription received.")
-    return jsonify({'success': True}), 201
+    response = jsonify({'success': True, 'device': device})
+    if set_cookie:
+        response.headers.add('Set-Cookie', set_cookie)
+    return response, 201
+
+@app.route('/api/subscribe', methods=['DELETE'])
+def unsubscribe():
+    data = request.json or {}
+    subscription = data.get('subscription', data)
+    if not subscription.get('endpoint'):
+        return jsonify({'error_message': '구독 정보가 필요합니다.'}), 400
+    push_service.store.remove(request_user() or push.DEFAULT_USER, push.device_id(subscription))
+    return jsonify({'success': True})
+
+@app.route('/api/push-status')
+def push_status():
+    return jsonify({'subscriptions': len(push_service.store), **push_service.stats})
+
+def request_user():
+    """요청을 보낸 브라우저의 사용자 id(서버가 서명한 watcher 쿠키)입니다. 쿠키가 없거나 위조되었으면 None입니다."""
+    return watch.watcher(request.cookies.get(watch.WATCHER_COOKIE))
 
-def send_push_notification(title, body):
-    global push_subscription
-    if push_subscription is None:
-        app.logger.warning("No push subscription available to send notification.")
+def send_push_notification(title, body, user):
+    """user가 구독한 기기에만 알림을 보냅니다. 발송 큐에 넣고 바로 돌아오며, 실제 전송은 백그라운드 워커가 합니다.
+    사용자를 모르면(쿠키 없는 요청, 이 서버 밖에서 한 예약) 다른 사람에게 가지 않도록 보내지 않습니다."""
+    if user is None:
         return
+    push_service.send(title, body, user=user)
 
-    try:
-        webpush(
-            subscription_info=push_subscription,
-            data=json.dumps({"title": title, "body": body}),
-            vapid_private_key=os.environ.get("VAPID_PRIVATE_KEY"),
-            vapid_claims={"sub": os.environ.get("VAPID_ADMIN_EMAIL")}
-        )
-        app.logger.info("Push notification sent successfully.")
-    except WebPushException as ex:
-        app.logger.error(f"WebPushException: {ex}")
-        # 푸시 구독이 만료되었을 수 있으므로 삭제
-        if ex.response and ex.response.status_code == 410:
-            push_subscription = None
-    except Exception as e:
-        app.logger.error(f"An error occurred while sending push notification: {e}")
+# 결제 기한·예약대기 알림을 받을 사용자입니다. 예약한 요청의 사용자를 예약 번호별로 기억합니다.
+RESERVATION_USERS_MAX = 10000
+_reservation_users = {}  # (열차 종류, 예약 번호) -> 사용자 id
+_reservation_users_lock = threading.Lock()
+
+def remember_reservation_user(train_type, reservation, user):
+    if user is None:
+        return
+    with _reservation_users_lock:
+        _reservation_users[(train_type, reservation_caches.reservation_id(reservation))] = user
+        while len(_reservation_users) > RESERVATION_USERS_MAX:
+            _reservation_users.pop(next(iter(_reservation_users)))
+
+def reservation_user(train_type, pnr):
+    with _reservation_users_lock:
+        return _reservation_users.get((train_type, pnr))
 
 @app.route('/api/search')
 def search():
@@ -119,34 +242,198 @@ def search():
         'adults': request.args.get('adults')
     }
 
+    # 역 이름은 업스트림에 보내기 전에 로컬 색인으로 확인하고 정식 이름으로 맞춥니다.
+    if train_type in ('SRT', 'KTX'):
+        try:
+            dep_station, arr_station = stations.index().validate(train_type, dep_station, arr_station)
+        except stations.UnknownStationError as e:
+            return jsonify({'error_message': str(e), 'station': e.name, 'suggestions': e.suggestions}), 400
+        except ValueError as e:
+            return jsonify({'error_message': str(e)}), 400
+
     try:
         trains = []
         if train_type == 'SRT':
-            srt_client = srt.SRT(srt_id="-", srt_pw="-", auto_login=False)
-            trains = srt_client.search_train(
+            client = srt.SRT(srt_id="-", srt_pw="-", auto_login=False)
+            trains = client.search_train(
                 dep=dep_station, arr=arr_station, date=date_str, time=time_str, available_only=False
             )
         elif train_type == 'KTX':
-            ktx_client = ktx.Korail(korail_id="-", korail_pw="-", auto_login=False)
-            trains = ktx_client.search_train(
+            client = ktx.Korail(korail_id="-", korail_pw="-", auto_login=False)
+            trains = client.search_train(
                 dep=dep_station, arr=arr_station, date=date_str, time=time_str,
                 include_no_seats=True,
                 train_type=ktx.TrainType.KTX
             )
 
-        response_data['trains'] = [train.to_dict() for train in trains]
+        response_data['trains'] = [
+            {**train.to_dict(), 'handle': train_handle.encode(train_type, train)} for train in trains
+        ]
+        if not any(train.seat_available if train_type == 'SRT' else train.has_seat for train in trains):
+            response_data['alternatives'] = stations.index()[train_type].alternatives(dep_station, arr_station, distance=2)
         return jsonify(response_data)
 
-    except (SRTResponseError, NoResultsError) as e:
+    except loaded_errors('SRTResponseError', 'NoResultsError') as e:
         # SRT, KTX 조회 결과가 없을 때 발생하는 오류를 여기서 처리합니다.
-        # 오류 대신, 비어있는 trains 리스트를 포함한 정상 응답(200)을 보냅니다.
+        # 오류 대신, 비어있는 trains 리스트와 근처 출발/도착역 후보를 포함한 정상 응답(200)을 보냅니다.
         app.logger.info(f"No train results: {e}") # 서버 로그에는 정보로 남김
+        response_data['alternatives'] = stations.index()[train_type].alternatives(dep_station, arr_station, distance=2)
         return jsonify(response_data)
     except Exception as e:
         # 그 외 예상치 못한 다른 모든 오류는 500 오류로 처리합니다.
         app.logger.error(f"An unexpected error occurred: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+_split_search = None
+_split_search_lock = threading.Lock()
+
+def split_journey_search():
+    """구간 분할 검색기는 처음 쓸 때 한 번만 만듭니다. 구간 검색 결과 캐시와 작업 스레드를 요청 사이에 공유합니다."""
+    global _split_search
+    if _split_search is None:
+        with _split_search_lock:
+            if _split_search is None:
+                import split_journey
+                # 조회는 로그인이 필요 없으므로 구간마다 익명 클라이언트를 씁니다(스레드마다 별도 세션).
+                _split_search = split_journey.SplitJourneySearch(
+                    lambda dep, arr, date, time: srt.SRT(srt_id="-", srt_pw="-", auto_login=False).search_train(
+                        dep=dep, arr=arr, date=date, time=time, available_only=False
+                    )
+                )
+    return _split_search
+
+@app.route('/api/split-search')
+def split_search():
+    """직통 구간이 매진일 때, 같은 열차를 중간역에서 나눠 탈 수 있는 조합(예: 수서→대전 + 대전→부산)을 찾습니다. 현재 SRT만 지원합니다."""
+    train_type = request.args.get('type', 'SRT')
+    if train_type != 'SRT':
+        return jsonify({'error_message': "구간 분할 검색은 SRT만 지원합니다."}), 400
+    dep_station, arr_station = request.args.get('dep'), request.args.get('arr')
+    date_val, time_val = request.args.get('date'), request.args.get('time')
+    if not (dep_station and arr_station and date_val and time_val):
+        return jsonify({'error_message': "출발역, 도착역, 날짜, 시간 정보가 필요합니다."}), 400
+    try:
+        dep_station, arr_station = stations.index().validate(train_type, dep_station, arr_station)
+    except stations.UnknownStationError as e:
+        return jsonify({'error_message': str(e), 'station': e.name, 'suggestions': e.suggestions}), 400
+    except ValueError as e:
+        return jsonify({'error_message': str(e)}), 400
+
+    try:
+        journeys = split_journey_search().find(
+            dep_station, arr_station, date_val.replace('-', ''), time_val.replace(':', '') + '00',
+            train_number=request.args.get('train_number'),
+            seat_type=request.args.get('seat_type'),
+        )
+        return jsonify({'journeys': [
+            {**journey.to_dict(), 'legs': [
+                {**leg.to_dict(), 'handle': train_handle.encode(train_type, leg)} for leg in (journey.first, journey.second)
+            ]}
+            for journey in journeys
+        ]})
+    except Exception as e:
+        app.logger.error(f"An unexpected error occurred during split search: {e}", exc_info=True)
+        return jsonify({'error_message': str(e)}), 500
+
+def is_sold_out(error):
+    msg = str(error)
+    return isinstance(error, loaded_errors('SoldOutError')) or "잔여석없음" in msg or "Sold out" in msg or "매진" in msg
+
+def is_account_neutral(error):
+    """계정 상태와 무관한 오류(매진, 조회 결과 없음, 잘못된 요청)는 계정 건강도에 반영하지 않습니다."""
+    return is_sold_out(error) or isinstance(
+        error, loaded_errors('NoResultsError', 'UnconfirmedReservationError') + (ValueError, TypeError, LookupError)
+    )
+
+def search_with_registry(registry, train_type, dep, arr, date, time, train_number):
+    """조회는 남은 요청 한도와 건강도가 가장 좋은 계정에 나눠 맡깁니다."""
+    with registry.lease(neutral=is_account_neutral) as (_, client):
+        return search_target_train(client, train_type, dep, arr, date, time, train_number)
+
+def search_target_train(client, train_type, dep, arr, date, time, train_number):
+    # 조회 결과 표에서 열차 번호만 골라내고, 그 한 행만 열차 객체로 만듭니다.
+    if train_type == 'SRT':
+        table = client.search_table(dep=dep, arr=arr, date=date, time=time)
+    else:
+        table = client.search_table(dep=dep, arr=arr, date=date, time=time, train_type=ktx.TrainType.KTX)
+    return next(iter(table.filter(train_number=train_number).head(1).to_trains()), None)
+
+def reserve_train(client, train_type, handle, train_number, passengers, reserve_option, search):
+    """/api/search가 발급한 handle로 재조회 없이 바로 예약합니다.
+
+    handle에는 좌석 상태가 없으므로 원하는 등급의 좌석을 먼저 요청합니다. handle이 없거나 거부되었을 때(서명 불일치, 만료),
+    그리고 매진으로 거절되어 좌석 상태가 바뀐 것을 알았을 때만 다시 검색해서 현재 상태(다른 등급, 예약대기)로 예약합니다.
+    그 밖의 오류는 예약이 되었는지 알 수 없으므로 다시 예약하지 않고 그대로 올려보냅니다.
+    """
+    if handle:
+        try:
+            target_train = train_handle.decode(handle, train_type)
+            if (target_train.train_number if train_type == 'SRT' else target_train.train_no) != train_number:
+                raise train_handle.InvalidHandleError("Train handle does not match train_number")
+        except train_handle.InvalidHandleError as e:
+            app.logger.info(f"Train handle rejected, falling back to search: {e}")
+        else:
+            try:
+                return target_train, client.reserve(target_train, passengers=passengers, option=reserve_option)
+            except loaded_errors('SRTResponseError', 'KorailError') as e:
+                if not is_sold_out(e):
+                    raise
+                app.logger.info(f"Seat state changed since the search, searching again: {e}")
+
+    target_train = search()
+    if not target_train:
+        return None, None
+    return target_train, client.reserve(target_train, passengers=passengers, option=reserve_option)
+
+reserves_in_flight = inflight.InFlight()
+
+def reserve_once(registry, train_type, dep, arr, date, time, train_number, passengers, reserve_option, handle):
+    """같은 계정·열차·날짜·구간·인원·좌석 등급의 예약이 진행 중이면 새로 보내지 않고 그 결과를 함께 받습니다.
+
+    Idempotency-Key 헤더(또는 idempotency_key 폼 값)가 같은 예약 내용의 이전 요청과 같으면 그 요청의 결과를 돌려줍니다.
+    열차를 찾지 못하면 None을 돌려줍니다.
+    """
+    # 예약은 요청 키의 소유 계정이, 재검색은 여유 있는 계정이 맡습니다.
+    # 소유 계정은 한 번만 정합니다. 그 사이 계정이 쉬는 상태로 바뀌어도 잠그는 계정과 예약하는 계정이 같습니다.
+    key = request_key(train_type, dep, arr, date, train_number)
+    owner = registry.owner(key)
+    user = request_user()
+
+    def book():
+        try:
+            with registry.lease(account=owner, neutral=is_account_neutral) as (account, client):
+                target_train, reservation = reserve_train(
+                    client, train_type, handle, train_number, passengers, reserve_option,
+                    search=lambda: search_with_registry(registry, train_type, dep, arr, date, time, train_number)
+                )
+        except loaded_errors('UnconfirmedReservationError') as e:
+            # 예약은 되었을 수 있으므로 재시도하지 않도록 예약 번호를 알려 주고, 예매 내역은 다시 불러옵니다.
+            reservation_cache.invalidate(train_type, owner.id)
+            return {
+                'unconfirmed': e.rsv_id, 'account': owner.handle, 'account_label': owner.masked_id,
+                'error_message': f"예약 번호 {e.rsv_id}가 발급되었지만 예매 내역에서 확인하지 못했습니다. 다시 예약하지 말고 예매 내역을 확인해 주세요.",
+            }
+        if not target_train:
+            return None
+
+        # 예매 성공 알림 보내기
+        dep_name = target_train.dep_station_name if train_type == 'SRT' else target_train.dep_name
+        arr_name = target_train.arr_station_name if train_type == 'SRT' else target_train.arr_name
+        send_push_notification(
+            title="✅ 예매 성공!",
+            body=f"{dep_name} → {arr_name} 열차 예매에 성공했습니다.",
+            user=user,
+        )
+        reservation_cache.add(train_type, account.id, reservation)
+        track_reservation(train_type, account.id, reservation, user=user)
+        return {'reservation': {**reservation.to_dict(), 'account': account.handle, 'account_label': account.masked_id}}
+
+    idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    flight = inflight.reserve_key(
+        train_type, owner.id, train_number, date, dep, arr, passengers, reserve_option
+    )
+    return reserves_in_flight.run(flight, book, idempotency_key=idempotency_key)
+
 @app.route('/api/reserve', methods=['POST'])
 def reserve():
     try:
@@ -165,46 +452,37 @@ def reserve():
         adults = int(form_data.get('adults', 1))
         seat_type = form_data.get('seat_type')
 
-        client, passengers, reserve_option, all_trains = (None, [], None, [])
+        passengers, reserve_option = ([], None)
 
         if train_type == 'SRT':
-            srt_id, srt_pw = os.environ.get('SRT_ID'), os.environ.get('SRT_PW')
-            if not (srt_id and srt_pw): return jsonify({'error_message': "SRT 로그인 정보가 서버에 설정되지 않았습니다."}), 400
-            client = srt.SRT(srt_id, srt_pw)
-            all_trains = client.search_train(dep=dep_station, arr=arr_station, date=date_str, time=time_str, available_only=False)
             passengers = [srt.Adult(adults)]
             reserve_option = srt.SeatType.GENERAL_ONLY if seat_type == 'GENERAL' else srt.SeatType.SPECIAL_ONLY
 
         elif train_type == 'KTX':
-            ktx_id, ktx_pw = os.environ.get('KTX_ID'), os.environ.get('KTX_PW')
-            if not (ktx_id and ktx_pw): return jsonify({'error_message': "KTX 로그인 정보가 서버에 설정되지 않았습니다."}), 400
-            client = ktx.Korail(ktx_id, ktx_pw)
-            all_trains = client.search_train(dep=dep_station, arr=arr_station, date=date_str, time=time_str, include_no_seats=True, train_type=ktx.TrainType.KTX)
             passengers = [ktx.AdultPassenger(adults)]
             reserve_option = ktx.ReserveOption.GENERAL_ONLY if seat_type == 'GENERAL' else ktx.ReserveOption.SPECIAL_ONLY
 
-        target_train = next((train for train in all_trains if (train.train_number if train_type == 'SRT' else train.train_no) == train_number), None)
+        try:
+            registry = account_registry(train_type)
+        except accounts.NoAccountError:
+            return jsonify({'error_message': f"{train_type} 로그인 정보가 서버에 설정되지 않았습니다."}), 400
 
-        if not target_train: return jsonify({'error_message': "선택한 열차를 찾을 수 없습니다."}), 404
-
-        reservation = client.reserve(target_train, passengers=passengers, option=reserve_option)
-
-        # 예매 성공 알림 보내기
-        dep = target_train.dep_station_name if train_type == 'SRT' else target_train.dep_name
-        arr = target_train.arr_station_name if train_type == 'SRT' else target_train.arr_name
-        send_push_notification(
-            title="✅ 예매 성공!",
-            body=f"{dep} → {arr} 열차 예매에 성공했습니다."
+        result = reserve_once(
+            registry, train_type, dep_station, arr_station, date_str, time_str, train_number,
+            passengers, reserve_option, form_data.get('handle')
         )
-        return jsonify({'reservation': reservation.to_dict()})
+        if not result: return jsonify({'error_message': "선택한 열차를 찾을 수 없습니다."}), 404
+        return jsonify(result)
 
-    except (SRTLoginError) as e:
+    except accounts.AccountBusyError as e:
+        return jsonify({'error_message': str(e)}), 429
+    except loaded_errors('SRTLoginError') as e:
         return jsonify({'error_message': f'로그인 실패: {e}'}), 401
-    except (SRTResponseError, SoldOutError, SRTError, KorailError) as e:
+    except loaded_errors('SRTResponseError', 'SoldOutError', 'SRTError', 'KorailError') as e:
         msg = str(e)
-        if "잔여석없음" in msg or "Sold out" in msg or "매진" in msg:
+        if is_sold_out(e):
             return jsonify({'retry': True, 'message': '매진. 5초 후 재시도합니다.'})
-        if isinstance(e, KorailError):
+        if isinstance(e, loaded_errors('KorailError')):
             return jsonify({'error_message': f'오류: {e}'}), 401
         return jsonify({'error_message': msg}), 500
     except Exception as e:
@@ -226,51 +504,630 @@ def auto_retry():
         adults = int(form_data.get('adults', 1))
         seat_type = form_data.get('seat_type', 'GENERAL')
 
-        client, search_options, passengers, reserve_option = (None, {}, [], None)
+        passengers, reserve_option = ([], None)
 
         if train_type == 'SRT':
-            client = srt.SRT(os.environ.get('SRT_ID'), os.environ.get('SRT_PW'))
-            search_options, passengers = {'available_only': False}, [srt.Adult(adults)]
+            passengers = [srt.Adult(adults)]
             reserve_option = srt.SeatType.GENERAL_ONLY if seat_type == 'GENERAL' else srt.SeatType.SPECIAL_ONLY
         elif train_type == 'KTX':
-            client = ktx.Korail(os.environ.get('KTX_ID'), os.environ.get('KTX_PW'))
-            search_options = {'include_no_seats': True, 'train_type': ktx.TrainType.KTX}
             passengers, reserve_option = [ktx.AdultPassenger(adults)], ktx.ReserveOption.GENERAL_ONLY if seat_type == 'GENERAL' else ktx.ReserveOption.SPECIAL_ONLY
 
-        all_trains = client.search_train(dep=dep, arr=arr, date=date, time=time, **search_options)
-        target_train = next((t for t in all_trains if (t.train_number if train_type == 'SRT' else t.train_no) == train_number), None)
-        if not target_train: return jsonify({'error_message': "선택한 열차를 찾을 수 없습니다."}), 404
-
-        reservation = client.reserve(target_train, passengers=passengers, option=reserve_option)
-        # 예매 성공 알림 보내기
-        dep = target_train.dep_station_name if train_type == 'SRT' else target_train.dep_name
-        arr = target_train.arr_station_name if train_type == 'SRT' else target_train.arr_name
-        send_push_notification(
-            title="✅ 예매 성공!",
-            body=f"{dep} → {arr} 열차 예매에 성공했습니다."
+        registry = account_registry(train_type)
+        result = reserve_once(
+            registry, train_type, dep, arr, date, time, train_number,
+            passengers, reserve_option, form_data.get('handle')
         )
-        return jsonify({'reservation': reservation.to_dict()})
+        if not result: return jsonify({'error_message': "선택한 열차를 찾을 수 없습니다."}), 404
+        return jsonify(result)
 
-    except (SRTResponseError, SoldOutError, SRTError, KorailError) as e:
+    except accounts.AccountBusyError:
+        # 계정의 요청 한도가 한참 뒤까지 차 있으면 기다리지 않고 재시도로 돌립니다.
+        return jsonify({'retry': True, 'message': '계정이 바쁩니다. 5초 후 재시도합니다.'})
+    except accounts.NoAccountError as e:
+        return jsonify({'error_message': str(e)}), 400
+    except loaded_errors('SRTResponseError', 'SoldOutError', 'SRTError', 'KorailError') as e:
         msg = str(e)
-        if "잔여석없음" in msg or "Sold out" in msg or "매진" in msg:
+        if is_sold_out(e):
             return jsonify({'retry': True, 'message': '매진. 5초 후 재시도합니다.'})
         return jsonify({'error_message': msg}), 500
     except Exception as e: return jsonify({'error_message': str(e)}), 500
 
+@app.route('/api/open-sale', methods=['POST'])
+def schedule_open_sale():
+    """예매 오픈 시각에 맞춰 미리 로그인/NetFunnel/예약 요청을 준비해 두었다가 정각에 예약을 보냅니다."""
+    try:
+        form_data = request.form
+        train_type = form_data.get('type')
+        dep, arr = form_data.get('dep'), form_data.get('arr')
+        date_val, time_val = form_data.get('date'), form_data.get('time')
+        open_at_val = form_data.get('open_at')
+        if not date_val or not time_val or not open_at_val:
+            return jsonify({'error_message': '오픈 예약에 필요한 날짜, 시간 또는 오픈 시각 정보가 없습니다.'}), 400
+
+        date, time = date_val.replace('-', ''), time_val.replace(':', '') + '00'
+        train_number = form_data.get('train_number')
+        adults = int(form_data.get('adults', 1))
+        seat_type = form_data.get('seat_type', 'GENERAL')
+        # 오픈 시각은 한국 시간(KST) 기준 'YYYY-MM-DD HH:MM[:SS]' 형식입니다.
+        open_at = datetime.fromisoformat(open_at_val).replace(tzinfo=timezone(timedelta(hours=9))).timestamp()
+
+        if train_type == 'SRT':
+            passengers = [srt.Adult(adults)]
+            reserve_option = srt.SeatType.GENERAL_ONLY if seat_type == 'GENERAL' else srt.SeatType.SPECIAL_ONLY
+        elif train_type == 'KTX':
+            passengers = [ktx.AdultPassenger(adults)]
+            reserve_option = ktx.ReserveOption.GENERAL_ONLY if seat_type == 'GENERAL' else ktx.ReserveOption.SPECIAL_ONLY
+        else:
+            return jsonify({'error_message': f"알 수 없는 열차 종류({train_type})입니다."}), 400
+
+        # 오픈 예약도 요청 키의 소유 계정으로 보내고, 로그인은 작업이 LOGIN_LEAD 전에 직접 합니다.
+        registry = account_registry(train_type)
+        owner = registry.owner(request_key(train_type, dep, arr, date, train_number))
+        client_factory = lambda: (srt_client if train_type == 'SRT' else ktx_client)(owner.id, owner.password)
+
+        train = None
+        if form_data.get('handle'):
+            try:
+                train = train_handle.decode(form_data.get('handle'), train_type)
+            except train_handle.InvalidHandleError as e:
+                app.logger.info(f"Train handle rejected, open-sale job will search: {e}")
+
+        user = request_user()
+        def notify(reservation):
+            send_push_notification(
+                title="✅ 오픈 예매 성공!",
+                body=f"{dep} → {arr} 열차 예매에 성공했습니다.",
+                user=user,
+            )
+            track_reservation(train_type, owner.id, reservation, user=user)
+
+        job = open_sale.OpenSaleJob(
+            train_type, client_factory, open_at, passengers, reserve_option,
+            train=train,
+            search=lambda client: search_target_train(client, train_type, dep, arr, date, time, train_number),
+            attempts=int(form_data.get('attempts', 3)),
+            stagger=int(form_data.get('stagger_ms', 150)) / 1000,
+            clock_host='srt' if train_type == 'SRT' else 'korail',
+            notify=notify,
+            on_change=lambda job: watch.changes.notify(('open-sale', job.id)),
+        )
+        clock.upstream.start()
+        open_sale.schedule(job)
+        return jsonify({'job': job.report()}), 202
+
+    except ValueError as e:
+        return jsonify({'error_message': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"An unexpected error occurred while scheduling open-sale job: {e}", exc_info=True)
+        return jsonify({'error_message': str(e)}), 500
+
+def open_sale_report(job):
+    """오픈 예약 작업 상태와, 변경 여부를 판단할 부분(시계 추정치는 계속 바뀌므로 제외)을 돌려줍니다."""
+    report = job.report()
+    report['reservation'] = job.reservation.to_dict() if job.reservation else None
+    return report, {k: v for k, v in report.items() if k != 'clock'}
+
+@app.route('/api/open-sale/<job_id>', methods=['GET', 'DELETE'])
+def open_sale_status(job_id):
+    job = open_sale.get(job_id)
+    if not job:
+        return jsonify({'error_message': "오픈 예약 작업을 찾을 수 없습니다."}), 404
+    if request.method == 'DELETE':
+        job.cancel()
+    return jsonify({'job': open_sale_report(job)[0]})
+
+@app.route('/api/open-sale/<job_id>/watch')
+def open_sale_watch(job_id):
+    """작업 상태가 etag와 달라지면 응답하는 롱 폴링입니다. WSGI 서버에서는 기다리지 않고 바로 응답합니다(asgi.py 참고)."""
+    job = open_sale.get(job_id)
+    if not job:
+        return jsonify({'error_message': "오픈 예약 작업을 찾을 수 없습니다."}), 404
+    report, state = open_sale_report(job)
+    tag = watch.etag(state)
+    return jsonify({'job': report, 'etag': tag, 'changed': tag != request.args.get('etag')})
+
+def candidate_trains(client, train_type, dep, arr, date, time, train_number, window_minutes):
+    """선택한 열차를 맨 앞에 두고, 그 열차와 출발 시각 차이가 window_minutes 이내인 열차를 가까운 순서로 붙입니다."""
+    requested = datetime.strptime(date + time, '%Y%m%d%H%M%S')
+    start = max(requested - timedelta(minutes=window_minutes), requested.replace(hour=0, minute=0, second=0))
+    if train_type == 'SRT':
+        table = client.search_table(dep=dep, arr=arr, date=date, time=start.strftime('%H%M%S'))
+    else:
+        table = client.search_table(dep=dep, arr=arr, date=date, time=start.strftime('%H%M%S'), train_type=ktx.TrainType.KTX)
+
+    target = table.filter(train_number=train_number)
+    if not len(target):
+        return []
+    # 출발 시각 차이로 거르고 정렬하는 일은 표에서 하고, 남은 열차만 객체로 만듭니다.
+    trains = table.around(int(target['dep_at'][0]), window_minutes).to_trains()
+    number = lambda t: t.train_number if train_type == 'SRT' else t.train_no
+    return sorted(trains, key=lambda t: number(t) != train_number)
+
+@app.route('/api/group-reserve', methods=['POST'])
+def schedule_group_booking():
+    """한 번에 좌석이 모자라는 단체를 나눠서(같은 열차 또는 인접 열차) 예약하고, 기한 안에 다 못 앉히면 모두 취소합니다."""
+    try:
+        form_data = request.form
+        train_type = form_data.get('type')
+        dep, arr = form_data.get('dep'), form_data.get('arr')
+        date_val, time_val = form_data.get('date'), form_data.get('time')
+        if not date_val or not time_val:
+            return jsonify({'error_message': '단체 예약에 필요한 날짜 또는 시간 정보가 없습니다.'}), 400
+
+        date, time = date_val.replace('-', ''), time_val.replace(':', '') + '00'
+        train_number = form_data.get('train_number')
+        adults, children = int(form_data.get('adults', 1)), int(form_data.get('children', 0))
+        seat_type = form_data.get('seat_type', 'GENERAL')
+
+        if train_type == 'SRT':
+            passengers = [srt.Adult(adults)] + ([srt.Child(children)] if children else [])
+            reserve_option = srt.SeatType.GENERAL_ONLY if seat_type == 'GENERAL' else srt.SeatType.SPECIAL_ONLY
+        elif train_type == 'KTX':
+            passengers = [ktx.AdultPassenger(adults)] + ([ktx.ChildPassenger(children)] if children else [])
+            reserve_option = ktx.ReserveOption.GENERAL_ONLY if seat_type == 'GENERAL' else ktx.ReserveOption.SPECIAL_ONLY
+        else:
+            return jsonify({'error_message': f"알 수 없는 열차 종류({train_type})입니다."}), 400
+
+        registry = account_registry(train_type)
+        with registry.lease(neutral=is_account_neutral) as (_, client):
+            trains = candidate_trains(client, train_type, dep, arr, date, time, train_number, int(form_data.get('window_minutes', 60)))
+        if not trains: return jsonify({'error_message': "선택한 열차를 찾을 수 없습니다."}), 404
+
+        # 동시에 잡는 소그룹마다 요청 키 기준 순위대로 다른 계정을 씁니다(같은 계정의 같은 열차 중복 예약 방지).
+        # 계정보다 소그룹이 많으면 남는 소그룹은 한 계정에서 차례로 잡습니다.
+        ranking = registry.ranking(request_key(train_type, dep, arr, date, train_number))
+        def client_factory(slot):
+            account = ranking[slot]
+            return (srt_client if train_type == 'SRT' else ktx_client)(account.id, account.password)
+
+        user = request_user()
+        def notify(job):
+            send_push_notification(
+                title="✅ 단체 예매 성공!",
+                body=f"{dep} → {arr} {len(job.reservations)}건으로 {group_booking.party_size(passengers)}명 예매에 성공했습니다.",
+                user=user,
+            )
+            for placement in job.placements:
+                reservation_cache.add(train_type, client_account_id(placement.client), placement.reservation)
+                track_reservation(train_type, client_account_id(placement.client), placement.reservation, user=user)
+
+        job = group_booking.GroupBooking(
+            train_type, client_factory, passengers, reserve_option, trains,
+            deadline=float(form_data.get('deadline', group_booking.DEADLINE)),
+            min_group=int(form_data.get('min_group', 1)),
+            allow_standby=form_data.get('allow_standby', 'false').lower() == 'true',
+            slots=len(ranking),
+            notify=notify,
+            on_change=lambda job: watch.changes.notify(('group-reserve', job.id)),
+        )
+        group_booking.schedule(job)
+        return jsonify({'job': job.report()}), 202
+
+    except ValueError as e:
+        return jsonify({'error_message': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"An unexpected error occurred while scheduling group booking: {e}", exc_info=True)
+        return jsonify({'error_message': str(e)}), 500
+
+def group_booking_report(job):
+    report = job.report()
+    report['reservations'] = [r.to_dict() for r in job.reservations]
+    return report, report
+
+@app.route('/api/group-reserve/<job_id>', methods=['GET', 'DELETE'])
+def group_booking_status(job_id):
+    job = group_booking.get(job_id)
+    if not job:
+        return jsonify({'error_message': "단체 예약 작업을 찾을 수 없습니다."}), 404
+    if request.method == 'DELETE':
+        job.cancel()
+    return jsonify({'job': group_booking_report(job)[0]})
+
+@app.route('/api/group-reserve/<job_id>/watch')
+def group_booking_watch(job_id):
+    job = group_booking.get(job_id)
+    if not job:
+        return jsonify({'error_message': "단체 예약 작업을 찾을 수 없습니다."}), 404
+    report, state = group_booking_report(job)
+    tag = watch.etag(state)
+    return jsonify({'job': report, 'etag': tag, 'changed': tag != request.args.get('etag')})
+
+def leg_train(registry, train_type, handle, dep, arr, date, time, train_number):
+    """/api/search가 발급한 handle이 있으면 재조회 없이, 없거나 거부되면 검색해서 열차를 찾습니다."""
+    if handle:
+        try:
+            train = train_handle.decode(handle, train_type)
+            if (train.train_number if train_type == 'SRT' else train.train_no) == train_number:
+                return train
+        except train_handle.InvalidHandleError as e:
+            app.logger.info(f"Train handle rejected, falling back to search: {e}")
+    return search_with_registry(registry, train_type, dep, arr, date, time, train_number)
+
+@app.route('/api/round-trip', methods=['POST'])
+def round_trip_reserve():
+    """가는 열차와 오는 열차를 함께 예약합니다.
+
+    두 방향을 동시에 찾고, 코레일은 두 여정을 한 번의 예약 요청으로, SRT는 두 예약 요청을 동시에 보냅니다.
+    한쪽만 예약되면 cancel_on_failure(기본값 true)에 따라 다른 쪽을 취소합니다.
+    """
+    try:
+        form_data = request.form
+        train_type = form_data.get('type')
+        dep, arr = form_data.get('dep'), form_data.get('arr')
+        legs = {
+            'outbound': (dep, arr, form_data.get('date'), form_data.get('time'),
+                         form_data.get('train_number'), form_data.get('handle')),
+            'return': (arr, dep, form_data.get('return_date'), form_data.get('return_time'),
+                       form_data.get('return_train_number'), form_data.get('return_handle')),
+        }
+        if not all(leg[2] and leg[3] and leg[4] for leg in legs.values()):
+            return jsonify({'error_message': '왕복 예약에 필요한 날짜, 시간 또는 열차 번호가 누락되었습니다.'}), 400
+        legs = {
+            name: (d, a, date.replace('-', ''), time.replace(':', '') + '00', number, handle)
+            for name, (d, a, date, time, number, handle) in legs.items()
+        }
+        adults = int(form_data.get('adults', 1))
+        seat_type = form_data.get('seat_type', 'GENERAL')
+        rollback = form_data.get('cancel_on_failure', 'true').lower() == 'true'
+
+        if train_type == 'SRT':
+            passengers = [srt.Adult(adults)]
+            reserve_option = srt.SeatType.GENERAL_ONLY if seat_type == 'GENERAL' else srt.SeatType.SPECIAL_ONLY
+        elif train_type == 'KTX':
+            passengers = [ktx.AdultPassenger(adults)]
+            reserve_option = ktx.ReserveOption.GENERAL_ONLY if seat_type == 'GENERAL' else ktx.ReserveOption.SPECIAL_ONLY
+        else:
+            return jsonify({'error_message': f"알 수 없는 열차 종류({train_type})입니다."}), 400
+
+        registry = account_registry(train_type)
+
+        def find(leg):
+            d, a, date, time, number, handle = legs[leg]
+            return leg_train(registry, train_type, handle, d, a, date, time, number)
+
+        # 두 구간은 한 계정으로 예약하되(함께 결제·취소), 동시에 보내므로 구간마다 세션을 따로 씁니다.
+        outbound = legs['outbound']
+        key = request_key(train_type, outbound[0], outbound[1], outbound[2], outbound[4])
+        with registry.lease(key=key, neutral=is_account_neutral) as (account, client), \
+                registry.lease(account=account, neutral=is_account_neutral) as (_, return_client):
+            clients = {'outbound': client, 'return': return_client}
+
+            def reserve_both(outbound_train, return_train):
+                try:
+                    return client.reserve_round_trip(outbound_train, return_train, passengers=passengers, option=reserve_option)
+                except loaded_errors('UnconfirmedReservationError'):
+                    # 예약 번호가 이미 발급되었으므로 구간별로 다시 예약하면 중복 예약이 됩니다.
+                    raise
+                except loaded_errors('KorailError') + (ValueError,) as e:
+                    # 예약 번호가 발급되기 전에 거절된 경우만 구간별 예약으로 넘어갑니다.
+                    # 매진이면 한쪽만 남겨도 되는 경우(cancel_on_failure=false)에만 다른 쪽을 따로 시도합니다.
+                    if is_sold_out(e) and rollback:
+                        raise
+                    raise round_trip.CombinedUnsupported(str(e)) from e
+
+            trip = round_trip.RoundTrip(
+                find,
+                reserve=lambda leg, train: clients[leg].reserve(train, passengers=passengers, option=reserve_option),
+                cancel=lambda leg, reservation: clients[leg].cancel(reservation),
+                reserve_both=reserve_both if train_type == 'KTX' else None,
+                rollback=rollback,
+            ).run()
+
+        reservations = trip.reservations
+        user = request_user()
+        for reservation in reservations.values():
+            reservation_cache.add(train_type, account.id, reservation)
+            track_reservation(train_type, account.id, reservation, user=user)
+        if trip.state != 'succeeded':
+            # 확인하지 못한 예약이나 취소된 구간이 있을 수 있으므로 예매 내역을 다시 불러옵니다.
+            reservation_cache.invalidate(train_type, account.id)
+        body = {
+            'round_trip': trip.report(),
+            'reservations': {leg: {**r.to_dict(), 'account': account.handle, 'account_label': account.masked_id} for leg, r in reservations.items()},
+        }
+        if trip.state != 'succeeded':
+            return jsonify({**body, 'error_message': f"왕복 예약에 실패했습니다: {trip.error}"}), 409
+
+        send_push_notification(title="✅ 왕복 예매 성공!", body=f"{dep} ⇄ {arr} 왕복 열차 예매에 성공했습니다.", user=user)
+        return jsonify(body)
+
+    except accounts.AccountBusyError as e:
+        return jsonify({'error_message': str(e)}), 429
+    except accounts.NoAccountError as e:
+        return jsonify({'error_message': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"An unexpected error occurred during round-trip booking: {e}", exc_info=True)
+        return jsonify({'error_message': str(e)}), 500
+
+_watch_clients = {'SRT': [], 'KTX': []}
+_watch_clients_lock = threading.Lock()
+
+@contextmanager
+def watch_client(train_type):
+    """구간 감시용 익명 클라이언트를 빌려줍니다. 클라이언트는 요청마다 새로 만들지 않고 돌려받아 다시 쓰므로,
+    세션과 NetFunnel 키 캐시가 틱 사이에 유지됩니다. 동시에 도는 검색 수만큼만 만들어집니다(보통 열차 종류별 하나)."""
+    with _watch_clients_lock:
+        idle = _watch_clients[train_type]
+        client = idle.pop() if idle else None
+    if client is None:
+        if train_type == 'SRT':
+            client = srt.SRT(srt_id="-", srt_pw="-", auto_login=False)
+        else:
+            client = ktx.Korail(korail_id="-", korail_pw="-", auto_login=False)
+    try:
+        yield client
+    finally:
+        with _watch_clients_lock:
+            _watch_clients[train_type].append(client)
+
+def search_route(route):
+    """감시 중인 구간을 익명 클라이언트로 검색합니다. 열차가 없으면 None을 돌려줍니다."""
+    train_type, dep, arr, date, time = route
+    try:
+        with watch_client(train_type) as client:
+            if train_type == 'SRT':
+                return client.search_table(dep=dep, arr=arr, date=date, time=time)
+            return client.search_table(dep=dep, arr=arr, date=date, time=time, train_type=ktx.TrainType.KTX)
+    except loaded_errors('NoResultsError') as e:
+        app.logger.info(f"No train results while watching {route}: {e}")
+        return None
+
+# 좌석 감시, 예약대기 감시, 예매 내역 갱신은 한 스케줄러에서 사용자별로 공평하게, 열차 종류별 한도 안에서 돌립니다.
+background_polls = scheduler.Scheduler(scheduler.budgets_from_env())
+
+# 같은 구간을 보는 감시자는 구간 검색 하나를 나눠 씁니다. 좌석 상태가 바뀌면 롱 폴링 중인 감시자를 깨웁니다.
+seat_availability = availability.AvailabilityPoller(
+    search_route, lambda route: watch.changes.notify(('availability', route)), scheduler=background_polls
+)
+
+def watcher_id(watcher):
+    """감시 요청을 보낸 사용자입니다. 서버가 서명해 발급한 watcher 쿠키로 구분합니다(요청 인자나 접속 주소는 믿지 않습니다).
+    쿠키가 없거나 위조된 요청은 모두 한 익명 사용자로 묶고, 다음 요청부터 구분되도록 새 쿠키의 Set-Cookie 값을 함께 돌려줍니다.
+
+    Returns:
+        (사용자 id, Set-Cookie 값 또는 None)
+    """
+    if watcher:
+        return watcher, None
+    return availability.ANONYMOUS, watch.issue_watcher()[1]
+
+def availability_request(args):
+    """감시 요청의 구간과 열차 번호 목록입니다. 역 이름이 잘못되었으면 ValueError(또는 UnknownStationError)가 발생합니다."""
+    train_type = args.get('type')
+    if train_type not in ('SRT', 'KTX'):
+        raise ValueError(f"알 수 없는 열차 종류({train_type})입니다.")
+    date, time = args.get('date'), args.get('time')
+    if not date or not time:
+        raise ValueError('감시할 날짜 또는 시간 정보가 없습니다.')
+    dep, arr = stations.index().validate(train_type, args.get('dep'), args.get('arr'))
+    trains = [t for t in (args.get('train') or '').split(',') if t]
+    route = (train_type, dep, arr, date.replace('-', ''), time.replace(':', '')[:4].ljust(4, '0') + '00')
+    return route, trains
+
+@app.route('/api/watch/availability')
+def availability_watch():
+    """선택한 열차들의 좌석 상태입니다. etag와 같으면 asgi.py에서는 바뀔 때까지 기다리고, WSGI 서버에서는 바로 응답합니다."""
+    try:
+        route, trains = availability_request(request.args)
+    except stations.UnknownStationError as e:
+        return jsonify({'error_message': str(e), 'station': e.name, 'suggestions': e.suggestions}), 400
+    except ValueError as e:
+        return jsonify({'error_message': str(e)}), 400
+    user, set_cookie = watcher_id(watch.watcher(request.cookies.get(watch.WATCHER_COOKIE)))
+    if not seat_availability.ready(route):
+        try:
+            seat_availability.refresh(route, user)
+        except Exception as e:
+            return jsonify({'error_message': str(e)}), 502
+    payload, state = seat_availability.snapshot(route, trains, user)
+    tag = watch.etag(state)
+    response = jsonify({**payload, 'etag': tag, 'changed': tag != request.args.get('etag')})
+    if set_cookie:
+        response.headers.add('Set-Cookie', set_cookie)
+    return response
+
+@app.route('/api/watch/availability/status')
+def availability_watch_status():
+    """감시 중인 구간과 구간별 검색 횟수를 반환합니다."""
+    return jsonify({'routes': seat_availability.status()})
+
+@app.route('/api/polls')
+def background_polls_status():
+    """백그라운드 감시 스케줄러의 대기·실행 중인 작업 수, 열차 종류별 남은 한도, 사용자별 받은 감시 횟수를 반환합니다."""
+    return jsonify(background_polls.status())
+
+@app.route('/api/clock')
+def clock_status():
+    """업스트림 서버별 시계 오차 추정치(오프셋, 오차 범위, 왕복 시간)를 반환합니다."""
+    return jsonify(clock.upstream.status())
+
+@app.route('/api/accounts')
+def accounts_status():
+    """열차 종류별 계정의 남은 요청 한도, 건강도, 대기(쿨다운) 시간을 반환합니다."""
+    status = {}
+    for train_type in ('SRT', 'KTX'):
+        try:
+            status[train_type] = account_registry(train_type).status()
+        except accounts.NoAccountError:
+            status[train_type] = []
+    return jsonify(status)
+
+def accounts_to_search(registry, account_id):
+    """요청에 계정이 지정되어 있으면 그 계정만, 아니면 설정된 모든 계정을 순서대로 돌려줍니다."""
+    return [registry.get(account_id)] if account_id else registry.accounts
+
 @app.route('/api/reservations')
 def reservations():
     results = {'srt_reservations': [], 'ktx_reservations': [], 'srt_error': None, 'ktx_error': None}
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+    for train_type in ('SRT', 'KTX'):
+        prefix, errors = train_type.lower(), []
+        try:
+            registry = account_registry(train_type)
+        except accounts.NoAccountError as e:
+            results[f'{prefix}_error'] = str(e)
+            continue
+        # 계정별 예매 내역을 모아 어느 계정의 예매인지 'account'로 표시합니다.
+        # 내역은 캐시에서 읽고, refresh=true이면 업스트림에서 다시 불러옵니다.
+        for account in registry.accounts:
+            try:
+                raw = reservation_cache.listing(train_type, account.id, fresh=refresh)
+                results[f'{prefix}_reservations'] += [{**r.to_dict(), 'account': account.handle, 'account_label': account.masked_id} for r in raw]
+            except Exception as e: errors.append(f"{account.masked_id}: {e}")
+        results[f'{prefix}_error'] = '; '.join(errors) or None
+    return jsonify(results)
+
+def fetch_reservations(train_type, account_id):
+    """예매 내역 캐시가 호출합니다. 계정의 예약과 발권된 승차권을 모두 불러옵니다."""
+    registry = account_registry(train_type)
+    with registry.lease(account=account_id, neutral=is_account_neutral) as (_, client):
+        return client.get_reservations() if train_type == 'SRT' else client.tickets() + client.reservations()
+
+def fetch_reservation(train_type, account_id, pnr_no):
+    """예매 내역 캐시에 없는 예약 번호 하나를 찾습니다. 계정의 예매가 몇 건이든 요청 수가 일정합니다."""
+    registry = account_registry(train_type)
+    with registry.lease(account=account_id, neutral=is_account_neutral) as (_, client):
+        if train_type == 'SRT':
+            return [r for r in client.get_reservations(with_tickets=False) if r.reservation_number == pnr_no]
+        # 결제 전이면 예약, 결제 후면 승차권입니다.
+        found = client.reservation(pnr_no) or client.ticket(pnr_no)
+        return [found] if found else []
+
+def reservations_loaded(train_type, account_id, reservations):
+    """예매 내역을 새로 불러올 때마다 호출됩니다. 결제·취소되어 목록에서 사라진 미결제 예약은 결제 기한 감시에서 뺍니다."""
+    try:
+        payment_deadlines.sync(train_type, account_id, reservations)
+        if train_type == 'SRT':
+            for r in reservations:
+                standby_reservations.track(account_id, r)
+    except Exception as e:
+        app.logger.warning(f"Could not watch reservations: {e}")
+
+# 계정별 예매 내역을 예약 번호로 색인해 두고, 예약·결제·취소·환불 때 함께 고칩니다.
+reservation_cache = reservation_caches.ReservationCache(
+    fetch_reservations, fetch_one=fetch_reservation, loaded=reservations_loaded, scheduler=background_polls
+)
+
+def find_unpaid(train_type, pnr_no, account_ids):
+    """결제할 예약의 (계정 id, 예약)입니다. SRT는 결제되지 않은 예약, 코레일은 발권된 승차권이 아닌 예약(rsv_id)만 결제할 수 있습니다."""
+    match = (lambda r: not r.paid) if train_type == 'SRT' else (lambda r: hasattr(r, 'rsv_id'))
+    return reservation_cache.find(train_type, pnr_no, account_ids, match=match)
+
+def pay_reservation(client, train_type, target, card):
+    """card는 폼 데이터나 카드 보관함에 저장된 dict(card_number, card_password, card_birthday, card_expire_date)입니다."""
+    if train_type == 'SRT':
+        client.pay_with_card(
+            target,
+            number=card.get('card_number'),
+            password=card.get('card_password'),
+            validation_number=card.get('card_birthday'),
+            expire_date=card.get('card_expire_date')
+        )
+    else:
+        client.pay_with_card(
+            target,
+            card_number=card.get('card_number'),
+            card_password=card.get('card_password'),
+            birthday=card.get('card_birthday'),
+            card_expire=card.get('card_expire_date')
+        )
+
+CARD_FIELDS = ('card_number', 'card_password', 'card_birthday', 'card_expire_date')
+
+def stored_card(train_type, account_id):
+    vault = payment_watchdog.card_vault()
+    return vault.load(f'card:{train_type}', account_id) if vault else None
+
+def auto_pay(deadline):
+    """결제 기한 감시기가 기한 전에 호출합니다. 보관함의 카드로 결제하고 성공 여부를 돌려줍니다."""
+    card = stored_card(deadline.provider, deadline.account)
+    if not card:
+        return False
+    found = find_unpaid(deadline.provider, deadline.pnr, [deadline.account])
+    if not found:
+        return False
+    registry = account_registry(deadline.provider)
+    with registry.lease(account=deadline.account, neutral=is_account_neutral) as (_, client):
+        pay_reservation(client, deadline.provider, found[1], card)
+    reservation_cache.invalidate(deadline.provider, deadline.account)
+    return True
+
+payment_deadlines = payment_watchdog.PaymentWatchdog(
+    notify=lambda title, body, deadline: send_push_notification(
+        title=title, body=body, user=reservation_user(deadline.provider, deadline.pnr)
+    ),
+    pay=auto_pay,
+    has_card=lambda provider, account_id: stored_card(provider, account_id) is not None,
+)
+
+def fetch_standby_status(account_id):
+    """예약대기 감시기가 호출합니다. 승차권 조회 없이 예약 상태만 한 번에 가져옵니다."""
+    registry = account_registry('SRT')
+    with registry.lease(account=account_id, neutral=is_account_neutral) as (_, client):
+        return client.get_reservations(with_tickets=False)
+
+standby_reservations = standby_monitor.StandbyMonitor(
+    fetch=fetch_standby_status,
+    notify=lambda title, body, standby: send_push_notification(
+        title=title, body=body, user=reservation_user('SRT', standby.pnr)
+    ),
+    on_seat=lambda account_id, reservation: seat_assigned(account_id, reservation),
+    scheduler=background_polls,
+)
+
+def seat_assigned(account_id, reservation):
+    """좌석이 배정되면 그때부터 결제 기한이 흐르므로 결제 기한 감시기에 넘기고, 캐시된 내역을 새로 불러옵니다."""
+    payment_deadlines.track('SRT', account_id, reservation)
+    reservation_cache.invalidate('SRT', account_id)
+
+def client_account_id(client):
+    return getattr(client, 'srt_id', None) or getattr(client, 'korail_id', None)
+
+def track_reservation(train_type, account_id, reservation, user=None):
+    """미결제 예약은 결제 기한 감시기에, SRT 예약대기는 예약대기 감시기에 등록합니다.
+    감시기 알림은 예약한 사용자(user)에게 갑니다. 감시기 오류가 예약 응답을 막지 않도록 로그만 남깁니다."""
+    remember_reservation_user(train_type, reservation, user)
     try:
-        client = srt.SRT(os.environ.get('SRT_ID'), os.environ.get('SRT_PW'))
-        results['srt_reservations'] = [r.to_dict() for r in client.get_reservations()]
-    except Exception as e: results['srt_error'] = str(e)
+        payment_deadlines.track(train_type, account_id, reservation)
+        if train_type == 'SRT':
+            standby_reservations.track(account_id, reservation)
+    except Exception as e:
+        app.logger.warning(f"Could not watch reservation: {e}")
+
+@app.route('/api/payment-card', methods=['POST', 'DELETE'])
+def payment_card():
+    """계정별 결제 카드를 암호화된 보관함(CARD_VAULT)에 저장/삭제합니다. 저장된 카드는 결제 기한 전에 자동 결제에 쓰입니다."""
+    data = request.form
+    train_type = data.get('train_type')
+    vault = payment_watchdog.card_vault()
+    if not vault:
+        return jsonify({'error_message': "카드 보관함(CARD_VAULT, CARD_VAULT_KEY)이 서버에 설정되지 않았습니다."}), 400
     try:
-        client = ktx.Korail(os.environ.get('KTX_ID'), os.environ.get('KTX_PW'))
-        raw = client.tickets() + client.reservations()
-        results['ktx_reservations'] = [r.to_dict() for r in raw]
-    except Exception as e: results['ktx_error'] = str(e)
-    return jsonify(results)
+        registry = account_registry(train_type)
+        targets = accounts_to_search(registry, data.get('account'))
+    except (ValueError, LookupError) as e:
+        return jsonify({'error_message': str(e)}), 400
+
+    if request.method == 'DELETE':
+        for account in targets:
+            vault.delete(f'card:{train_type}', account.id)
+        return jsonify({'message': "저장된 카드를 삭제했습니다."})
+
+    card = {field: data.get(field) for field in CARD_FIELDS}
+    if not all(card.values()):
+        return jsonify({'error_message': "카드 정보가 누락되었습니다."}), 400
+    for account in targets:
+        vault.save(f'card:{train_type}', account.id, card)
+    return jsonify({'message': "카드를 저장했습니다. 미결제 예약은 결제 기한 전에 자동으로 결제됩니다."}), 201
+
+@app.route('/api/payment-deadlines')
+def payment_deadline_status():
+    return jsonify({'deadlines': payment_deadlines.pending()})
+
+@app.route('/api/standby')
+def standby_status():
+    """감시 중인 SRT 예약대기와 다음 확인 시각을 반환합니다."""
+    return jsonify({'standby': standby_reservations.pending()})
 
 @app.route('/api/pay', methods=['POST'])
 def pay():
@@ -281,44 +1138,28 @@ def pay():
 
         if not train_type or not pnr_no:
             return jsonify({'error_message': "결제 요청에 필요한 정보가 누락되었습니다."}), 400
+        if train_type not in ('SRT', 'KTX'):
+            return jsonify({'error_message': f"알 수 없는 열차 종류({train_type})입니다."}), 400
 
-        if train_type == 'SRT':
-            client = srt.SRT(os.environ.get('SRT_ID'), os.environ.get('SRT_PW'))
-            reservations = client.get_reservations()
-            target = next((r for r in reservations if r.reservation_number == pnr_no), None)
-            
-            if not target:
-                return jsonify({'error_message': "결제할 SRT 예매 내역을 찾을 수 없습니다."}), 404
-            
-            client.pay_with_card(
-                target,
-                number=data.get('card_number'),
-                password=data.get('card_password'),
-                validation_number=data.get('card_birthday'),
-                expire_date=data.get('card_expire_date')
-            )
-            return jsonify({'message': f"SRT 예매({pnr_no})가 정상적으로 결제되었습니다."})
+        registry = account_registry(train_type)
+        found = find_unpaid(train_type, pnr_no, [a.id for a in accounts_to_search(registry, data.get('account'))])
+        if not found:
+            return jsonify({'error_message': f"결제할 {train_type} 예매 내역을 찾을 수 없습니다."}), 404
 
-        elif train_type == 'KTX':
-            client = ktx.Korail(os.environ.get('KTX_ID'), os.environ.get('KTX_PW'))
-            reservations = client.reservations()
-            target = next((r for r in reservations if r.rsv_id == pnr_no), None)
-
-            if not target:
-                return jsonify({'error_message': "결제할 KTX 예매 내역을 찾을 수 없습니다."}), 404
-
-            client.pay_with_card(
-                target,
-                card_number=data.get('card_number'),
-                card_password=data.get('card_password'),
-                birthday=data.get('card_birthday'),
-                card_expire=data.get('card_expire_date')
-            )
-            return jsonify({'message': f"KTX 예매({pnr_no})가 정상적으로 결제되었습니다."})
-        
-        else:
-            return jsonify({'error_message': f"알 수 없는 열차 종류({train_type})입니다."}), 400
-            
+        account_id, target = found
+        try:
+            with registry.lease(account=account_id, neutral=is_account_neutral) as (_, client):
+                pay_reservation(client, train_type, target, data)
+        finally:
+            # 결제하면 예약이 승차권으로 바뀌므로(실패했다면 캐시가 낡았을 수 있으므로) 내역을 다시 불러옵니다.
+            reservation_cache.invalidate(train_type, account_id)
+        payment_deadlines.untrack(train_type, pnr_no)
+        return jsonify({'message': f"{train_type} 예매({pnr_no})가 정상적으로 결제되었습니다."})
+
+    except accounts.AccountBusyError as e:
+        return jsonify({'error_message': str(e)}), 429
+    except accounts.NoAccountError as e:
+        return jsonify({'error_message': str(e)}), 400
     except Exception as e:
         app.logger.error(f"An unexpected error occurred during payment: {e}", exc_info=True)
         return jsonify({'error_message': str(e)}), 500
@@ -334,39 +1175,35 @@ def cancel():
         if not train_type or not pnr_no:
             return jsonify({'error_message': "취소 요청에 필요한 정보가 누락되었습니다."}), 400
 
+        if train_type not in ('SRT', 'KTX'):
+            return jsonify({'error_message': f"알 수 없는 열차 종류({train_type})입니다."}), 400
+
+        registry = account_registry(train_type)
+        found = reservation_cache.find(train_type, pnr_no, [a.id for a in accounts_to_search(registry, data.get('account'))])
+        if not found:
+            return jsonify({'error_message': f"취소할 {train_type} 예매 내역을 찾을 수 없습니다."}), 404
+
+        account_id, target = found
+        try:
+            with registry.lease(account=account_id, neutral=is_account_neutral) as (_, client):
+                if is_ticket:
+                    client.refund(target)
+                else:
+                    client.cancel(target)
+        except Exception:
+            # 캐시된 내역이 낡았을 수 있으니 다시 불러옵니다.
+            reservation_cache.invalidate(train_type, account_id)
+            raise
+        reservation_cache.discard(train_type, account_id, target)
+        payment_deadlines.untrack(train_type, pnr_no)
         if train_type == 'SRT':
-            client = srt.SRT(os.environ.get('SRT_ID'), os.environ.get('SRT_PW'))
-            reservations = client.get_reservations()
-            target = next((r for r in reservations if r.reservation_number == pnr_no), None)
-            
-            if not target:
-                return jsonify({'error_message': "취소할 SRT 예매 내역을 찾을 수 없습니다."}), 404
-            
-            if is_ticket:
-                client.refund(target)
-            else:
-                client.cancel(target)
-            
-            return jsonify({'message': f"SRT 예매({pnr_no})가 정상적으로 취소(환불)되었습니다."})
+            standby_reservations.untrack(pnr_no)
+        return jsonify({'message': f"{train_type} 예매({pnr_no})가 정상적으로 취소(환불)되었습니다."})
 
-        elif train_type == 'KTX':
-            client = ktx.Korail(os.environ.get('KTX_ID'), os.environ.get('KTX_PW'))
-            reservations = client.tickets() + client.reservations()
-            target = next((r for r in reservations if (hasattr(r, 'pnr_no') and r.pnr_no == pnr_no) or (hasattr(r, 'rsv_id') and r.rsv_id == pnr_no)), None)
-            
-            if not target:
-                return jsonify({'error_message': "취소할 KTX 예매 내역을 찾을 수 없습니다."}), 404
-            
-            if is_ticket:
-                client.refund(target)
-            else:
-                client.cancel(target)
-            
-            return jsonify({'message': f"KTX 예매({pnr_no})가 정상적으로 취소(환불)되었습니다."})
-        
-        else:
-            return jsonify({'error_message': f"알 수 없는 열차 종류({train_type})입니다."}), 400
-            
+    except accounts.AccountBusyError as e:
+        return jsonify({'error_message': str(e)}), 429
+    except accounts.NoAccountError as e:
+        return jsonify({'error_message': str(e)}), 400
     except Exception as e:
         app.logger.error(f"An unexpected error occurred during cancellation: {e}", exc_info=True)
-        return jsonify({'error_message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error_message': str(e)}), 500
@@ -0,0 +1,258 @@
+"""ASGI entry point for long-lived watch connections.
+
+Under a WSGI server every request holds a worker (a thread or a process) for
+as long as it is open, so long polls cap the number of watchers at the number
+of workers. Served from here instead, e.g.::
+
+    uvicorn --app-dir api asgi:app --port 5000
+
+the API runs on an event loop:
+
+* watch routes (``ROUTES``) are coroutines; an idle watcher is a suspended
+  coroutine waiting on ``watch.changes``, costing memory but no thread;
+* every other route is the Flask app, awaited on a bounded thread pool
+  (``ASGI_THREADS``, default 64), so a thread is only held while a route is
+  actually working (searching, reserving, waiting in the NetFunnel queue);
+* async routes call the blocking SRT/Korail clients with
+  ``await upstream(fn, ...)`` on the same pool.
+
+Under a WSGI server (Vercel, gunicorn, ``flask run``) the same watch URLs are
+served by app.py and answer immediately, so clients work in both modes.
+"""
+import asyncio
+import functools
+import io
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Pattern, Tuple
+from urllib.parse import parse_qsl
+
+from app import app as flask_app
+from app import availability_request, group_booking, group_booking_report, open_sale, open_sale_report
+from app import seat_availability, stations, watcher_id
+import watch
+
+THREADS = int(os.environ.get("ASGI_THREADS") or 64)
+
+_executor = ThreadPoolExecutor(THREADS, thread_name_prefix="asgi")
+
+Handler = Callable[..., Awaitable[Tuple[dict, int]]]
+ROUTES: List[Tuple[str, Pattern, Handler]] = []
+
+
+async def upstream(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Await a blocking call (an SRT/Korail client method) on the worker pool."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+class Request:
+    def __init__(self, scope: dict, body: bytes) -> None:
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        self.body = body
+        self.client = (scope.get("client") or ("",))[0]
+        self.response_headers: List[Tuple[str, str]] = []
+
+
+def route(path: str, methods: Tuple[str, ...] = ("GET",)) -> Callable[[Handler], Handler]:
+    """Register an async route; ``<name>`` segments are passed as keyword arguments."""
+    pattern = re.compile("^" + re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", path) + "$")
+
+    def register(handler: Handler) -> Handler:
+        for method in methods:
+            ROUTES.append((method, pattern, handler))
+        return handler
+
+    return register
+
+
+def _match(method: str, path: str) -> Tuple[Handler, Dict[str, str]] | None:
+    for route_method, pattern, handler in ROUTES:
+        match = pattern.match(path)
+        if match and route_method == method:
+            return handler, match.groupdict()
+    return None
+
+
+# --- Watch routes ------------------------------------------------------------
+
+async def _watch_job(request: Request, key: tuple, job: Any, report: Callable, not_found: str) -> Tuple[dict, int]:
+    if not job:
+        return {"error_message": not_found}, 404
+    payload, tag, changed = await watch.until_changed(
+        key, lambda: report(job), request.args.get("etag"), watch.timeout_arg(request.args.get("timeout"))
+    )
+    return {"job": payload, "etag": tag, "changed": changed}, 200
+
+
+@route("/api/open-sale/<job_id>/watch")
+async def open_sale_watch(request: Request, job_id: str) -> Tuple[dict, int]:
+    return await _watch_job(
+        request, ("open-sale", job_id), open_sale.get(job_id), open_sale_report, "오픈 예약 작업을 찾을 수 없습니다."
+    )
+
+
+@route("/api/group-reserve/<job_id>/watch")
+async def group_booking_watch(request: Request, job_id: str) -> Tuple[dict, int]:
+    return await _watch_job(
+        request, ("group-reserve", job_id), group_booking.get(job_id), group_booking_report,
+        "단체 예약 작업을 찾을 수 없습니다.",
+    )
+
+
+@route("/api/watch/availability")
+async def availability_watch(request: Request) -> Tuple[dict, int]:
+    try:
+        route_, trains = availability_request(request.args)
+    except stations.UnknownStationError as ex:
+        return {"error_message": str(ex), "station": ex.name, "suggestions": ex.suggestions}, 400
+    except ValueError as ex:
+        return {"error_message": str(ex)}, 400
+    user, set_cookie = watcher_id(watch.watcher_from_header(request.headers.get("cookie")))
+    if set_cookie:
+        request.response_headers.append(("set-cookie", set_cookie))
+    if not seat_availability.ready(route_):
+        try:
+            await upstream(seat_availability.refresh, route_, user)
+        except Exception as ex:
+            return {"error_message": str(ex)}, 502
+    payload, tag, changed = await watch.until_changed(
+        ("availability", route_),
+        lambda: seat_availability.snapshot(route_, trains, user),
+        request.args.get("etag"),
+        watch.timeout_arg(request.args.get("timeout")),
+    )
+    return {**payload, "etag": tag, "changed": changed}, 200
+
+
+@route("/api/asgi-status")
+async def asgi_status(request: Request) -> Tuple[dict, int]:
+    return {"watchers": watch.changes.watchers(), "threads": THREADS}, 200
+
+
+# --- ASGI application --------------------------------------------------------
+
+async def app(scope: dict, receive: Callable, send: Callable) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    body = await _read_body(receive)
+    matched = _match(scope["method"], scope["path"])
+    if matched is None:
+        status, headers, chunks = await upstream(_call_wsgi, _environ(scope, body))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+        return
+
+    handler, params = matched
+    request = Request(scope, body)
+    task = asyncio.ensure_future(handler(request, **params))
+    disconnected = asyncio.ensure_future(_disconnect(receive))
+    await asyncio.wait([task, disconnected], return_when=asyncio.FIRST_COMPLETED)
+    if not task.done():
+        # The watcher went away; stop waiting for it
+        task.cancel()
+        return
+    disconnected.cancel()
+    try:
+        payload, status = task.result()
+    except Exception as ex:
+        flask_app.logger.error(f"Async route {scope['path']} failed: {ex}", exc_info=True)
+        payload, status = {"error_message": str(ex)}, 500
+    data = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]
+        + [(name.encode("latin-1"), value.encode("latin-1")) for name, value in request.response_headers],
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def _read_body(receive: Callable) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _disconnect(receive: Callable) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _lifespan(receive: Callable, send: Callable) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def _environ(scope: dict, body: bytes) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ: dict) -> Tuple[int, list, list]:
+    response: Dict[str, Any] = {}
+    chunks: List[bytes] = []
+
+    def start_response(status: str, headers: list, exc_info: Any = None) -> Callable[[bytes], None]:
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+        return chunks.append
+
+    result = flask_app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return response["status"], response["headers"], chunks
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The async server mode needs an ASGI server: pip install uvicorn")
+    uvicorn.run(app, host=os.environ.get("HOST", "127.0.0.1"), port=int(os.environ.get("PORT") or 5000))
@@ -0,0 +1,217 @@
+"""Shared seat-availability polling for watched routes.
+
+Watchers of ``/api/watch/availability`` do not search themselves. Each
+watched route (provider, departure, arrival, date, search time) has one
+poller that searches it every ``POLL_INTERVAL`` for as long as someone
+watched it within ``IDLE_TIMEOUT``, so N clients watching the same route
+cost one upstream search per tick. After every search the seat state of each
+train on the route is kept, and ``notify`` is called with the route when it
+changed, which wakes the long polls waiting on it (see ``watch.py``).
+
+Searches are dispatched by the shared ``scheduler.Scheduler``: a route's
+search counts for every user watching it, spends its provider's budget and
+goes first when the route departs soon. A route whose search fails is
+retried with backoff up to ``MAX_ERROR_BACKOFF``.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import clock
+from inflight import InFlight
+from scheduler import Scheduler
+
+POLL_INTERVAL = 5.0  # seconds
+IDLE_TIMEOUT = 60.0  # seconds without a watcher before a route stops being polled
+MAX_ERROR_BACKOFF = 60.0  # seconds
+ANONYMOUS = "anonymous"
+
+# (provider, dep, arr, date YYYYMMDD, time HHMMSS)
+Route = Tuple[str, str, str, str, str]
+
+
+def departure(route: Route) -> float:
+    """Epoch seconds of the earliest departure a route search covers."""
+    _, _, _, date, time_ = route
+    return datetime.strptime(date + time_, "%Y%m%d%H%M%S").replace(tzinfo=clock.KST).timestamp()
+
+
+def seats(table: Any) -> Dict[str, dict]:
+    """Seat state per train number of a ``TrainTable``."""
+    if table is None:
+        return {}
+    columns = [table[name] for name in ("train_number", "general", "special", "waitlist")]
+    return {
+        str(number): {"general": bool(general), "special": bool(special), "waitlist": int(waitlist)}
+        for number, general, special, waitlist in zip(*columns)
+    }
+
+
+class RouteState:
+    def __init__(self, route: Route, now: float) -> None:
+        self.route = route
+        self.trains: Dict[str, dict] | None = None  # None until the first search
+        self.checked_at: float | None = None
+        self.error: str | None = None
+        self.errors = 0
+        self.searches = 0
+        self.last_watched = now
+        self.watchers: Dict[str, float] = {}  # user -> last watched
+
+    def as_dict(self) -> dict:
+        provider, dep, arr, date, time_ = self.route
+        return {
+            "provider": provider,
+            "dep": dep,
+            "arr": arr,
+            "date": date,
+            "time": time_,
+            "trains": len(self.trains or ()),
+            "watchers": len(self.watchers),
+            "searches": self.searches,
+            "checked_at": self.checked_at,
+            "error": self.error,
+        }
+
+
+class AvailabilityPoller:
+    """One periodic search per watched route, shared by all its watchers.
+
+    Args:
+        search: Called with a route; returns its ``TrainTable`` (None for no trains)
+        notify: Called with a route whose seat state changed
+        interval: Seconds between searches of a watched route
+        idle_timeout: Seconds a route keeps being searched after its last watch
+        scheduler: Dispatches the searches (a private one if not given)
+
+    Examples:
+        >>> poller = AvailabilityPoller(search_route, lambda route: changes.notify(("availability", route)), polls)
+        >>> poller.watch(("SRT", "수서", "부산", "20250101", "060000"), user="alice")
+        >>> poller.snapshot(route, ["00301", "00303"])
+    """
+
+    def __init__(
+        self,
+        search: Callable[[Route], Any],
+        notify: Callable[[Route], None],
+        interval: float = POLL_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        scheduler: Scheduler | None = None,
+        now: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self._search = search
+        self._notify = notify
+        self._now = now
+        self._scheduler = scheduler or Scheduler()
+        self._routes: Dict[Route, RouteState] = {}
+        self._lock = threading.Lock()
+        self._searches = InFlight(ttl=0)
+
+    def watch(self, route: Route, user: str = ANONYMOUS) -> RouteState:
+        """Register a user's interest in a route; it is searched until nobody watched it for ``idle_timeout``."""
+        now = self._now()
+        with self._lock:
+            state = self._routes.get(route)
+            new = state is None
+            if new:
+                state = self._routes[route] = RouteState(route, now)
+            state.last_watched = now
+            state.watchers[user] = now
+        if new:
+            self._schedule(route, 0.0)
+        return state
+
+    def refresh(self, route: Route, user: str = ANONYMOUS) -> RouteState:
+        """Search a route now (shared with a search of it already running) and return its state."""
+        state = self.watch(route, user)
+        self._searches.run(route, lambda: self._poll(route))
+        return state
+
+    def snapshot(self, route: Route, trains: Iterable[str] | None = None, user: str = ANONYMOUS) -> Tuple[dict, dict]:
+        """Seat state of some (default: all) trains of a watched route.
+
+        Returns:
+            ``(payload, state)``: the response body, and the part of it that
+            counts as a change (the seats, not the time they were checked)
+        """
+        state = self.watch(route, user)
+        with self._lock:
+            known = state.trains or {}
+            wanted = list(trains) if trains else list(known)
+            selected = {number: known.get(number) for number in wanted}
+            payload = {
+                "trains": selected,
+                "checked_at": state.checked_at,
+                "ready": state.trains is not None,
+                "error": state.error,
+            }
+        return payload, {"trains": selected, "ready": payload["ready"]}
+
+    def ready(self, route: Route) -> bool:
+        with self._lock:
+            state = self._routes.get(route)
+            return state is not None and state.trains is not None
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [state.as_dict() for state in self._routes.values()]
+
+    def _schedule(self, route: Route, delay: float) -> None:
+        now = self._now()
+        with self._lock:
+            state = self._routes.get(route)
+            if state is None:
+                return
+            for user, watched in list(state.watchers.items()):
+                if now - watched > self.idle_timeout:
+                    del state.watchers[user]
+            users = list(state.watchers)
+        self._scheduler.submit(
+            ("availability", route), lambda: self._tick(route), delay,
+            provider=route[0], users=users, deadline=departure(route),
+        )
+
+    def _tick(self, route: Route) -> None:
+        with self._lock:
+            state = self._routes.get(route)
+            if state is None:
+                return
+            if self._now() - state.last_watched > self.idle_timeout:
+                del self._routes[route]
+                return
+        try:
+            self._searches.run(route, lambda: self._poll(route))
+        except Exception:
+            pass  # recorded in the route state by _poll
+        with self._lock:
+            state = self._routes.get(route)
+            if state is None:
+                return
+            delay = self.interval * 2 ** state.errors if state.errors else self.interval
+        self._schedule(route, min(delay, MAX_ERROR_BACKOFF))
+
+    def _poll(self, route: Route) -> None:
+        try:
+            trains = seats(self._search(route))
+        except Exception as ex:
+            with self._lock:
+                state = self._routes.get(route)
+                if state is not None:
+                    state.errors += 1
+                    state.error = str(ex)
+            raise
+        with self._lock:
+            state = self._routes.get(route)
+            if state is None:
+                return
+            changed = trains != state.trains
+            state.trains = trains
+            state.checked_at = time.time()
+            state.error = None
+            state.errors = 0
+            state.searches += 1
+        if changed:
+            self._notify(route)
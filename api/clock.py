@@ -0,0 +1,204 @@
+"""Upstream clock-offset calibration.
+
+Estimates the offset between the local clock and each upstream host from the
+HTTP ``Date`` header. ``Date`` only has one-second resolution, so every probe
+``(t0, t1, D)`` bounds the offset to ``[D - t1, D + 1 - t0]``; intersecting the
+bounds of recent probes narrows it down. Probes are timed to land on the
+estimated server second boundary, which halves the remaining uncertainty per
+probe until it is limited by the round-trip time.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Tuple
+
+import transport
+
+KST = timezone(timedelta(hours=9))
+
+HOSTS: Dict[str, str] = {
+    "srt": "https://app.srail.or.kr",
+    "korail": "https://smart.letskorail.com",
+    "netfunnel": "https://nf.letskorail.com",
+}
+
+MAX_SAMPLES = 16
+MAX_SAMPLE_AGE = 15 * 60  # seconds
+PROBES_PER_REFRESH = 4
+REFRESH_INTERVAL = 60.0  # seconds
+PROBE_TIMEOUT = 5.0  # seconds
+
+Sample = Tuple[float, float, float]  # (sent_at, received_at, server_seconds)
+
+
+class ClockEstimate:
+    """Offset estimate for a single host, kept as an interval."""
+
+    def __init__(self) -> None:
+        self.samples: Deque[Sample] = deque(maxlen=MAX_SAMPLES)
+        self.lower: float | None = None
+        self.upper: float | None = None
+        self.rtt: float | None = None
+        self.updated_at: float | None = None
+
+    def add(self, sample: Sample) -> None:
+        self.samples.append(sample)
+        horizon = sample[1] - MAX_SAMPLE_AGE
+        while self.samples and self.samples[0][1] < horizon:
+            self.samples.popleft()
+
+        lower, upper = float("-inf"), float("inf")
+        for sent_at, received_at, server in self.samples:
+            lower = max(lower, server - received_at)
+            upper = min(upper, server + 1 - sent_at)
+
+        if lower > upper:
+            # The window disagrees (e.g. the host's clock stepped), so trust
+            # only the newest probe and start narrowing again from there.
+            sent_at, received_at, server = sample
+            self.samples = deque([sample], maxlen=MAX_SAMPLES)
+            lower, upper = server - received_at, server + 1 - sent_at
+
+        self.lower, self.upper = lower, upper
+        self.rtt = min(received_at - sent_at for sent_at, received_at, _ in self.samples)
+        self.updated_at = sample[1]
+
+    @property
+    def calibrated(self) -> bool:
+        return self.lower is not None
+
+    @property
+    def offset(self) -> float:
+        if not self.calibrated:
+            return 0.0
+        return (self.lower + self.upper) / 2
+
+    @property
+    def error(self) -> float | None:
+        if not self.calibrated:
+            return None
+        return (self.upper - self.lower) / 2
+
+    def as_dict(self) -> dict:
+        return {
+            "calibrated": self.calibrated,
+            "offset_ms": round(self.offset * 1000, 3),
+            "error_ms": None if self.error is None else round(self.error * 1000, 3),
+            "lower_ms": None if self.lower is None else round(self.lower * 1000, 3),
+            "upper_ms": None if self.upper is None else round(self.upper * 1000, 3),
+            "rtt_ms": None if self.rtt is None else round(self.rtt * 1000, 3),
+            "samples": len(self.samples),
+            "updated_at": self.updated_at,
+        }
+
+
+class UpstreamClock:
+    """Corrected time source shared by schedulers and search defaults.
+
+    Args:
+        hosts: Mapping of host name to base URL to probe
+        refresh_interval: Seconds between background refreshes
+
+    Examples:
+        >>> upstream.calibrate("srt")
+        >>> upstream.now("srt")  # epoch seconds on the SRT server clock
+        >>> upstream.estimate("srt")["error_ms"]
+    """
+
+    def __init__(
+        self, hosts: Dict[str, str] | None = None, refresh_interval: float = REFRESH_INTERVAL
+    ) -> None:
+        self.hosts = dict(hosts or HOSTS)
+        self.refresh_interval = refresh_interval
+        self._estimates: Dict[str, ClockEstimate] = {h: ClockEstimate() for h in self.hosts}
+        self._lock = threading.Lock()
+        self._session = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def now(self, host: str | None = None) -> float:
+        """Return the current epoch time as seen by ``host``.
+
+        Without a host the tightest calibrated estimate is used. Falls back to
+        the local clock until a host has been calibrated.
+        """
+        return time.time() + self._best(host).offset
+
+    def kst_now(self, host: str | None = None) -> datetime:
+        return datetime.fromtimestamp(self.now(host), KST)
+
+    def estimate(self, host: str) -> dict:
+        return self._estimates[host].as_dict()
+
+    def status(self) -> dict:
+        return {host: self.estimate(host) for host in self.hosts}
+
+    def calibrate(self, host: str | None = None, probes: int = PROBES_PER_REFRESH) -> None:
+        """Probe ``host`` (or every host) ``probes`` times, synchronously."""
+        for name in [host] if host else list(self.hosts):
+            for _ in range(probes):
+                self._wait_for_probe_slot(name)
+                try:
+                    self._probe(name)
+                except Exception:
+                    break
+
+    def start(self) -> None:
+        """Keep refreshing every host in a background thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="upstream-clock", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            self.calibrate()
+            self._stop.wait(self.refresh_interval)
+
+    def _best(self, host: str | None) -> ClockEstimate:
+        if host:
+            return self._estimates[host]
+        calibrated = [e for e in self._estimates.values() if e.calibrated]
+        if not calibrated:
+            return next(iter(self._estimates.values()))
+        return min(calibrated, key=lambda e: e.error)
+
+    def _wait_for_probe_slot(self, host: str) -> None:
+        """Sleep so the next probe reaches the host at its estimated second boundary."""
+        estimate = self._estimates[host]
+        if not estimate.calibrated or estimate.error < estimate.rtt / 2:
+            return
+        now = time.time()
+        arrival = now + estimate.rtt / 2 + estimate.offset
+        boundary = int(arrival) + 1
+        delay = boundary - arrival
+        if delay < 0.05:
+            delay += 1
+        self._stop.wait(delay)
+
+    def _probe(self, host: str) -> None:
+        if self._session is None:
+            self._session = transport.new_session()
+
+        sent_at = time.time()
+        r = self._session.head(self.hosts[host], timeout=PROBE_TIMEOUT)
+        received_at = time.time()
+
+        date = r.headers.get("Date")
+        if not date:
+            raise ValueError(f"{host} did not send a Date header")
+        server = parsedate_to_datetime(date).timestamp()
+
+        with self._lock:
+            self._estimates[host].add((sent_at, received_at, server))
+
+
+upstream = UpstreamClock()
+now = upstream.now
+kst_now = upstream.kst_now
@@ -0,0 +1,326 @@
+"""Booking a party that may not fit into a single reservation.
+
+Both clients send the whole party as one reserve request, which fails as soon
+as fewer seats than passengers are free. A group booking:
+
+1. asks for the full party on the preferred train first;
+2. if that fails, splits the party in halves and places the halves
+   concurrently, each on the first candidate train that takes it (the
+   preferred train, then adjacent trains), splitting a sub-group again when no
+   train takes it;
+3. keeps retrying the sub-groups that are still unplaced until the deadline,
+   and if the whole party is not placed by then, cancels every reservation it
+   made so no partial booking is left behind.
+
+Sub-groups are spread over the ``client_factory`` slots, one per account, so
+concurrent sub-groups are reserved by different accounts (SRT refuses
+duplicate reservations of one train on one account). Sub-groups beyond the
+number of slots wait for a slot and are placed one after another on it.
+
+For the same reason one account cannot split a party on a single train: a
+slot that already holds a reservation on a train skips that train, so with
+one slot the first sub-group takes the preferred train and the rest spill
+over to adjacent trains. Splitting on the preferred train needs as many
+slots (accounts) as sub-groups.
+"""
+import copy
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Tuple
+
+DEADLINE = 60.0  # seconds to place the whole party
+RETRY_INTERVAL = 3.0  # seconds between rounds for groups that could not be placed
+MAX_WORKERS = 4
+FINISHED_TTL = 10 * 60  # seconds a finished job stays readable
+
+JOBS: Dict[str, "GroupBooking"] = {}
+
+
+def party_size(passengers: list) -> int:
+    return sum(p.count for p in passengers)
+
+
+def split_party(passengers: list) -> Tuple[list, list]:
+    """Split a party into two halves with the passenger types spread over both.
+
+    Passengers are dealt out one by one, so e.g. 2 adults + 2 children become
+    two groups of 1 adult + 1 child instead of leaving the children alone.
+    """
+    units = [p for p in passengers for _ in range(p.count)]
+    return _regroup(units[0::2]), _regroup(units[1::2])
+
+
+def _regroup(units: list) -> list:
+    groups: Dict[int, Any] = {}
+    for unit in units:
+        if id(unit) not in groups:
+            groups[id(unit)] = copy.copy(unit)
+            groups[id(unit)].count = 0
+        groups[id(unit)].count += 1
+    return list(groups.values())
+
+
+class Placement:
+    """One reservation made for part of the party."""
+
+    def __init__(self, passengers: list, train: Any, reservation: Any, client: Any) -> None:
+        self.passengers = passengers
+        self.train = train
+        self.reservation = reservation
+        self.client = client
+        self.cancelled = False
+
+    def to_dict(self) -> dict:
+        return {
+            "passengers": party_size(self.passengers),
+            "train_number": getattr(self.train, "train_number", None) or getattr(self.train, "train_no", None),
+            "dep_time": self.train.dep_time,
+            "cancelled": self.cancelled,
+        }
+
+
+class GroupBooking:
+    """Place a party on one or more trains, as one logical booking.
+
+    Args:
+        provider: "SRT" or "KTX"
+        client_factory: Called with a slot number in ``range(slots)``, returns
+            a logged-in client. Concurrent sub-groups use different slots.
+        passengers: The whole party
+        option: ``srt.SeatType``/``ktx.ReserveOption``
+        trains: Candidate trains in order of preference; the first one is the
+            train the user picked
+        deadline: Seconds to place the whole party before rolling back
+        min_group: Smallest sub-group size the party is split into
+        allow_standby: Accept waitlist reservations for sub-groups; by default
+            only reservations that hold seats count
+        slots: Distinct clients (accounts) ``client_factory`` can build
+        max_workers: Sub-groups placed concurrently (at most ``slots``)
+        notify: Called with the job once the whole party is placed
+        on_change: Called with the job whenever its report changes (state,
+            attempts or placements)
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        client_factory: Callable[[int], Any],
+        passengers: list,
+        option: Any,
+        trains: List[Any],
+        deadline: float = DEADLINE,
+        min_group: int = 1,
+        allow_standby: bool = False,
+        slots: int = 1,
+        max_workers: int = MAX_WORKERS,
+        notify: Callable[["GroupBooking"], None] | None = None,
+        on_change: Callable[["GroupBooking"], None] | None = None,
+    ) -> None:
+        if not trains:
+            raise ValueError("At least one candidate train is required")
+
+        self.id = uuid.uuid4().hex[:12]
+        self.provider = provider
+        self.passengers = passengers
+        self.option = option
+        self.trains = trains
+        self.deadline = deadline
+        self.min_group = max(1, min_group)
+        self.allow_standby = allow_standby
+        self.slots = max(1, slots)
+        self.max_workers = max(1, min(max_workers, self.slots))
+        self._on_change = on_change
+        self._state = "scheduled"
+        self.error: str | None = None
+        self.placements: List[Placement] = []
+        self.attempts: List[dict] = []
+        self.finished_at: float | None = None
+
+        self._client_factory = client_factory
+        self._notify = notify
+        self._clients: Dict[int, Any] = {}
+        self._held: Dict[int, set] = {}  # slot -> trains it holds a reservation on
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, state: str) -> None:
+        self._state = state
+        self._changed()
+
+    def _changed(self) -> None:
+        if self._on_change:
+            try:
+                self._on_change(self)
+            except Exception:
+                pass  # a failing callback must not fail the booking
+
+    @property
+    def reservations(self) -> list:
+        return [p.reservation for p in self.placements if not p.cancelled]
+
+    def cancel(self) -> None:
+        """Stop placing sub-groups; an unfinished booking is rolled back."""
+        self._cancelled.set()
+
+    def run(self) -> None:
+        started = time.monotonic()
+        expires = started + self.deadline
+        pending = [self.passengers]
+        try:
+            self.state = "placing"
+            with ThreadPoolExecutor(self.max_workers, thread_name_prefix=f"group-{self.id}") as pool:
+                while pending and not self._cancelled.is_set() and time.monotonic() < expires:
+                    # A slot places its groups one after another, so no account
+                    # holds two reserves of one round at the same time
+                    # Slots that do not hold the preferred train yet go first
+                    slots = sorted(range(self.max_workers), key=lambda slot: self._holds(slot, self.trains[0]))
+                    lanes: Dict[int, list] = {}
+                    for i, group in enumerate(pending):
+                        lanes.setdefault(slots[i % len(slots)], []).append(group)
+                    futures = [pool.submit(self._place_lane, groups, slot, expires) for slot, groups in lanes.items()]
+                    wait(futures)
+
+                    retry, pending = [], []
+                    results = [placed for future in futures for placed in future.result()]
+                    groups = [group for groups in lanes.values() for group in groups]
+                    for placed, group in zip(results, groups):
+                        if placed:
+                            continue
+                        if party_size(group) > self.min_group:
+                            pending.extend(split_party(group))
+                        else:
+                            retry.append(group)
+
+                    if retry and not pending:
+                        # Nothing left to split; wait for seats to free up
+                        self._cancelled.wait(min(RETRY_INTERVAL, max(0.0, expires - time.monotonic())))
+                    pending.extend(retry)
+        except Exception as ex:
+            self.error = str(ex)
+            pending = pending or [self.passengers]
+
+        try:
+            if pending:
+                # The error first: setting the state notifies watchers
+                self.error = self.error or f"{sum(map(party_size, pending))} passengers could not be placed"
+                self.state = "cancelled" if self._cancelled.is_set() else "failed"
+                self.rollback()
+            else:
+                self.state = "succeeded" if len(self.placements) == 1 else "split"
+                if self._notify:
+                    self._notify(self)
+        finally:
+            self.finished_at = time.monotonic()
+
+    def rollback(self) -> None:
+        for placement in self.placements:
+            if placement.cancelled:
+                continue
+            try:
+                placement.client.cancel(placement.reservation)
+                placement.cancelled = True
+                self._changed()
+            except Exception as ex:
+                self.error = f"{self.error}; rollback failed: {ex}"
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "provider": self.provider,
+            "state": self.state,
+            "party": party_size(self.passengers),
+            "placements": [p.to_dict() for p in self.placements],
+            "attempts": list(self.attempts),
+            "error": self.error,
+        }
+
+    def _client(self, slot: int) -> Any:
+        with self._lock:
+            client = self._clients.get(slot)
+        if client is None:
+            client = self._client_factory(slot)
+            with self._lock:
+                self._clients[slot] = client
+        return client
+
+    def _place_lane(self, groups: List[list], slot: int, expires: float) -> List[bool]:
+        return [self._place(group, slot, expires) for group in groups]
+
+    def _place(self, group: list, slot: int, expires: float) -> bool:
+        """Reserve ``group`` on the first candidate train that takes it."""
+        client = self._client(slot)
+        # The full party only goes to the train the user picked; sub-groups
+        # may spill over to adjacent trains.
+        trains = self.trains[:1] if group is self.passengers else self.trains
+        for train in trains:
+            if self._cancelled.is_set() or time.monotonic() >= expires:
+                return False
+            if self._holds(slot, train):
+                continue  # the account would be refused a second reservation of this train
+            attempt = {"passengers": party_size(group), "dep_time": train.dep_time}
+            try:
+                reservation = self._reserve(client, train, group)
+            except Exception as ex:
+                attempt["error"] = str(ex)
+                with self._lock:
+                    self.attempts.append(attempt)
+                self._changed()
+                if getattr(ex, "rsv_id", None):
+                    raise  # issued but unconfirmed: another train would book the group twice
+                continue
+
+            with self._lock:
+                self.attempts.append(attempt)
+                self.placements.append(Placement(group, train, reservation, client))
+                self._held.setdefault(slot, set()).add(_train_key(train))
+            self._changed()
+            return True
+        return False
+
+    def _holds(self, slot: int, train: Any) -> bool:
+        with self._lock:
+            return _train_key(train) in self._held.get(slot, ())
+
+    def _reserve(self, client: Any, train: Any, group: list) -> Any:
+        if self.allow_standby:
+            return client.reserve(train, passengers=group, option=self.option)
+
+        if self.provider == "SRT":
+            import srt
+
+            return client._reserve(srt.RESERVE_JOBID["PERSONAL"], train, group, self.option)
+        return client._submit_reserve(
+            client._reserve_payload(train, group, self.option, reserving_seat=True)
+        )
+
+
+def _train_key(train: Any) -> tuple:
+    number = getattr(train, "train_number", None) or getattr(train, "train_no", None)
+    return number, train.dep_date
+
+
+def schedule(job: GroupBooking) -> str:
+    """Start ``job`` on a background thread and return its id."""
+    prune()
+    JOBS[job.id] = job
+    threading.Thread(target=job.run, name=f"group-booking-{job.id}", daemon=True).start()
+    return job.id
+
+
+def get(job_id: str) -> GroupBooking | None:
+    return JOBS.get(job_id)
+
+
+def prune(ttl: float = FINISHED_TTL) -> None:
+    """Forget jobs that finished more than ``ttl`` seconds ago."""
+    now = time.monotonic()
+    for job_id, job in list(JOBS.items()):
+        if job.finished_at is not None and now - job.finished_at > ttl:
+            JOBS.pop(job_id, None)
@@ -0,0 +1,111 @@
+"""Deduplication of concurrent and repeated reserve requests.
+
+Two guards, both sharing one result instead of firing a second upstream
+reserve:
+
+* an in-flight lock per reserve identity (``reserve_key``: provider, account,
+  train, date, stations, party and seat option): while a reserve is running,
+  identical requests wait for it and get its result (or its error). A request
+  that differs in any of these books on its own;
+* idempotency keys: a request carrying the key of an earlier request for the
+  same identity gets the earlier request's result, whether it is still running
+  or finished within ``IDEMPOTENCY_TTL``. Idempotency keys are scoped to the
+  identity, so reusing one for a different booking does not replay the other
+  booking. Only successful results are remembered (not errors, and not
+  ``None`` for "nothing booked"), so a request that failed (e.g. sold out)
+  can be retried with the same key, as an auto-retry session does.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+IDEMPOTENCY_TTL = 10 * 60  # seconds
+
+
+def reserve_key(
+    provider: str,
+    account: str,
+    train_number: str,
+    date: str,
+    dep: str,
+    arr: str,
+    passengers: Iterable[Any],
+    option: Any,
+) -> tuple:
+    """Identity of a reserve: two requests share a result only if all of this matches."""
+    party = tuple(sorted((type(p).__name__, int(getattr(p, "count", 1))) for p in passengers))
+    return provider, account, train_number, date, dep, arr, party, getattr(option, "name", option)
+
+
+class InFlight:
+    """Single-flight execution keyed by operation, with idempotency keys.
+
+    Examples:
+        >>> reserves = InFlight()
+        >>> key = reserve_key("SRT", account.id, "00301", "20250101", "수서", "부산", [Adult(2)], SeatType.GENERAL_ONLY)
+        >>> result = reserves.run(key, book, idempotency_key=request.headers.get("Idempotency-Key"))
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, now: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.stats = {"executed": 0, "shared": 0, "replayed": 0}
+        self._now = now
+        self._running: Dict[Hashable, Future] = {}
+        self._idempotent: Dict[Tuple[Hashable, str], Tuple[float, Future]] = {}  # (key, idempotency key) -> (expires, future)
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, fn: Callable[[], Any], idempotency_key: str | None = None) -> Any:
+        """Return ``fn()``, or the result of the running/earlier identical call.
+
+        Args:
+            key: Operation key; concurrent calls with the same key run ``fn`` once
+            fn: The operation
+            idempotency_key: Client-supplied key of this request, if any; it
+                only replays earlier calls with the same ``key``
+        """
+        now = self._now()
+        scoped = (key, idempotency_key) if idempotency_key else None
+        with self._lock:
+            self._purge(now)
+            known = self._idempotent.get(scoped) if scoped else None
+            if known:
+                future, owner = known[1], False
+                self.stats["replayed" if future.done() else "shared"] += 1
+            else:
+                future = self._running.get(key)
+                owner = future is None
+                if owner:
+                    future = self._running[key] = Future()
+                    self.stats["executed"] += 1
+                else:
+                    self.stats["shared"] += 1
+                if scoped:
+                    self._idempotent[scoped] = (float("inf"), future)
+
+        if owner:
+            try:
+                future.set_result(fn())
+            except BaseException as ex:
+                future.set_exception(ex)
+            finally:
+                self._finish(key, future)
+        return future.result()
+
+    def _finish(self, key: Hashable, future: Future) -> None:
+        expires = self._now() + self.ttl
+        with self._lock:
+            if self._running.get(key) is future:
+                del self._running[key]
+            for scoped, (_, f) in list(self._idempotent.items()):
+                if f is not future:
+                    continue
+                if future.exception() is None and future.result() is not None:
+                    self._idempotent[scoped] = (expires, future)
+                else:
+                    del self._idempotent[scoped]
+
+    def _purge(self, now: float) -> None:
+        for scoped, (expires, _) in list(self._idempotent.items()):
+            if expires <= now:
+                del self._idempotent[scoped]
@@ -1,18 +1,18 @@
 import base64
-try:
-    import curl_cffi
-    HAS_CURL_CFFI = True
-except ImportError:
-    import requests
-    HAS_CURL_CFFI = False
+import hashlib
 import itertools
 import json
 import re
+import threading
 import time
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
-from datetime import datetime, timedelta
-from functools import reduce
+from collections import Counter
+from functools import reduce, wraps
+
+import clock
+import request_policy
+import session_store as session_stores
+import transport
+from train_table import TrainTable, any_of
 
 
 # Constants
@@ -45,6 +45,13 @@ API_ENDPOINTS = {
     "code": f"{KORAIL_MOBILE}.common.code.do",
 }
 
+# Encrypted login credentials, per account, so that a login does not have to
+# fetch the cipher key from the "code" endpoint every time.
+# korail_id -> (password digest, idx, encrypted password, expires at)
+CREDENTIAL_TTL = 30 * 60  # 30 minutes
+_credentials = {}
+_credentials_lock = threading.Lock()
+
 
 # Schedule classes
 class Schedule:
@@ -390,6 +397,17 @@ class SoldOutError(KorailError):
         super().__init__("Sold out", code)
 
 
+class UnconfirmedReservationError(KorailError):
+    """A reservation number was issued but its journeys could not be listed.
+
+    The reservation may well exist, so it must not be booked again.
+    """
+
+    def __init__(self, rsv_id):
+        super().__init__(f"Reservation {rsv_id} was issued but not found: check reservation status")
+        self.rsv_id = rsv_id
+
+
 class NetFunnelError(Exception):
     def __init__(self, msg):
         self.msg = msg
@@ -419,11 +437,9 @@ class NetFunnelHelper:
     }
 
     def __init__(self):
-        if HAS_CURL_CFFI:
-            self._session = curl_cffi.Session(impersonate="chrome131_android")
-        else:
-            self._session = requests.session()
-        self._session.headers.update(self.DEFAULT_HEADERS)
+        self._session = request_policy.PolicySession(
+            NETFUNNEL_POOL.lease(self), {}, default=NETFUNNEL_POLICY
+        )
         self._cached_key = None
         self._last_fetch_time = 0
         self._cache_ttl = 50  # 50 seconds
@@ -504,15 +520,60 @@ class NetFunnelHelper:
         )
 
 
+def _relogin_if_expired(method):
+    """Login again and retry once when a restored session has expired"""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self._restored:
+            return method(self, *args, **kwargs)
+        try:
+            result = method(self, *args, **kwargs)
+        except NeedToLoginError:
+            self._log("Restored session expired, logging in again")
+            self._restored = False
+            self.login()
+            return method(self, *args, **kwargs)
+        self._restored = False
+        return result
+
+    return wrapper
+
+
+NETFUNNEL_POOL = transport.pool(
+    "korail-netfunnel", "http://nf.letskorail.com", "chrome131_android", NetFunnelHelper.DEFAULT_HEADERS
+)
+SESSION_POOL = transport.pool(
+    "korail", "https://smart.letskorail.com", "chrome131_android", DEFAULT_HEADERS
+)
+
+# Requests not listed here (reserve, pay, cancel, refund) may have reached the
+# server when they fail, so they are never re-sent
+REQUEST_POLICIES = {
+    API_ENDPOINTS["code"]: request_policy.READ,
+    API_ENDPOINTS["login"]: request_policy.Policy(
+        timeout=10.0, deadline=20.0, retries=1, idempotent=True
+    ),
+    API_ENDPOINTS["logout"]: request_policy.READ,
+    API_ENDPOINTS["search_schedule"]: request_policy.HEDGED_READ,
+    API_ENDPOINTS["myticketlist"]: request_policy.READ,
+    API_ENDPOINTS["myticketseat"]: request_policy.HEDGED_READ,
+    API_ENDPOINTS["myreservationview"]: request_policy.HEDGED_READ,
+    API_ENDPOINTS["myreservationlist"]: request_policy.READ,
+}
+NETFUNNEL_POLICY = request_policy.Policy(timeout=5.0)
+
+
 class Korail:
     """Main Korail API interface"""
 
-    def __init__(self, korail_id, korail_pw, auto_login=True, verbose=False):
-        if HAS_CURL_CFFI:
-            self._session = curl_cffi.Session(impersonate="chrome131_android")
-        else:
-            self._session = requests.session()
-        self._session.headers.update(DEFAULT_HEADERS)
+    def __init__(self, korail_id, korail_pw, auto_login=True, verbose=False, session_store=None):
+        self._session = request_policy.PolicySession(
+            SESSION_POOL.lease(self),
+            REQUEST_POLICIES,
+            spare=SESSION_POOL.acquire,
+            release=SESSION_POOL.release,
+        )
         self._device = "AD"
         self._version = "240531001"
         self._key = "korail1234567890"
@@ -525,14 +586,41 @@ class Korail:
         self.name = None
         self.email = None
         self.phone_number = None
-        if auto_login:
+        self._session_store = session_store
+        self._restored = False
+        if auto_login and not self._restore_session():
             self.login(korail_id, korail_pw)
 
     def _log(self, msg: str) -> None:
         if self.verbose:
             print(f"[*] {msg}")
 
+    def __credential(self, use_cache=True):
+        """Return ``(idx, encrypted password, cached)`` for the current account"""
+        digest = hashlib.sha256(self.korail_pw.encode("utf-8")).hexdigest()
+        if use_cache:
+            with _credentials_lock:
+                entry = _credentials.get(self.korail_id)
+            if entry and entry[0] == digest and entry[3] > time.time():
+                return entry[1], entry[2], True
+
+        txt_pwd = self.__enc_password(self.korail_pw)
+        if txt_pwd:
+            with _credentials_lock:
+                _credentials[self.korail_id] = (
+                    digest, self._idx, txt_pwd, time.time() + CREDENTIAL_TTL
+                )
+        return self._idx, txt_pwd, False
+
+    def __forget_credential(self):
+        with _credentials_lock:
+            _credentials.pop(self.korail_id, None)
+
     def __enc_password(self, password):
+        # Imported here so that routes which never log in skip loading pycryptodome
+        from Crypto.Cipher import AES
+        from Crypto.Util.Padding import pad
+
         url = API_ENDPOINTS["code"]
         data = {"code": "app.login.cphd"}
         r = self._session.post(url, data=data)
@@ -564,19 +652,16 @@ class Korail:
             else "2"
         )
 
-        data = {
-            "Device": self._device,
-            "Version": self._version,
-            "Key": self._key,
-            "txtMemberNo": self.korail_id,
-            "txtPwd": self.__enc_password(self.korail_pw),
-            "txtInputFlg": txt_input_flg,
-            "idx": self._idx,
-        }
+        idx, txt_pwd, cached = self.__credential()
+        j = self.__login_request(txt_input_flg, idx, txt_pwd)
 
-        r = self._session.post(API_ENDPOINTS["login"], data=data)
-        self._log(r.text)
-        j = json.loads(r.text)
+        if cached and not (j["strResult"] == "SUCC" and j.get("strMbCrdNo")):
+            # The server does not tell a rotated cipher key apart from other
+            # failures, so a failed login with a cached key is treated as
+            # key-related: drop the cache entry and retry once with a new key.
+            self.__forget_credential()
+            idx, txt_pwd, _ = self.__credential(use_cache=False)
+            j = self.__login_request(txt_input_flg, idx, txt_pwd)
 
         if j["strResult"] == "SUCC" and j.get("strMbCrdNo"):
             # self._key = j['Key']
@@ -588,14 +673,67 @@ class Korail:
                 f"로그인 성공: {self.name} (멤버십번호: {self.membership_number}, 전화번호: {self.phone_number})"
             )
             self.logined = True
+            self._save_session()
             return True
         self.logined = False
         return False
 
+    def _restore_session(self):
+        """Resume a login state saved by an earlier process"""
+        if not self._session_store:
+            return False
+        state = self._session_store.load("KTX", self.korail_id)
+        if not state or state.get("password") != session_stores.password_digest(self.korail_pw):
+            return False
+
+        session_stores.restore_cookies(self._session, state["cookies"])
+        self.membership_number = state["membership_number"]
+        self.name = state["name"]
+        self.email = state["email"]
+        self.phone_number = state["phone_number"]
+        self.logined = True
+        self._restored = True
+        self._log(f"Restored session of {self.membership_number}")
+        return True
+
+    def _save_session(self):
+        if not self._session_store:
+            return
+        self._session_store.save(
+            "KTX",
+            self.korail_id,
+            {
+                "password": session_stores.password_digest(self.korail_pw),
+                "cookies": session_stores.dump_cookies(self._session),
+                "membership_number": self.membership_number,
+                "name": self.name,
+                "email": self.email,
+                "phone_number": self.phone_number,
+            },
+        )
+
+    def __login_request(self, txt_input_flg, idx, txt_pwd):
+        self._idx = idx
+        data = {
+            "Device": self._device,
+            "Version": self._version,
+            "Key": self._key,
+            "txtMemberNo": self.korail_id,
+            "txtPwd": txt_pwd,
+            "txtInputFlg": txt_input_flg,
+            "idx": idx,
+        }
+
+        r = self._session.post(API_ENDPOINTS["login"], data=data)
+        self._log(r.text)
+        return json.loads(r.text)
+
     def logout(self):
         r = self._session.get(API_ENDPOINTS["logout"])
         self._log(r.text)
         self.logined = False
+        if self._session_store:
+            self._session_store.delete("KTX", self.korail_id)
 
     def _result_check(self, j):
         if j.get("strResult") == "FAIL":
@@ -618,7 +756,24 @@ class Korail:
         include_no_seats=False,
         include_waiting_list=False,
     ):
-        kst_now = datetime.now() + timedelta(hours=9)
+        table = self.search_table(dep, arr, date, time, train_type, passengers)
+        masks = [table.mask(available=True)]
+        if include_no_seats:
+            masks.append(table.mask(available=False))
+        if include_waiting_list:
+            masks.append(table.mask(waitlist=9))
+
+        trains = table.where(any_of(*masks)).to_trains()
+        if not trains:
+            raise NoResultsError()
+
+        return trains
+
+    def search_table(
+        self, dep, arr, date=None, time=None, train_type=TrainType.ALL, passengers=None
+    ):
+        """Search for trains and return every train as a ``TrainTable``"""
+        kst_now = clock.kst_now("korail")
         date = date or kst_now.strftime("%Y%m%d")
         time = time or kst_now.strftime("%H%M%S")
         passengers = passengers or [AdultPassenger()]
@@ -673,25 +828,62 @@ class Korail:
         j = json.loads(r.text)
 
         if self._result_check(j):
-            trains = [
-                Train(info) for info in j.get("trn_infos", {}).get("trn_info", [])
-            ]
-            filter_fns = [lambda x: x.has_seat]
+            return TrainTable.from_korail(j.get("trn_infos", {}).get("trn_info", []), Train)
 
-            if include_no_seats:
-                filter_fns.append(lambda x: not x.has_seat)
-            if include_waiting_list:
-                filter_fns.append(lambda x: x.has_waiting_list())
-
-            trains = [t for t in trains if any(f(t) for f in filter_fns)]
+    def reserve(self, train, passengers=None, option=ReserveOption.GENERAL_FIRST):
+        return self._submit_reserve(self._reserve_payload(train, passengers, option))
 
-            if not trains:
-                raise NoResultsError()
+    @_relogin_if_expired
+    def reserve_round_trip(
+        self, outbound, inbound, passengers=None, option=ReserveOption.GENERAL_FIRST
+    ):
+        """Reserve two trains as the two journeys of one reservation.
+
+        The reserve request carries a second journey (``txt*2`` fields), so
+        both trains are booked by one request, or neither is.
+
+        Returns:
+            (outbound reservation, return reservation)
+        """
+        data = self._reserve_payload(outbound, passengers, option)
+        second = self._reserve_payload(inbound, passengers, option)
+        if data["txtJobId"] != second["txtJobId"]:
+            raise ValueError("A seat and a waitlist reservation cannot be combined")
+
+        data["txtJrnyCnt"] = "2"
+        for field in (
+            "JrnyTpCd", "DptDt", "DptRsStnCd", "DptTm", "ArvRsStnCd", "TrnNo",
+            "RunDt", "TrnClsfCd", "TrnGpCd", "PsrmClCd", "ChgFlg",
+        ):
+            data[f"txt{field}2"] = second[f"txt{field}1"]
+        data["txtJrnySqno2"] = "002"
 
-            return trains
+        r = self._session.get(API_ENDPOINTS["reserve"], params=data)
+        self._log(r.text)
+        j = json.loads(r.text)
+        if not self._result_check(j):
+            raise SoldOutError()
 
-    def reserve(self, train, passengers=None, option=ReserveOption.GENERAL_FIRST):
-        reserving_seat = train.has_seat or train.wait_reserve_flag < 0
+        # From here on a reservation number exists: failing to list it must
+        # not read as a rejection, or the caller would book the trains again
+        rsv_id = j.get("h_pnr_no")
+        for _ in range(2):
+            legs = {
+                tinfo.get("h_trn_no"): tinfo
+                for tinfo in self._reservation_list()
+                if tinfo.get("h_pnr_no") == rsv_id
+            }
+            found = [legs.get(train.train_no) for train in (outbound, inbound)]
+            if all(found):
+                return tuple(self._with_tickets(Reservation(tinfo)) for tinfo in found)
+        raise UnconfirmedReservationError(rsv_id)
+
+    def _reserve_payload(
+        self, train, passengers=None, option=ReserveOption.GENERAL_FIRST, reserving_seat=None
+    ):
+        """Build the reservation request parameters without sending them"""
+        if reserving_seat is None:
+            reserving_seat = train.has_seat or train.wait_reserve_flag < 0
         if reserving_seat:
             is_special_seat = {
                 ReserveOption.GENERAL_ONLY: False,
@@ -755,18 +947,27 @@ class Korail:
 
         for i, psg in enumerate(passengers, 1):
             data.update(psg.get_dict(i))
+        return data
 
+    @_relogin_if_expired
+    def _submit_reserve(self, data):
+        """Send parameters built by ``_reserve_payload``"""
         r = self._session.get(API_ENDPOINTS["reserve"], params=data)
         self._log(r.text)
         j = json.loads(r.text)
         if self._result_check(j):
+            # The reservation exists from here on; not finding it must not
+            # read as a rejection, or the caller would book again
             rsv_id = j.get("h_pnr_no")
-            reservation = self.reservations(rsv_id)
+            reservation = self.reservation(rsv_id) or self.reservation(rsv_id)
+            if reservation is None:
+                raise UnconfirmedReservationError(rsv_id)
             return reservation
         else:
             raise SoldOutError()
 
-    def tickets(self):
+    def _ticket_list(self):
+        """Raw entries of the ticket list (one ``myticketlist`` request)"""
         data = {
             "Device": self._device,
             "Version": self._version,
@@ -784,34 +985,56 @@ class Korail:
         j = json.loads(r.text)
         try:
             if self._result_check(j):
-                tickets = []
-                for info in j.get("reservation_list", []):
-                    ticket = Ticket(info)
-                    data = {
-                        "Device": self._device,
-                        "Version": self._version,
-                        "Key": self._key,
-                        "h_orgtk_wct_no": ticket.sale_info1,
-                        "h_orgtk_ret_sale_dt": ticket.sale_info2,
-                        "h_orgtk_sale_sqno": ticket.sale_info3,
-                        "h_orgtk_ret_pwd": ticket.sale_info4,
-                    }
-                    r = self._session.get(API_ENDPOINTS["myticketseat"], params=data)
-                    j = json.loads(r.text)
-                    if self._result_check(j):
-                        seat = (
-                            j.get("ticket_infos", {})
-                            .get("ticket_info", [{}])[0]
-                            .get("tk_seat_info", [{}])[0]
-                        )
-                        ticket.seat_no = seat.get("h_seat_no")
-                        ticket.seat_no_end = None
-                    tickets.append(ticket)
-                return tickets
+                return j.get("reservation_list", [])
         except NoResultsError:
-            return []
+            pass
+        return []
 
-    def reservations(self, rsv_id=None):
+    def _with_seat(self, ticket):
+        """Fill in the seat number of a ticket (one ``myticketseat`` request)"""
+        data = {
+            "Device": self._device,
+            "Version": self._version,
+            "Key": self._key,
+            "h_orgtk_wct_no": ticket.sale_info1,
+            "h_orgtk_ret_sale_dt": ticket.sale_info2,
+            "h_orgtk_sale_sqno": ticket.sale_info3,
+            "h_orgtk_ret_pwd": ticket.sale_info4,
+        }
+        r = self._session.get(API_ENDPOINTS["myticketseat"], params=data)
+        j = json.loads(r.text)
+        try:
+            if self._result_check(j):
+                seat = (
+                    j.get("ticket_infos", {})
+                    .get("ticket_info", [{}])[0]
+                    .get("tk_seat_info", [{}])[0]
+                )
+                ticket.seat_no = seat.get("h_seat_no")
+                ticket.seat_no_end = None
+        except NoResultsError:
+            pass
+        return ticket
+
+    @_relogin_if_expired
+    def tickets(self):
+        return [self._with_seat(Ticket(info)) for info in self._ticket_list()]
+
+    @_relogin_if_expired
+    def ticket(self, pnr_no):
+        """One ticket by PNR, or None.
+
+        Two requests however many tickets the account holds: the ticket list,
+        and the seat of the matching ticket only.
+        """
+        for info in self._ticket_list():
+            ticket = Ticket(info)
+            if ticket.pnr_no == pnr_no:
+                return self._with_seat(ticket)
+        return None
+
+    def _reservation_list(self):
+        """Raw train entries of every journey (one ``myreservationview`` request)"""
         data = {
             "Device": self._device,
             "Version": self._version,
@@ -823,26 +1046,50 @@ class Korail:
         try:
             if not self._result_check(j):
                 return []
-
-            jrny_info = j.get("jrny_infos", {}).get("jrny_info", [])
-            reserves = []
-
-            for info in jrny_info:
-                train_info = info.get("train_infos", {}).get("train_info", [])
-                for tinfo in train_info:
-                    reservation = Reservation(tinfo)
-                    reservation.tickets, reservation.wct_no = self.ticket_info(
-                        reservation.rsv_id
-                    )
-                    if rsv_id and reservation.rsv_id == rsv_id:
-                        return reservation
-                    reserves.append(reservation)
-            return reserves
-
         except NoResultsError:
             return []
 
-    def ticket_info(self, rsv_id=None):
+        jrny_info = j.get("jrny_infos", {}).get("jrny_info", [])
+        tinfos = [
+            tinfo
+            for info in jrny_info
+            for tinfo in info.get("train_infos", {}).get("train_info", [])
+        ]
+        # A reservation of several journeys (a round trip) lists one entry per
+        # journey; number them so each one gets its own seats and cancel
+        counts = Counter(tinfo.get("h_pnr_no") for tinfo in tinfos)
+        seen = Counter()
+        for tinfo in tinfos:
+            pnr_no = tinfo.get("h_pnr_no")
+            seen[pnr_no] += 1
+            tinfo.setdefault("txtJrnySqno", f"{seen[pnr_no]:03d}")
+            tinfo.setdefault("txtJrnyCnt", f"{counts[pnr_no]:02d}")
+        return tinfos
+
+    def _with_tickets(self, reservation):
+        reservation.tickets, reservation.wct_no = self.ticket_info(reservation.rsv_id, reservation.journey_no)
+        return reservation
+
+    @_relogin_if_expired
+    def reservations(self, rsv_id=None):
+        if rsv_id:
+            return self.reservation(rsv_id)
+        return [self._with_tickets(Reservation(tinfo)) for tinfo in self._reservation_list()]
+
+    @_relogin_if_expired
+    def reservation(self, rsv_id):
+        """One reservation by id, or None.
+
+        Two requests however many reservations the account holds: the
+        reservation list, and the seats (``ticket_info``) of the match only.
+        """
+        for tinfo in self._reservation_list():
+            if tinfo.get("h_pnr_no") == rsv_id:
+                return self._with_tickets(Reservation(tinfo))
+        return None
+
+    @_relogin_if_expired
+    def ticket_info(self, rsv_id=None, journey_no="001"):
         data = {
             "Device": self._device,
             "Version": self._version,
@@ -857,8 +1104,10 @@ class Korail:
                 return [], None
 
             wct_no = j.get("h_wct_no")
-            if jrny_info := j.get("jrny_infos", {}).get("jrny_info", []):
-                if seat_info := jrny_info[0].get("seat_infos", {}).get("seat_info", []):
+            jrny_info = j.get("jrny_infos", {}).get("jrny_info", [])
+            journey = int(journey_no) - 1
+            if journey < len(jrny_info):
+                if seat_info := jrny_info[journey].get("seat_infos", {}).get("seat_info", []):
                     return [Seat(seat) for seat in seat_info], wct_no
             
             return [], wct_no
@@ -866,6 +1115,7 @@ class Korail:
         except NoResultsError:
             return None, None
 
+    @_relogin_if_expired
     def pay_with_card(
         self,
         rsv,
@@ -909,6 +1159,7 @@ class Korail:
             return True
         return False
 
+    @_relogin_if_expired
     def cancel(self, rsv):
         if not isinstance(rsv, (Reservation, Ticket)):
             raise TypeError("rsv must be a Reservation or Ticket instance")
@@ -930,6 +1181,7 @@ class Korail:
         j = json.loads(r.text)
         return self._result_check(j)
 
+    @_relogin_if_expired
     def refund(self, ticket):
         if not isinstance(ticket, Ticket):
             raise TypeError("ticket must be a Ticket instance")
@@ -0,0 +1,236 @@
+"""Pre-armed booking jobs fired at a ticket-open instant.
+
+An open-sale job does everything that does not depend on the sale being open
+ahead of time:
+
+1. ``LOGIN_LEAD`` seconds before the open instant it builds (and logs in) the
+   provider client.
+2. ``ARM_LEAD`` seconds before, it resolves the train, acquires the NetFunnel
+   key (SRT) and builds the reserve payload.
+3. At the open instant it sends the pre-built payload, followed by a few
+   staggered retries, and records how far from the open instant each request
+   actually left.
+
+Times are taken from the upstream clock of the provider being booked, and the
+job report carries that clock's estimated error bounds.
+"""
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from clock import upstream as upstream_clock
+
+LOGIN_LEAD = 60.0  # seconds
+ARM_LEAD = 10.0  # seconds, must stay under the NetFunnel key TTL
+SPIN_WINDOW = 0.02  # seconds of busy waiting before a send
+# The attempts reuse one payload and NetFunnel key; more of them only look like a burst upstream
+MAX_ATTEMPTS = 5
+MAX_STAGGER = 1.0  # seconds
+FINISHED_TTL = 10 * 60  # seconds a finished job stays readable
+
+JOBS: Dict[str, "OpenSaleJob"] = {}
+
+
+class OpenSaleJob:
+    """Scheduled reserve burst for one train.
+
+    Args:
+        provider: "SRT" or "KTX"
+        client_factory: Returns a logged-in ``srt.SRT``/``ktx.Korail``
+        open_at: Ticket-open instant (epoch seconds)
+        passengers: Passengers to reserve for
+        option: ``srt.SeatType``/``ktx.ReserveOption``
+        train: Train to reserve, if already known (e.g. from a train handle)
+        search: Called with the client to find the train when ``train`` is None
+        attempts: Number of reserve requests to send (at most ``MAX_ATTEMPTS``)
+        stagger: Seconds between consecutive attempts (at most ``MAX_STAGGER``)
+        clock_host: ``clock.HOSTS`` entry whose clock the open instant refers to
+        notify: Called with the reservation after a successful attempt
+        on_change: Called with the job whenever its report changes (state or attempts)
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        client_factory: Callable[[], Any],
+        open_at: float,
+        passengers: list,
+        option: Any,
+        train: Any = None,
+        search: Callable[[Any], Any] | None = None,
+        attempts: int = 3,
+        stagger: float = 0.15,
+        clock_host: str | None = None,
+        notify: Callable[[Any], None] | None = None,
+        on_change: Callable[["OpenSaleJob"], None] | None = None,
+    ) -> None:
+        if train is None and search is None:
+            raise ValueError('Either "train" or "search" must be given')
+
+        self.id = uuid.uuid4().hex[:12]
+        self.provider = provider
+        self.open_at = open_at
+        self.passengers = passengers
+        self.option = option
+        self.attempts = min(max(1, attempts), MAX_ATTEMPTS)
+        self.stagger = min(max(0.0, stagger), MAX_STAGGER)
+        self._on_change = on_change
+        self._state = "scheduled"
+        self.error: str | None = None
+        self.reservation: Any = None
+        self.results: List[dict] = []
+        self.finished_at: float | None = None
+
+        self._client_factory = client_factory
+        self._train = train
+        self._search = search
+        self._clock_host = clock_host
+        self._clock = lambda: upstream_clock.now(clock_host)
+        self._notify = notify
+        self._client: Any = None
+        self._payload: dict | None = None
+        self._cancelled = threading.Event()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, state: str) -> None:
+        self._state = state
+        self._changed()
+
+    def _changed(self) -> None:
+        if self._on_change:
+            try:
+                self._on_change(self)
+            except Exception:
+                pass  # a failing callback must not fail the job
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def run(self) -> None:
+        try:
+            if not self._wait_until(self.open_at - LOGIN_LEAD):
+                return
+            self.state = "logging_in"
+            self._client = self._client_factory()
+            if self._clock_host:
+                upstream_clock.calibrate(self._clock_host)
+
+            if not self._wait_until(self.open_at - ARM_LEAD):
+                return
+            self.state = "arming"
+            self._arm()
+            self.state = "armed"
+
+            self._fire()
+        except Exception as ex:
+            # The error first: setting the state notifies watchers
+            self.error = str(ex)
+            self.state = "failed"
+        finally:
+            self.finished_at = time.monotonic()
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "provider": self.provider,
+            "state": self.state,
+            "open_at": self.open_at,
+            "attempts": list(self.results),
+            "error": self.error,
+            "clock": upstream_clock.estimate(self._clock_host) if self._clock_host else None,
+        }
+
+    def _arm(self) -> None:
+        if self._train is None:
+            self._train = self._search(self._client)
+            if self._train is None:
+                raise LookupError("Train not found while arming the open-sale job")
+
+        if self.provider == "SRT":
+            import srt
+
+            self._payload = self._client._reserve_payload(
+                srt.RESERVE_JOBID["PERSONAL"], self._train, self.passengers, self.option
+            )
+        else:
+            self._payload = self._client._reserve_payload(
+                self._train, self.passengers, self.option, reserving_seat=True
+            )
+
+    def _fire(self) -> None:
+        self.state = "firing"
+        for i in range(self.attempts):
+            scheduled = self.open_at + i * self.stagger
+            if not self._wait_until(scheduled, spin=True):
+                return
+
+            sent_at = self._clock()
+            started = time.perf_counter()
+            result = {
+                "scheduled_offset_ms": round((scheduled - self.open_at) * 1000, 3),
+                "sent_offset_ms": round((sent_at - self.open_at) * 1000, 3),
+            }
+            unconfirmed = False
+            try:
+                self.reservation = self._client._submit_reserve(self._payload)
+                result["ok"] = True
+            except Exception as ex:
+                result["ok"] = False
+                result["error"] = str(ex)
+                unconfirmed = bool(getattr(ex, "rsv_id", None))
+            result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self.results.append(result)
+            self._changed()
+
+            if unconfirmed:
+                # Issued but not found: another attempt could book twice
+                self.error = result["error"]
+                self.state = "failed"
+                return
+
+            if self.reservation is not None:
+                self.state = "succeeded"
+                if self._notify:
+                    self._notify(self.reservation)
+                return
+
+        self.error = self.results[-1].get("error") if self.results else None
+        self.state = "failed"
+
+    def _wait_until(self, target: float, spin: bool = False) -> bool:
+        """Sleep until ``target`` on the job clock; returns False if cancelled."""
+        while True:
+            if self._cancelled.is_set():
+                self.state = "cancelled"
+                return False
+            remaining = target - self._clock()
+            if remaining <= 0:
+                return True
+            if spin and remaining <= SPIN_WINDOW:
+                continue
+            self._cancelled.wait(min(remaining - SPIN_WINDOW if spin else remaining, 1.0))
+
+
+def schedule(job: OpenSaleJob) -> str:
+    """Start ``job`` on a background thread and return its id."""
+    prune()
+    JOBS[job.id] = job
+    threading.Thread(target=job.run, name=f"open-sale-{job.id}", daemon=True).start()
+    return job.id
+
+
+def get(job_id: str) -> OpenSaleJob | None:
+    return JOBS.get(job_id)
+
+
+def prune(ttl: float = FINISHED_TTL) -> None:
+    """Forget jobs that finished more than ``ttl`` seconds ago."""
+    now = time.monotonic()
+    for job_id, job in list(JOBS.items()):
+        if job.finished_at is not None and now - job.finished_at > ttl:
+            JOBS.pop(job_id, None)
@@ -0,0 +1,232 @@
+"""Payment-deadline watchdog.
+
+Unpaid reservations are released upstream at their payment deadline
+(``SRTReservation.payment_date/payment_time``,
+``ktx.Reservation.buy_limit_date/buy_limit_time``). The watchdog keeps every
+tracked unpaid PNR in a heap ordered by its next due event and sleeps on a
+condition variable until exactly that moment (or until the heap changes):
+
+* reminders are pushed ``REMINDER_OFFSETS`` seconds before the deadline;
+* if a card for the PNR's account is stored in the card vault, the
+  reservation is paid ``PAY_LEAD`` seconds before the deadline.
+
+Cards are kept in a sealed store configured like the session store::
+
+    CARD_VAULT=file:/var/lib/train-booking/cards   # or sqlite:<path>
+    CARD_VAULT_KEY=<any secret string>
+"""
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import clock
+import session_store
+
+REMINDER_OFFSETS = (30 * 60, 10 * 60, 3 * 60)  # seconds before the deadline
+PAY_LEAD = 2 * 60  # seconds before the deadline
+
+_vault: session_store.SessionStore | None = None
+_vault_loaded = False
+
+
+class Deadline:
+    """An unpaid reservation and its payment deadline.
+
+    Args:
+        provider: "SRT" or "KTX"
+        account: Account id the reservation was made with
+        pnr: Reservation number
+        deadline: Payment deadline (epoch seconds)
+        summary: Short description used in reminders
+    """
+
+    def __init__(self, provider: str, account: str, pnr: str, deadline: float, summary: str = "") -> None:
+        self.provider = provider
+        self.account = account
+        self.pnr = pnr
+        self.deadline = deadline
+        self.summary = summary
+        self.paid = False
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.provider, self.pnr
+
+    def as_dict(self) -> dict:
+        return {
+            "provider": self.provider,
+            "pnr": self.pnr,
+            "deadline": self.deadline,
+            "summary": self.summary,
+            "paid": self.paid,
+        }
+
+
+def reservation_deadline(provider: str, reservation) -> float | None:
+    """Payment deadline of an unpaid reservation, or None if nothing is due."""
+    if provider == "SRT":
+        if reservation.paid or reservation.is_waiting:
+            return None
+        date, time = reservation.payment_date, reservation.payment_time
+    else:
+        if getattr(reservation, "is_ticket", False) or reservation.is_waiting:
+            return None
+        date, time = reservation.buy_limit_date, reservation.buy_limit_time
+    if not date or not time or date == "00000000":
+        return None
+    return datetime.strptime(date + time, "%Y%m%d%H%M%S").replace(tzinfo=clock.KST).timestamp()
+
+
+class PaymentWatchdog:
+    """Background reminders and auto-pay for unpaid reservations.
+
+    Args:
+        notify: Called with ``(title, body, deadline)`` for reminders and
+            auto-pay results, ``deadline`` being the ``Deadline`` concerned
+        pay: Called with a ``Deadline`` to pay it with the stored card; returns
+            True on success
+        has_card: Called with ``(provider, account)``; True if auto-pay is set up
+        reminder_offsets: Seconds before the deadline to send reminders at
+        pay_lead: Seconds before the deadline to auto-pay at
+
+    Examples:
+        >>> watchdog = PaymentWatchdog(send_push, pay_from_vault, vault_has_card)
+        >>> watchdog.track("SRT", account_id, reservation)
+        >>> watchdog.sync("SRT", account_id, reservations)  # after listing the account
+        >>> watchdog.untrack("SRT", reservation.reservation_number)  # paid or cancelled
+    """
+
+    def __init__(
+        self,
+        notify: Callable[[str, str, Deadline], None],
+        pay: Callable[[Deadline], bool],
+        has_card: Callable[[str, str], bool],
+        reminder_offsets: Tuple[float, ...] = REMINDER_OFFSETS,
+        pay_lead: float = PAY_LEAD,
+        now: Callable[[], float] = clock.now,
+    ) -> None:
+        self.reminder_offsets = tuple(sorted(reminder_offsets, reverse=True))
+        self.pay_lead = pay_lead
+        self._notify = notify
+        self._pay = pay
+        self._has_card = has_card
+        self._now = now
+        self._deadlines: Dict[Tuple[str, str], Deadline] = {}
+        self._events: List[Tuple[float, int, Deadline, str]] = []  # (due, seq, entry, kind)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def track(self, provider: str, account: str, reservation) -> Deadline | None:
+        """Start watching an unpaid reservation (no-op for paid or waitlisted ones)."""
+        deadline = reservation_deadline(provider, reservation)
+        if deadline is None:
+            return None
+        pnr = reservation.reservation_number if provider == "SRT" else reservation.rsv_id
+        summary = (
+            f"{reservation.dep_station_name} → {reservation.arr_station_name}"
+            if provider == "SRT"
+            else f"{reservation.dep_name} → {reservation.arr_name}"
+        )
+        entry = Deadline(provider, account, pnr, deadline, summary)
+
+        now = self._now()
+        with self._cond:
+            if entry.key in self._deadlines and self._deadlines[entry.key].deadline == deadline:
+                return self._deadlines[entry.key]
+            self._deadlines[entry.key] = entry
+            for offset in self.reminder_offsets:
+                if deadline - offset > now:
+                    self._push(deadline - offset, entry, "remind")
+            self._push(max(now, deadline - self.pay_lead), entry, "pay")
+            self._push(deadline, entry, "expire")
+            self._cond.notify()
+        self._start()
+        return entry
+
+    def sync(self, provider: str, account: str, reservations) -> None:
+        """Track the unpaid reservations of a full listing of ``account``.
+
+        Reservations of that account that the listing no longer shows as
+        unpaid (paid, cancelled or gone) are untracked.
+        """
+        keep = set()
+        for reservation in reservations:
+            entry = self.track(provider, account, reservation)
+            if entry is not None:
+                keep.add(entry.key)
+        with self._cond:
+            for key, entry in list(self._deadlines.items()):
+                if entry.provider == provider and entry.account == account and key not in keep:
+                    del self._deadlines[key]
+
+    def untrack(self, provider: str, pnr: str) -> None:
+        """Stop watching a reservation that was paid or cancelled."""
+        with self._cond:
+            self._deadlines.pop((provider, pnr), None)
+            # Its queued events are skipped when they come due
+
+    def pending(self) -> List[dict]:
+        with self._cond:
+            return sorted((d.as_dict() for d in self._deadlines.values()), key=lambda d: d["deadline"])
+
+    def _push(self, due: float, entry: Deadline, kind: str) -> None:
+        heapq.heappush(self._events, (due, next(self._seq), entry, kind))
+
+    def _start(self) -> None:
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="payment-watchdog", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    timeout = self._events[0][0] - self._now() if self._events else None
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                _, _, entry, kind = heapq.heappop(self._events)
+                # Skip events of reservations that were untracked or re-tracked since
+                current = self._deadlines.get(entry.key) is entry
+            if not current or entry.paid:
+                continue
+            try:
+                self._handle(entry, kind)
+            except Exception as ex:
+                self._notify("⚠️ 결제 확인 실패", f"{entry.summary} 예약({entry.pnr}) 처리 중 오류: {ex}", entry)
+
+    def _handle(self, entry: Deadline, kind: str) -> None:
+        minutes = max(0, round((entry.deadline - self._now()) / 60))
+        if kind == "remind":
+            auto = " (자동 결제 예정)" if self._has_card(entry.provider, entry.account) else ""
+            self._notify("⏰ 결제 기한 임박", f"{entry.summary} 예약({entry.pnr}) 결제 기한이 {minutes}분 남았습니다{auto}.", entry)
+        elif kind == "pay":
+            if not self._has_card(entry.provider, entry.account):
+                return
+            if self._pay(entry):
+                entry.paid = True
+                self.untrack(entry.provider, entry.pnr)
+                self._notify("💳 자동 결제 완료", f"{entry.summary} 예약({entry.pnr})을 결제했습니다.", entry)
+        else:
+            self.untrack(entry.provider, entry.pnr)
+            self._notify("❌ 결제 기한 만료", f"{entry.summary} 예약({entry.pnr})의 결제 기한이 지났습니다.", entry)
+
+
+def card_vault() -> session_store.SessionStore | None:
+    """Return the card store configured by ``CARD_VAULT``/``CARD_VAULT_KEY``, if any.
+
+    Cards are saved under ``("card:<provider>", account)`` and never expire.
+    """
+    global _vault, _vault_loaded
+    if not _vault_loaded:
+        spec, secret = os.environ.get("CARD_VAULT"), os.environ.get("CARD_VAULT_KEY")
+        if spec and secret:
+            _vault = session_store.from_spec(spec, secret, max_age=float("inf"))
+        _vault_loaded = True
+    return _vault
@@ -0,0 +1,219 @@
+"""Web Push fan-out with a background delivery queue.
+
+* ``SubscriptionStore`` keeps every browser subscription, keyed by user and
+  device (a hash of the push endpoint), optionally persisted to a JSON file
+  (``PUSH_STORE``) so subscriptions survive restarts.
+* ``PushService.send`` only enqueues one delivery per subscription and
+  returns; a bounded pool of worker threads talks to the push services, so a
+  booking response never waits on push delivery.
+* Signed VAPID headers are cached per push-service audience and reused until
+  shortly before their ``exp`` claim, instead of signing a JWT per message.
+* Subscriptions the push service reports as gone (404/410) are pruned.
+
+pywebpush/py_vapid are imported by the workers on first delivery.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+DEFAULT_USER = "default"
+MAX_WORKERS = 4
+QUEUE_SIZE = 1000
+TTL = 60 * 60  # seconds the push service keeps an undelivered message
+VAPID_LIFETIME = 12 * 60 * 60  # seconds, the longest exp push services accept
+VAPID_MARGIN = 5 * 60  # seconds before exp at which headers are re-signed
+GONE = (404, 410)
+
+logger = logging.getLogger(__name__)
+
+
+def device_id(subscription: dict) -> str:
+    return hashlib.sha256(subscription["endpoint"].encode("utf-8")).hexdigest()[:16]
+
+
+class SubscriptionStore:
+    """Push subscriptions keyed by ``(user, device)``.
+
+    Args:
+        path: JSON file to persist subscriptions to, or None to keep them in memory
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = Path(path) if path else None
+        self._subscriptions: Dict[Tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for entry in json.load(f):
+                    self._subscriptions[(entry["user"], entry["device"])] = entry["subscription"]
+
+    def add(self, user: str, subscription: dict) -> str:
+        if not subscription.get("endpoint"):
+            raise ValueError("Push subscription has no endpoint")
+        device = device_id(subscription)
+        with self._lock:
+            self._subscriptions[(user, device)] = subscription
+            self._save()
+        return device
+
+    def remove(self, user: str, device: str) -> None:
+        with self._lock:
+            if self._subscriptions.pop((user, device), None) is not None:
+                self._save()
+
+    def targets(self, user: str | None = None) -> List[Tuple[str, str, dict]]:
+        """``(user, device, subscription)`` for one user, or for everyone."""
+        with self._lock:
+            return [
+                (u, d, s) for (u, d), s in self._subscriptions.items() if user is None or u == user
+            ]
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        entries = [
+            {"user": u, "device": d, "subscription": s} for (u, d), s in self._subscriptions.items()
+        ]
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+
+class PushService:
+    """Queue-backed push sender.
+
+    Args:
+        store: Subscriptions to deliver to
+        private_key: VAPID private key
+        subject: VAPID ``sub`` claim (``mailto:`` address)
+        max_workers: Concurrent deliveries
+        queue_size: Deliveries buffered before new ones are dropped
+
+    Examples:
+        >>> push = PushService(SubscriptionStore(), os.environ["VAPID_PRIVATE_KEY"], "mailto:admin@example.com")
+        >>> push.send("✅ 예매 성공!", "수서 → 부산 열차 예매에 성공했습니다.", user=watcher_id)  # returns immediately
+    """
+
+    def __init__(
+        self,
+        store: SubscriptionStore,
+        private_key: str | None,
+        subject: str | None,
+        max_workers: int = MAX_WORKERS,
+        queue_size: int = QUEUE_SIZE,
+    ) -> None:
+        self.store = store
+        self.private_key = private_key
+        self.subject = subject
+        self.max_workers = max_workers
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "pruned": 0, "dropped": 0}
+        self._stats_lock = threading.Lock()  # workers count concurrently
+        self._queue: "queue.Queue[Tuple[str, str, dict, str]]" = queue.Queue(queue_size)
+        self._workers: List[threading.Thread] = []
+        self._vapid = None
+        self._headers: Dict[str, Tuple[float, dict]] = {}  # audience -> (exp, headers)
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def send(self, title: str, body: str, user: str | None = None) -> int:
+        """Queue a notification for every subscription of ``user`` (or everyone).
+
+        Returns the number of deliveries queued.
+        """
+        data = json.dumps({"title": title, "body": body})
+        targets = self.store.targets(user)
+        if not targets:
+            logger.warning("No push subscription available to send notification.")
+            return 0
+
+        self._start()
+        queued = 0
+        for target_user, device, subscription in targets:
+            try:
+                self._queue.put_nowait((target_user, device, subscription, data))
+                queued += 1
+            except queue.Full:
+                self._count("dropped")
+        self._count("queued", queued)
+        return queued
+
+    def _start(self) -> None:
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work, name=f"push-{len(self._workers)}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self) -> None:
+        while True:
+            user, device, subscription, data = self._queue.get()
+            try:
+                self._deliver(user, device, subscription, data)
+            except Exception as ex:
+                self._count("failed")
+                logger.error(f"An error occurred while sending push notification: {ex}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, user: str, device: str, subscription: dict, data: str) -> None:
+        from pywebpush import WebPusher
+
+        response = WebPusher(subscription).send(
+            data, headers=self._vapid_headers(subscription["endpoint"]), ttl=TTL
+        )
+        if response.status_code in GONE:
+            # The browser unsubscribed or the subscription expired
+            self.store.remove(user, device)
+            self._count("pruned")
+        elif response.status_code >= 400:
+            self._count("failed")
+            logger.error(f"Push service rejected notification: {response.status_code} {response.text}")
+        else:
+            self._count("sent")
+
+    def _vapid_headers(self, endpoint: str) -> dict:
+        """Signed VAPID headers for the endpoint's push service, cached until near ``exp``."""
+        parts = urlsplit(endpoint)
+        audience = f"{parts.scheme}://{parts.netloc}"
+        now = time.time()
+        with self._lock:
+            cached = self._headers.get(audience)
+            if cached and cached[0] - VAPID_MARGIN > now:
+                return dict(cached[1])
+
+            if self._vapid is None:
+                from py_vapid import Vapid
+
+                self._vapid = Vapid.from_string(private_key=self.private_key)
+            exp = int(now) + VAPID_LIFETIME
+            headers = self._vapid.sign({"sub": self.subject, "aud": audience, "exp": exp})
+            self._headers[audience] = (exp, headers)
+            return dict(headers)
+
+
+def from_env() -> PushService:
+    subject = os.environ.get("VAPID_ADMIN_EMAIL")
+    if subject and not subject.startswith(("mailto:", "https:")):
+        subject = f"mailto:{subject}"
+    return PushService(
+        SubscriptionStore(os.environ.get("PUSH_STORE")),
+        os.environ.get("VAPID_PRIVATE_KEY"),
+        subject,
+    )
@@ -0,0 +1,279 @@
+"""Deadlines, retries and hedging for upstream requests.
+
+Clients wrap their pooled session in a ``PolicySession``, which applies the
+``Policy`` registered for each endpoint URL:
+
+* every attempt gets a timeout, and all attempts of one call share a
+  deadline, so a stalled connection can no longer hold a worker for longer
+  than the endpoint's budget;
+* transient transport errors (connection reset, timeout...) are retried with
+  exponential backoff and jitter, but only for endpoints marked idempotent;
+  a reserve or payment that may have reached the server is never re-sent;
+* hedged reads: if an idempotent request has not answered after the
+  endpoint's observed p95 latency, the same request is sent once more on a
+  second session (with the same cookies), and whichever answers first within
+  the deadline is used; the other one is left to finish and ignored. The
+  first attempt runs on a thread of its own and only the hedge uses the
+  shared pool, so a busy pool delays hedges, never requests, and no pool
+  thread sleeps waiting for a hedge to be due.
+
+Endpoints without a registered policy get the session's default policy,
+``WRITE`` unless given: a deadline, no retries.
+"""
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict
+
+import session_store
+
+LATENCY_SAMPLES = 200  # per endpoint
+MIN_SAMPLES = 20  # before the observed p95 is trusted
+MIN_HEDGE_DELAY = 0.2  # seconds
+BACKOFF = 0.2  # seconds, doubled per retry
+MAX_WORKERS = 16
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    """The endpoint's deadline passed before any attempt succeeded."""
+
+
+class Policy:
+    """How requests to one endpoint are bounded and retried.
+
+    Args:
+        timeout: Seconds per attempt
+        deadline: Seconds for the whole call, retries and backoff included
+        retries: Extra attempts after a transient transport error
+        idempotent: Whether the request may safely be sent more than once;
+            retries and hedging only apply to idempotent requests
+        hedge: Send a second attempt after the observed p95 latency
+        hedge_delay: Delay before hedging until enough latencies are observed
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        deadline: float | None = None,
+        retries: int = 0,
+        idempotent: bool = False,
+        hedge: bool = False,
+        hedge_delay: float = 1.0,
+    ) -> None:
+        self.timeout = timeout
+        self.deadline = deadline or timeout
+        self.retries = retries if idempotent else 0
+        self.idempotent = idempotent
+        self.hedge = hedge and idempotent
+        self.hedge_delay = hedge_delay
+
+
+READ = Policy(timeout=5.0, deadline=12.0, retries=2, idempotent=True)
+HEDGED_READ = Policy(timeout=5.0, deadline=12.0, retries=2, idempotent=True, hedge=True)
+WRITE = Policy(timeout=15.0)
+
+
+class Latency:
+    """Recent latencies of one endpoint."""
+
+    def __init__(self, size: int = LATENCY_SAMPLES) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> float | None:
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+LATENCIES: Dict[str, Latency] = {}
+
+
+def latency(url: str) -> Latency:
+    if url not in LATENCIES:
+        LATENCIES.setdefault(url, Latency())
+    return LATENCIES[url]
+
+
+def is_transient(error: BaseException) -> bool:
+    """Connection-level failures of the HTTP library, not HTTP or API errors."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    module = type(error).__module__ or ""
+    # requests raises OSError subclasses; curl_cffi raises its own CurlError types
+    return isinstance(error, OSError) or module.startswith("curl_cffi")
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="hedge")
+    return _pool
+
+
+class PolicySession:
+    """A session wrapper applying per-endpoint policies to ``get``/``post``.
+
+    Everything else (cookies, headers, ...) is forwarded to the wrapped session.
+
+    Args:
+        session: curl_cffi or requests session
+        policies: Endpoint URL -> ``Policy``
+        default: Policy of URLs not in ``policies``
+        spare: Returns an extra session for hedged attempts; called with no
+            arguments, and the session is handed back through ``release``
+        release: Takes back a session obtained from ``spare``
+
+    Examples:
+        >>> self._session = PolicySession(
+        ...     SESSION_POOL.lease(self), POLICIES, spare=SESSION_POOL.acquire, release=SESSION_POOL.release
+        ... )
+        >>> self._session.post(url=API_ENDPOINTS["search_schedule"], data=data)
+    """
+
+    def __init__(
+        self,
+        session: Any,
+        policies: Dict[str, Policy],
+        default: Policy | None = None,
+        spare: Callable[[], Any] | None = None,
+        release: Callable[[Any], None] | None = None,
+    ) -> None:
+        self.session = session
+        self.policies = policies
+        self.default = default or WRITE
+        self._spare = spare
+        self._release = release
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    def get(self, url: str, **kwargs: Any) -> Any:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> Any:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Any:
+        policy = self.policies.get(url, self.default)
+        expires = time.monotonic() + policy.deadline
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{method} {url} exceeded its {policy.deadline:.0f}s deadline")
+            try:
+                if policy.hedge and self._spare:
+                    return self._hedged(method, url, policy, expires, kwargs)
+                return self._send(self.session, method, url, min(policy.timeout, remaining), kwargs)
+            except Exception as ex:
+                if attempt >= policy.retries or not is_transient(ex):
+                    raise
+            attempt += 1
+            delay = BACKOFF * 2 ** (attempt - 1) * (0.5 + random.random())
+            if time.monotonic() + delay >= expires:
+                raise DeadlineExceeded(f"{method} {url} exceeded its {policy.deadline:.0f}s deadline")
+            time.sleep(delay)
+
+    def _send(self, session: Any, method: str, url: str, timeout: float, kwargs: dict) -> Any:
+        started = time.monotonic()
+        response = getattr(session, method.lower())(url, timeout=timeout, **kwargs)
+        latency(url).add(time.monotonic() - started)
+        return response
+
+    def _hedged(self, method: str, url: str, policy: Policy, expires: float, kwargs: dict) -> Any:
+        timeout = min(policy.timeout, expires - time.monotonic())
+        delay = max(MIN_HEDGE_DELAY, latency(url).p95() or policy.hedge_delay)
+        if delay >= timeout:
+            return self._send(self.session, method, url, timeout, kwargs)
+
+        primary = _spawn(self._send, self.session, method, url, timeout, kwargs)
+        if wait([primary], timeout=delay).done:
+            return primary.result()  # answered (or failed) before the hedge was due; retry as usual
+
+        hedge = _executor().submit(self._hedge, expires, method, url, policy, kwargs)
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, expires - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            # Both may have answered at once; the first attempt's answer wins then
+            for future in sorted(done, key=lambda f: f is not primary):
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if future is primary:
+                    hedge.cancel()
+                    hedge.add_done_callback(self._release_hedge)
+                    return primary.result()
+                spare, response = hedge.result()
+                self._adopt(spare)
+                return response
+        if pending:
+            hedge.cancel()
+            hedge.add_done_callback(self._release_hedge)
+            raise DeadlineExceeded(f"{method} {url} exceeded its {policy.deadline:.0f}s deadline") from error
+        raise error
+
+    def _hedge(self, expires: float, method: str, url: str, policy: Policy, kwargs: dict) -> tuple:
+        """Pool task: send the same request on a spare session with the same cookies."""
+        timeout = min(policy.timeout, expires - time.monotonic())
+        if timeout <= 0:
+            raise DeadlineExceeded(f"{method} {url}: no time left to hedge")
+        spare = self._spare()
+        try:
+            spare.headers.update(self.session.headers)
+            session_store.restore_cookies(spare, session_store.dump_cookies(self.session))
+            return spare, self._send(spare, method, url, timeout, kwargs)
+        except BaseException:
+            self._release(spare)
+            raise
+
+    def _release_hedge(self, future: Any) -> None:
+        """Hand back the spare session of a hedge whose answer was not used."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        spare, _ = future.result()
+        if spare is not None:
+            self._release(spare)
+
+    def _adopt(self, spare: Any) -> None:
+        """Continue on the spare session, whose hedge answered after the first
+        attempt failed.
+
+        The replaced session stays with whoever owned it (the pool lease
+        finalizer, or the finalizer registered here for an earlier spare).
+        """
+        self.session = spare
+        weakref.finalize(self, self._release, spare)
+
+
+def _spawn(fn: Callable[..., Any], *args: Any) -> Future:
+    """Run ``fn`` on a thread of its own: the first attempt of a hedged call
+    must not queue behind other calls' hedges on the shared pool."""
+    future: Future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as ex:
+            future.set_exception(ex)
+
+    threading.Thread(target=run, name="hedged-first", daemon=True).start()
+    return future
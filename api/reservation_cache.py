@@ -0,0 +1,300 @@
+"""Per-account reservation lists, indexed by reservation number.
+
+``/api/reservations`` used to list every account's reservations on every
+screen load, and ``/api/pay``/``/api/cancel`` listed them again to find one
+PNR by scanning. The cache keeps each account's last listing together with
+an index by reservation number (``SRTReservation.reservation_number``,
+``ktx.Reservation.rsv_id``/``ktx.Ticket.pnr_no``):
+
+* a listing is loaded once and then refreshed in the background every
+  ``REFRESH_INTERVAL`` for as long as it was read within ``IDLE_TIMEOUT``;
+* writes go through the cache: a new reservation is added (``add``), a
+  cancelled or refunded journey removed (``discard``), and a paid account is
+  reloaded (``invalidate``), since payment turns a reservation into a ticket;
+  an invalidated listing is not served until it was reloaded;
+* every write bumps the account's generation. A load that started before the
+  latest write may have listed the account without it, so it is fetched again
+  (up to ``LOAD_ATTEMPTS`` times) and otherwise kept stale, i.e. neither
+  served nor searched by ``find`` until the next reload; ``listing`` then
+  loads once more and raises ``StaleListingError`` if that is stale too;
+* ``find`` resolves a reservation number from the index. On a miss it asks
+  each account for that one reservation (``fetch_one``, a constant number of
+  requests) rather than listing it again, and adds what it found to the
+  account's listing; accounts listed less than ``MIN_RELOAD`` ago are
+  trusted and skipped.
+
+Listings of one account are loaded at most once at a time; background
+reloads are dispatched by the shared ``scheduler.Scheduler``, each account
+counting as one user of its provider's budget.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from inflight import InFlight
+from scheduler import Scheduler
+
+REFRESH_INTERVAL = 60.0  # seconds
+IDLE_TIMEOUT = 10 * 60  # seconds
+MIN_RELOAD = 5.0  # seconds
+LOAD_ATTEMPTS = 3  # fetches per load while writes keep landing during them
+
+
+class StaleListingError(RuntimeError):
+    """Writes kept landing while the account was listed, so no listing of it
+    can be trusted yet."""
+
+Key = Tuple[str, str]  # (provider, account id)
+
+
+def reservation_id(reservation: Any) -> str | None:
+    """Reservation number of an SRT reservation or a Korail reservation/ticket."""
+    for attr in ("reservation_number", "rsv_id", "pnr_no"):
+        value = getattr(reservation, attr, None)
+        if value:
+            return str(value)
+    return None
+
+
+def journey(reservation: Any) -> Tuple[Any, Any]:
+    """Train and date of a reservation; tells apart the journeys of one
+    reservation number (e.g. both legs of a Korail round trip)."""
+    train = getattr(reservation, "train_number", None) or getattr(reservation, "train_no", None)
+    return train, getattr(reservation, "dep_date", None)
+
+
+class Listing:
+    def __init__(self, reservations: List[Any], now: float) -> None:
+        self.reservations = reservations
+        self.index: Dict[str, List[Any]] = {}
+        for reservation in reservations:
+            self.index.setdefault(reservation_id(reservation), []).append(reservation)
+        self.loaded_at = now
+        self.read_at = now
+        self.stale = False
+
+
+class ReservationCache:
+    """Reservation listings per ``(provider, account)`` with write-through updates.
+
+    Args:
+        fetch: Called with ``(provider, account_id)``; lists that account's
+            reservations (and tickets) upstream
+        fetch_one: Called with ``(provider, account_id, reservation_number)``;
+            returns the reservations/tickets with that number (used on index
+            misses; without it the account is listed again)
+        loaded: Called with ``(provider, account_id, reservations)`` after
+            every load, e.g. to watch payment deadlines
+        refresh_interval: Seconds between background reloads of a listing
+        scheduler: Dispatches the background reloads (a private one if not given)
+
+    Examples:
+        >>> cache = ReservationCache(fetch_reservations)
+        >>> cache.listing("SRT", account.id)
+        >>> account_id, reservation = cache.find("SRT", pnr, [a.id for a in registry.accounts])
+        >>> cache.discard("SRT", account_id, reservation)  # after cancelling it
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str, str], List[Any]],
+        fetch_one: Callable[[str, str, str], List[Any]] | None = None,
+        loaded: Callable[[str, str, List[Any]], None] | None = None,
+        refresh_interval: float = REFRESH_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        scheduler: Scheduler | None = None,
+        now: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.refresh_interval = refresh_interval
+        self.idle_timeout = idle_timeout
+        self.stats = {"hits": 0, "loads": 0, "refreshes": 0}
+        self._fetch = fetch
+        self._fetch_one = fetch_one
+        self._loaded = loaded
+        self._now = now
+        self._listings: Dict[Key, Listing] = {}
+        self._generations: Dict[Key, int] = {}  # bumped by every write
+        self._loads = InFlight(ttl=0)
+        self._scheduler = scheduler or Scheduler()
+        self._lock = threading.Lock()
+
+    def listing(self, provider: str, account_id: str, fresh: bool = False) -> List[Any]:
+        """The account's reservations, loaded upstream only if not cached (or ``fresh``).
+
+        Raises:
+            StaleListingError: If writes kept landing during two loads in a row
+        """
+        key = (provider, account_id)
+        with self._lock:
+            listing = self._listings.get(key)
+            if not fresh and listing is not None and not listing.stale:
+                listing.read_at = self._now()
+                self.stats["hits"] += 1
+                return list(listing.reservations)
+        listing = self.load(provider, account_id)
+        if listing.stale:
+            listing = self.load(provider, account_id)
+        if listing.stale:
+            raise StaleListingError(f"Reservations of {account_id} changed while they were listed; try again")
+        return list(listing.reservations)
+
+    def load(self, provider: str, account_id: str) -> Listing:
+        """List the account upstream now (shared with a load already running)."""
+        key = (provider, account_id)
+        return self._loads.run(key, lambda: self._load(key))
+
+    def find(
+        self,
+        provider: str,
+        reservation_number: str,
+        account_ids: Iterable[str],
+        match: Callable[[Any], bool] | None = None,
+    ) -> Tuple[str, Any] | None:
+        """``(account_id, reservation)`` of a reservation number among some accounts.
+
+        Args:
+            provider: "SRT" or "KTX"
+            reservation_number: PNR / ``rsv_id`` to look up
+            account_ids: Accounts that may hold it, in lookup order
+            match: Only accept reservations for which this returns True
+                (e.g. unpaid ones)
+        """
+        account_ids = list(account_ids)
+        found = self._lookup(provider, reservation_number, account_ids, match)
+        if found:
+            return found
+        now = self._now()
+        for account_id in account_ids:
+            with self._lock:
+                listing = self._listings.get((provider, account_id))
+                fresh = listing is not None and not listing.stale and now - listing.loaded_at < MIN_RELOAD
+            if fresh:
+                continue
+            if self._fetch_one is None:
+                self.load(provider, account_id)
+                found = self._lookup(provider, reservation_number, [account_id], match)
+                if found:
+                    return found
+                continue
+            for reservation in self._fetch_one(provider, account_id, reservation_number):
+                self.add(provider, account_id, reservation)
+                if match is None or match(reservation):
+                    return account_id, reservation
+        return None
+
+    def add(self, provider: str, account_id: str, reservation: Any) -> None:
+        """Put a new reservation into a cached listing (no-op if the account is not cached).
+
+        It replaces the entry of the same number and journey; other journeys
+        under that number are kept.
+        """
+        if reservation is None:
+            raise ValueError("No reservation to add")
+        with self._lock:
+            self._written((provider, account_id))
+            listing = self._listings.get((provider, account_id))
+            if listing is None:
+                return
+            number = reservation_id(reservation)
+            known = [r for r in listing.index.get(number, []) if journey(r) == journey(reservation)]
+            listing.reservations = [r for r in listing.reservations if all(r is not k for k in known)] + [reservation]
+            listing.index[number] = [r for r in listing.index.get(number, []) if all(r is not k for k in known)] + [reservation]
+
+    def discard(self, provider: str, account_id: str, reservation: Any) -> None:
+        """Remove a cancelled or refunded reservation from a cached listing.
+
+        Like ``add``, only the entry of its number and journey goes; other
+        journeys under that number are kept.
+        """
+        with self._lock:
+            self._written((provider, account_id))
+            listing = self._listings.get((provider, account_id))
+            if listing is None:
+                return
+            number = reservation_id(reservation)
+            removed = [r for r in listing.index.get(number, []) if journey(r) == journey(reservation)]
+            listing.reservations = [r for r in listing.reservations if all(r is not x for x in removed)]
+            kept = [r for r in listing.index.get(number, []) if all(r is not x for x in removed)]
+            if kept:
+                listing.index[number] = kept
+            else:
+                listing.index.pop(number, None)
+
+    def invalidate(self, provider: str, account_id: str) -> None:
+        """Reload the account's listing (e.g. after a payment): in the background,
+        or on its next ``listing()`` if that comes first."""
+        key = (provider, account_id)
+        with self._lock:
+            self._written(key)
+            listing = self._listings.get(key)
+            if listing is None:
+                return
+            listing.stale = True
+        self._schedule(key, 0.0)
+
+    def _written(self, key: Key) -> None:
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _lookup(
+        self, provider: str, number: str, account_ids: List[str], match: Callable[[Any], bool] | None
+    ) -> Tuple[str, Any] | None:
+        now = self._now()
+        with self._lock:
+            for account_id in account_ids:
+                listing = self._listings.get((provider, account_id))
+                if listing is None or listing.stale:
+                    continue  # a stale listing may still hold e.g. a paid reservation as unpaid
+                for reservation in listing.index.get(str(number), ()):
+                    if match is None or match(reservation):
+                        listing.read_at = now
+                        self.stats["hits"] += 1
+                        return account_id, reservation
+        return None
+
+    def _load(self, key: Key) -> Listing:
+        provider, account_id = key
+        for attempt in range(LOAD_ATTEMPTS):
+            with self._lock:
+                generation = self._generations.get(key, 0)
+            reservations = list(self._fetch(provider, account_id))
+            listing = Listing(reservations, self._now())
+            with self._lock:
+                # A write after the fetch started may be missing from it (or undone by it)
+                listing.stale = self._generations.get(key, 0) != generation
+                if listing.stale and attempt + 1 < LOAD_ATTEMPTS:
+                    continue
+                previous = self._listings.get(key)
+                if previous is not None:
+                    listing.read_at = previous.read_at
+                self._listings[key] = listing
+                self.stats["loads"] += 1
+                break
+        if listing.stale:
+            self._schedule(key, 0.0)
+            return listing
+        self._schedule(key, self.refresh_interval)
+        if self._loaded:
+            try:
+                self._loaded(provider, account_id, reservations)
+            except Exception:
+                pass  # a failing callback must not fail the listing
+        return listing
+
+    def _schedule(self, key: Key, delay: float) -> None:
+        provider, account_id = key
+        self._scheduler.submit(("reservations", key), lambda: self._refresh(key), delay, provider=provider, users=[account_id])
+
+    def _refresh(self, key: Key) -> None:
+        with self._lock:
+            listing = self._listings.get(key)
+            if listing is None:
+                return
+            if self._now() - listing.read_at > self.idle_timeout:
+                del self._listings[key]
+                return
+        try:
+            self.load(*key)
+            self.stats["refreshes"] += 1
+        except Exception:
+            # Keep serving the old listing; retry after another interval
+            self._schedule(key, self.refresh_interval)
@@ -0,0 +1,179 @@
+"""Round-trip booking: an outbound and a return train as one booking.
+
+Booking the return leg after the outbound one means two searches and two
+reserves in a row, and the return often sells out in between. A round trip
+instead:
+
+1. searches (or decodes the handles of) both legs concurrently;
+2. reserves both legs as close together as possible: with one upstream
+   request where the provider takes several journeys in one reservation
+   (``reserve_both``), otherwise with two reserves released at the same
+   instant from two threads;
+3. if one leg could not be reserved, cancels the other one (``rollback``), so
+   the user is not left with half a trip, unless asked to keep it.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+LEGS = ("outbound", "return")
+
+
+class CombinedUnsupported(Exception):
+    """``reserve_both`` booked nothing and the trains may be reserved one by one."""
+
+
+class Leg:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.train: Any = None
+        self.reservation: Any = None
+        self.error: str | None = None
+        self.cancelled = False
+
+    def to_dict(self) -> dict:
+        train = self.train
+        return {
+            "leg": self.name,
+            "train_number": getattr(train, "train_number", None) or getattr(train, "train_no", None),
+            "dep_date": getattr(train, "dep_date", None),
+            "dep_time": getattr(train, "dep_time", None),
+            "reserved": self.reservation is not None and not self.cancelled,
+            "cancelled": self.cancelled,
+            "error": self.error,
+        }
+
+
+class RoundTrip:
+    """Book both legs of a round trip.
+
+    Args:
+        find: Called with a leg name ("outbound"/"return"); returns its train
+            or None when the train is not found
+        reserve: Called with ``(leg, train)``; reserves that leg. Both legs are
+            reserved at the same time, so it must not share a client between legs
+        cancel: Called with ``(leg, reservation)``
+        reserve_both: Optional; called with ``(outbound_train, return_train)``,
+            reserves both in one upstream request and returns both reservations.
+            Raises ``CombinedUnsupported`` to fall back to two reserves, which
+            it may only do when nothing was reserved; any other error fails
+            the trip without a second try, since the legs may already be booked
+        rollback: Cancel the reserved leg when the other one failed
+
+    Examples:
+        >>> trip = RoundTrip(find, reserve, cancel, rollback=True).run()
+        >>> trip.state, trip.reservations
+    """
+
+    def __init__(
+        self,
+        find: Callable[[str], Any],
+        reserve: Callable[[str, Any], Any],
+        cancel: Callable[[str, Any], None],
+        reserve_both: Callable[[Any, Any], Tuple[Any, Any]] | None = None,
+        rollback: bool = True,
+    ) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.rollback = rollback
+        self.state = "pending"
+        self.combined = False
+        self.legs: Dict[str, Leg] = {name: Leg(name) for name in LEGS}
+        self.timings: Dict[str, float] = {}
+        self._find = find
+        self._reserve = reserve
+        self._cancel = cancel
+        self._reserve_both = reserve_both
+
+    @property
+    def reservations(self) -> Dict[str, Any]:
+        return {name: leg.reservation for name, leg in self.legs.items() if leg.reservation is not None and not leg.cancelled}
+
+    @property
+    def error(self) -> str | None:
+        errors = [f"{leg.name}: {leg.error}" for leg in self.legs.values() if leg.error]
+        return "; ".join(errors) or None
+
+    def run(self) -> "RoundTrip":
+        started = time.monotonic()
+        with ThreadPoolExecutor(len(LEGS), thread_name_prefix=f"round-trip-{self.id}") as pool:
+            self._search(pool)
+            self.timings["search"] = time.monotonic() - started
+            if all(leg.train is not None for leg in self.legs.values()):
+                reserving = time.monotonic()
+                if not self._reserve_together():
+                    self._reserve_apart(pool)
+                self.timings["reserve"] = time.monotonic() - reserving
+
+        reserved = [leg for leg in self.legs.values() if leg.reservation is not None]
+        if len(reserved) == len(LEGS):
+            self.state = "succeeded"
+        elif reserved and self.rollback:
+            for leg in reserved:
+                self._undo(leg)
+            self.state = "rolled_back"
+        else:
+            self.state = "partial" if reserved else "failed"
+        return self
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "combined": self.combined,
+            "legs": [leg.to_dict() for leg in self.legs.values()],
+            "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            "error": self.error,
+        }
+
+    def _search(self, pool: ThreadPoolExecutor) -> None:
+        futures = {name: pool.submit(self._find, name) for name in LEGS}
+        for name, future in futures.items():
+            leg = self.legs[name]
+            try:
+                leg.train = future.result()
+                if leg.train is None:
+                    leg.error = "train not found"
+            except Exception as ex:
+                leg.error = str(ex)
+
+    def _reserve_together(self) -> bool:
+        """One upstream request for both legs; False to reserve them apart instead."""
+        if self._reserve_both is None:
+            return False
+        outbound, inbound = (self.legs[name] for name in LEGS)
+        try:
+            outbound.reservation, inbound.reservation = self._reserve_both(outbound.train, inbound.train)
+        except CombinedUnsupported:
+            return False
+        except Exception as ex:
+            outbound.error = inbound.error = str(ex)
+            return True
+        self.combined = True
+        return True
+
+    def _reserve_apart(self, pool: ThreadPoolExecutor) -> None:
+        # Both requests leave at the same instant, so neither leg waits for the other's round trip
+        barrier = threading.Barrier(len(LEGS))
+
+        def reserve(leg: Leg) -> None:
+            try:
+                barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+            try:
+                leg.reservation = self._reserve(leg.name, leg.train)
+                leg.error = None
+            except Exception as ex:
+                leg.error = str(ex)
+
+        for future in [pool.submit(reserve, leg) for leg in self.legs.values()]:
+            future.result()
+
+    def _undo(self, leg: Leg) -> None:
+        try:
+            self._cancel(leg.name, leg.reservation)
+            leg.cancelled = True
+        except Exception as ex:
+            leg.error = f"rollback failed: {ex}"
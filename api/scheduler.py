@@ -0,0 +1,294 @@
+"""One timing queue for every background poll, shared fairly.
+
+Seat-availability routes, SRT standbys and reservation listings are all
+polled in the background, for many users at once and against the same
+upstream budget. Instead of one loop per poller racing for it, each poll is
+a job submitted here with the time it is next due, and one dispatcher picks
+what runs:
+
+* identical polls merge: a job is keyed (e.g. ``("availability", route)``)
+  and a key has at most one pending poll, due at the earliest time asked for
+  and serving every user that asked;
+* each provider has a budget (``BUDGETS``, a token bucket of polls per
+  second); a due poll waits for its provider's budget instead of spending it
+  on top of everyone else's;
+* among due polls, the most urgent goes first: jobs close to their deadline
+  (departure, or the moment a sale opens) are ranked by ``PRIORITIES``;
+* within one priority, the user who got the least polls so far goes first.
+  A poll counts for all of its users in equal parts, so a user's route shared
+  with others costs that user less than one watched alone, and a user
+  watching many routes does not crowd out users watching one.
+
+Jobs run on a small pool (``workers``) and submit their own next poll.
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+
+import clock
+
+WORKERS = 6
+# provider -> (polls per second, burst)
+BUDGETS = {
+    "SRT": (2.0, 5.0),
+    "KTX": (2.0, 5.0),
+}
+# (seconds to deadline below, priority), most urgent first; anything later is IDLE_PRIORITY
+PRIORITIES = (
+    (10 * 60, 0),
+    (60 * 60, 1),
+    (6 * 60 * 60, 2),
+)
+IDLE_PRIORITY = 3
+
+
+def priority(seconds_to_deadline: float | None, priorities=PRIORITIES) -> int:
+    """Rank of a job by the time left to its deadline; lower runs first."""
+    if seconds_to_deadline is None:
+        return IDLE_PRIORITY
+    for threshold, level in priorities:
+        if seconds_to_deadline < threshold:
+            return level
+    return IDLE_PRIORITY
+
+
+def budgets_from_env(var: str = "POLL_BUDGETS") -> Dict[str, Tuple[float, float]]:
+    """``BUDGETS`` with overrides from e.g. ``POLL_BUDGETS='{"SRT": {"rate": 1, "burst": 3}}'``."""
+    budgets = dict(BUDGETS)
+    for provider, entry in json.loads(os.environ.get(var) or "{}").items():
+        rate, burst = budgets.get(provider, BUDGETS["SRT"])
+        budgets[provider] = (float(entry.get("rate", rate)), float(entry.get("burst", burst)))
+    return budgets
+
+
+class Budget:
+    """Token bucket of one provider's background polls."""
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = now
+
+    def tokens(self, now: float) -> float:
+        return min(self.burst, self._tokens + (now - self._updated) * self.rate)
+
+    def wait(self, now: float) -> float:
+        """Seconds until a poll may be spent (0 if one is available)."""
+        return max(0.0, (1 - self.tokens(now)) / self.rate)
+
+    def take(self, now: float) -> None:
+        self._tokens, self._updated = self.tokens(now) - 1, now
+
+
+class Job:
+    def __init__(
+        self,
+        key: Hashable,
+        run: Callable[[], None],
+        provider: str | None,
+        users: Iterable[str],
+        deadline: float | None,
+        due: float,
+    ) -> None:
+        self.key = key
+        self.run = run
+        self.provider = provider
+        self.users = set(users)
+        self.deadline = deadline
+        self.due = due
+
+
+class Scheduler:
+    """Dispatches background polls by due time, priority, user share and provider budget.
+
+    Args:
+        budgets: ``provider -> (polls per second, burst)``; providers not
+            listed (and jobs without a provider) are not limited
+        workers: Polls running at the same time
+        priorities: ``(seconds to deadline below, priority)`` pairs
+
+    Examples:
+        >>> polls = Scheduler(budgets_from_env())
+        >>> polls.submit(("availability", route), lambda: poll(route), delay=5,
+        ...              provider="SRT", users={"alice", "bob"}, deadline=departure)
+        >>> polls.cancel(("availability", route))
+    """
+
+    def __init__(
+        self,
+        budgets: Dict[str, Tuple[float, float]] | None = None,
+        workers: int = WORKERS,
+        priorities: Tuple[Tuple[float, int], ...] = PRIORITIES,
+        now: Callable[[], float] = clock.now,
+    ) -> None:
+        self.priorities = priorities
+        self.stats = {"submitted": 0, "merged": 0, "dispatched": 0, "failed": 0}
+        self._now = now
+        self._workers = workers
+        self._budgets = {provider: Budget(rate, burst, now()) for provider, (rate, burst) in (budgets or {}).items()}
+        self._jobs: Dict[Hashable, Job] = {}  # pending, by key
+        self._events: List[Tuple[float, int, Hashable]] = []  # (due, seq, key)
+        self._ready: Dict[Hashable, Job] = {}  # due, waiting for budget or a turn
+        self._running: Dict[Hashable, Job] = {}
+        self._served: Dict[str, float] = {}  # user -> polls received, shared polls split
+        self._holds: Dict[str, int] = {}  # user -> pending and running jobs
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._pool: ThreadPoolExecutor | None = None
+
+    def submit(
+        self,
+        key: Hashable,
+        run: Callable[[], None],
+        delay: float = 0.0,
+        provider: str | None = None,
+        users: Iterable[str] = (),
+        deadline: float | None = None,
+    ) -> None:
+        """Schedule the next poll of ``key``, merged with one already pending.
+
+        Args:
+            key: Identity of the poll; polls of one key are merged
+            run: The poll; called on the worker pool, and may submit the next one
+            delay: Seconds from now the poll is due
+            provider: Upstream whose budget the poll spends
+            users: Users the poll is for (their share decides turns)
+            deadline: Epoch seconds of the departure or sale-open the poll is
+                for; polls close to it run first
+        """
+        with self._cond:
+            due = self._now() + max(0.0, delay)
+            self.stats["submitted"] += 1
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = Job(key, run, provider, (), deadline, due)
+                self._push(job)
+            else:
+                self.stats["merged"] += 1
+                job.run = run
+                if deadline is not None and (job.deadline is None or deadline < job.deadline):
+                    job.deadline = deadline
+                if due < job.due and key not in self._ready:
+                    job.due = due
+                    self._push(job)
+            self._hold(job, users)
+            self._cond.notify()
+        self._start()
+
+    def cancel(self, key: Hashable) -> None:
+        """Drop the pending poll of ``key`` (one already running finishes)."""
+        with self._cond:
+            job = self._jobs.pop(key, None)
+            if job is not None:
+                self._ready.pop(key, None)
+                self._release(job)
+
+    def status(self) -> dict:
+        now = self._now()
+        with self._cond:
+            return {
+                **self.stats,
+                "pending": len(self._jobs) - len(self._ready),
+                "ready": len(self._ready),
+                "running": len(self._running),
+                "budgets": {p: round(b.tokens(now), 2) for p, b in self._budgets.items()},
+                "users": {user: round(served, 2) for user, served in self._served.items()},
+            }
+
+    def _push(self, job: Job) -> None:
+        heapq.heappush(self._events, (job.due, next(self._seq), job.key))
+
+    def _hold(self, job: Job, users: Iterable[str]) -> None:
+        # A user joining starts level with the least served active user, so
+        # coming back after a quiet hour does not buy a burst of turns
+        floor = min(self._served.values(), default=0.0)
+        for user in set(users) - job.users:
+            job.users.add(user)
+            self._holds[user] = self._holds.get(user, 0) + 1
+            self._served[user] = max(self._served.get(user, 0.0), floor)
+
+    def _release(self, job: Job) -> None:
+        for user in job.users:
+            self._holds[user] -= 1
+            if not self._holds[user]:
+                del self._holds[user]
+                del self._served[user]
+
+    def _start(self) -> None:
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self._workers, thread_name_prefix="poll")
+            self._thread = threading.Thread(target=self._run, name="poll-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = self._now()
+                    self._promote(now)
+                    job, wait = self._pick(now)
+                    if job is not None:
+                        break
+                    if self._events:
+                        next_due = self._events[0][0] - now
+                        wait = next_due if wait is None else min(wait, next_due)
+                    self._cond.wait(wait)
+                del self._jobs[job.key]
+                del self._ready[job.key]
+                self._running[job.key] = job
+                if job.provider in self._budgets:
+                    self._budgets[job.provider].take(now)
+                for user in job.users:
+                    self._served[user] += 1 / len(job.users)
+                self.stats["dispatched"] += 1
+            self._pool.submit(self._dispatch, job)
+
+    def _promote(self, now: float) -> None:
+        while self._events and self._events[0][0] <= now:
+            due, _, key = heapq.heappop(self._events)
+            job = self._jobs.get(key)
+            if job is not None and job.due == due:
+                self._ready[key] = job
+
+    def _pick(self, now: float) -> Tuple[Job | None, float | None]:
+        """The due job to run next, or how long until a budget allows one."""
+        best, best_rank, wait = None, None, None
+        for key, job in self._ready.items():
+            if key in self._running:
+                continue  # merged into the poll still running; runs after it
+            budget = self._budgets.get(job.provider)
+            if budget is not None:
+                budget_wait = budget.wait(now)
+                if budget_wait > 0:
+                    wait = budget_wait if wait is None else min(wait, budget_wait)
+                    continue
+            rank = (
+                priority(None if job.deadline is None else job.deadline - now, self.priorities),
+                min((self._served[user] for user in job.users), default=0.0),
+                job.due,
+            )
+            if best_rank is None or rank < best_rank:
+                best, best_rank = job, rank
+        return best, wait
+
+    def _dispatch(self, job: Job) -> None:
+        failed = False
+        try:
+            job.run()
+        except Exception:
+            failed = True  # the job records its own errors
+        finally:
+            with self._cond:
+                self.stats["failed"] += failed
+                del self._running[job.key]
+                self._release(job)
+                self._cond.notify()
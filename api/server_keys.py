@@ -0,0 +1,43 @@
+"""Per-purpose signing keys derived from one server secret.
+
+Values the server hands out and later trusts (account handles, watcher
+cookies) are signed with HMAC. Each purpose gets its own key,
+``HMAC(secret, purpose)``, so a value signed for one purpose never verifies
+as another, even though they share ``SERVER_SECRET``.
+
+Configure ``SERVER_SECRET`` (``TRAIN_HANDLE_SECRET`` is used when it is not
+set) with the same value on every worker and instance. Without either, a
+random per-process secret is used and a warning is logged: values signed by
+one process then do not verify in another.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+_secret: bytes | None = None
+_lock = threading.Lock()
+
+
+def _server_secret() -> bytes:
+    global _secret
+    with _lock:
+        if _secret is None:
+            configured = os.environ.get("SERVER_SECRET") or os.environ.get("TRAIN_HANDLE_SECRET")
+            if configured:
+                _secret = configured.encode("utf-8")
+            else:
+                logger.warning(
+                    "SERVER_SECRET is not set; using a per-process secret, so account handles and "
+                    "watcher cookies will not be recognized by other workers or after a restart"
+                )
+                _secret = os.urandom(32)
+        return _secret
+
+
+def key(purpose: str) -> bytes:
+    """The signing key for ``purpose`` (e.g. ``"account-handle"``)."""
+    return hmac.new(_server_secret(), purpose.encode("utf-8"), hashlib.sha256).digest()
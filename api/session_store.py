@@ -0,0 +1,192 @@
+"""Persistent login state for SRT/Korail clients.
+
+A store keeps, per ``(provider, account)``, the session cookies and the user
+fields a client fills in on login (membership number, phone number, ...) so
+that a fresh process can resume a logged-in session instead of logging in
+again. Everything is sealed with AES-GCM under ``SESSION_STORE_KEY``.
+
+Configure with environment variables::
+
+    SESSION_STORE=file:/tmp/train-booking-sessions   # one file per account
+    SESSION_STORE=sqlite:/tmp/train-booking.db       # one SQLite table
+    SESSION_STORE_KEY=<any secret string>
+"""
+import abc
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, List
+
+MAX_AGE = 12 * 60 * 60  # restored sessions older than this are ignored
+
+_default_store: "SessionStore | None" = None
+_default_store_loaded = False
+
+
+class SessionStore(metaclass=abc.ABCMeta):
+    """Base class for login-state stores.
+
+    Args:
+        secret: Secret the sealing key is derived from
+        max_age: Seconds after which a saved state is no longer restored
+    """
+
+    def __init__(self, secret: str, max_age: float = MAX_AGE) -> None:
+        if not secret:
+            raise ValueError("A secret is required to seal stored sessions")
+        self._key = hashlib.sha256(secret.encode("utf-8")).digest()
+        self.max_age = max_age
+
+    def load(self, provider: str, account: str) -> dict | None:
+        """Return the saved state for an account, or None if missing or stale."""
+        blob = self._read(self._name(provider, account))
+        if blob is None:
+            return None
+        try:
+            state = json.loads(self._open(blob))
+        except ValueError:
+            return None  # tampered with, or sealed with another key
+        if time.time() - state.get("saved_at", 0) > self.max_age:
+            return None
+        return state
+
+    def save(self, provider: str, account: str, state: dict) -> None:
+        state = dict(state, saved_at=time.time())
+        self._write(self._name(provider, account), self._seal(json.dumps(state).encode("utf-8")))
+
+    def delete(self, provider: str, account: str) -> None:
+        self._remove(self._name(provider, account))
+
+    @abc.abstractmethod
+    def _read(self, name: str) -> bytes | None:
+        pass
+
+    @abc.abstractmethod
+    def _write(self, name: str, blob: bytes) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _remove(self, name: str) -> None:
+        pass
+
+    @staticmethod
+    def _name(provider: str, account: str) -> str:
+        # Account ids are e-mails or phone numbers; keep them out of file names
+        return hashlib.sha256(f"{provider}:{account}".encode("utf-8")).hexdigest()
+
+    def _seal(self, data: bytes) -> bytes:
+        from Crypto.Cipher import AES
+
+        cipher = AES.new(self._key, AES.MODE_GCM)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return cipher.nonce + tag + ciphertext
+
+    def _open(self, blob: bytes) -> bytes:
+        from Crypto.Cipher import AES
+
+        nonce, tag, ciphertext = blob[:16], blob[16:32], blob[32:]
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        return cipher.decrypt_and_verify(ciphertext, tag)
+
+
+class FileSessionStore(SessionStore):
+    """One sealed file per account inside ``directory``."""
+
+    def __init__(self, directory: str, secret: str, max_age: float = MAX_AGE) -> None:
+        super().__init__(secret, max_age)
+        self.directory = Path(directory)
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    def _read(self, name: str) -> bytes | None:
+        try:
+            return (self.directory / name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, name: str, blob: bytes) -> None:
+        tmp = self.directory / f".{name}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, self.directory / name)
+
+    def _remove(self, name: str) -> None:
+        try:
+            (self.directory / name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sealed states in a single SQLite table."""
+
+    def __init__(self, path: str, secret: str, max_age: float = MAX_AGE) -> None:
+        super().__init__(secret, max_age)
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (name TEXT PRIMARY KEY, state BLOB NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _read(self, name: str) -> bytes | None:
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT state FROM sessions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _write(self, name: str, blob: bytes) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (name, state) VALUES (?, ?)", (name, blob))
+
+    def _remove(self, name: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE name = ?", (name,))
+
+
+def dump_cookies(session: Any) -> List[dict]:
+    """Serialize the cookies of a curl_cffi or requests session."""
+    jar = getattr(session.cookies, "jar", session.cookies)
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+        for c in jar
+    ]
+
+
+def restore_cookies(session: Any, cookies: List[dict]) -> None:
+    for c in cookies:
+        session.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"])
+
+
+def password_digest(password: str) -> str:
+    """Digest stored next to a session so it is only restored for the same credentials."""
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def from_env() -> SessionStore | None:
+    """Return the store configured by ``SESSION_STORE``/``SESSION_STORE_KEY``, if any."""
+    global _default_store, _default_store_loaded
+    if _default_store_loaded:
+        return _default_store
+
+    spec, secret = os.environ.get("SESSION_STORE"), os.environ.get("SESSION_STORE_KEY")
+    if spec and secret:
+        _default_store = from_spec(spec, secret)
+    _default_store_loaded = True
+    return _default_store
+
+
+def from_spec(spec: str, secret: str, max_age: float = MAX_AGE) -> SessionStore:
+    """Build a store from a ``file:<directory>`` or ``sqlite:<path>`` spec."""
+    kind, _, location = spec.partition(":")
+    if kind == "file":
+        return FileSessionStore(location, secret, max_age)
+    if kind == "sqlite":
+        return SQLiteSessionStore(location, secret, max_age)
+    raise ValueError(f"Unknown session store type: {kind}")
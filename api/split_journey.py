@@ -0,0 +1,201 @@
+"""Split-journey search: one train, booked as two legs.
+
+When a through trip is sold out, the same train often still has seats on the
+two halves of the trip (e.g. 수서→대전 + 대전→부산). This module picks the
+stops the train may be cut at, searches both legs of every cut concurrently
+and joins the legs back into combinations of one physical train: same train
+number, same run date, and the first leg's arrival run order equal to the
+second leg's departure run order.
+
+Leg searches are cached for a short time (and concurrent identical searches
+share one upstream call), so polling for a split journey costs little more
+than polling for the through trip.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import stations
+from srt import SRTTrain
+
+CACHE_TTL = 30.0  # seconds
+MAX_STOPS = 4  # intermediate stations tried per search
+MAX_WORKERS = 8
+
+LegKey = Tuple[str, str, str, str]  # (dep, arr, date, time)
+SearchFn = Callable[[str, str, str, str], List[SRTTrain]]
+
+
+def intermediate_stops(dep: str, arr: str, limit: int = MAX_STOPS) -> List[str]:
+    """Stops between ``dep`` and ``arr`` on any line serving both, middle first.
+
+    Cutting near the middle of the trip gives both legs the best chance, so the
+    candidates are ordered by how far they are from the middle of their line
+    segment.
+    """
+    ranked: Dict[str, float] = {}
+    for between in stations.index()["SRT"].stops_between(dep, arr).values():
+        middle = (len(between) - 1) / 2
+        for position, stop in enumerate(between):
+            distance = abs(position - middle) / max(1, len(between))
+            ranked[stop] = min(ranked.get(stop, distance), distance)
+    return sorted(ranked, key=ranked.get)[:limit]
+
+
+class LegCache:
+    """TTL cache of leg search results that also merges concurrent lookups."""
+
+    def __init__(self, ttl: float = CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._entries: Dict[LegKey, Tuple[float, Future]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: LegKey, search: SearchFn) -> List[SRTTrain]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                future, owner = entry[1], False
+            else:
+                future, owner = Future(), True
+                self._entries[key] = (now, future)
+
+        if owner:
+            try:
+                future.set_result(search(*key))
+            except Exception as ex:
+                with self._lock:
+                    self._entries.pop(key, None)  # do not cache failures
+                future.set_exception(ex)
+        return future.result()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SplitJourney:
+    """Two legs of the same train.
+
+    Args:
+        first: Leg from the origin to the cut station
+        second: Leg from the cut station to the destination
+    """
+
+    def __init__(self, first: SRTTrain, second: SRTTrain) -> None:
+        self.first = first
+        self.second = second
+
+    @property
+    def via(self) -> str:
+        return self.first.arr_station_name
+
+    def available(self, seat_type: str | None = None) -> bool:
+        return all(_leg_available(leg, seat_type) for leg in (self.first, self.second))
+
+    def rank_key(self) -> tuple:
+        # Earliest departure first, then combinations that keep the passenger
+        # in general class on both legs
+        mixed = not (self.first.general_seat_available and self.second.general_seat_available)
+        return (self.first.dep_date, self.first.dep_time, mixed, self.first.arr_time)
+
+    def to_dict(self) -> dict:
+        return {
+            "train_number": self.first.train_number,
+            "via": self.via,
+            "dep_date": self.first.dep_date,
+            "dep_time": self.first.dep_time,
+            "arr_time": self.second.arr_time,
+        }
+
+
+def _leg_available(train: SRTTrain, seat_type: str | None) -> bool:
+    if seat_type == "GENERAL":
+        return train.general_seat_available
+    if seat_type == "SPECIAL":
+        return train.special_seat_available
+    return train.seat_available
+
+
+def join_legs(first_legs: List[SRTTrain], second_legs: List[SRTTrain]) -> List[SplitJourney]:
+    """Pair legs that belong to the same run of the same train."""
+    by_run = {
+        (t.train_number, t.dep_date, t.dep_station_run_order): t for t in second_legs
+    }
+    journeys = []
+    for first in first_legs:
+        second = by_run.get((first.train_number, first.arr_date, first.arr_station_run_order))
+        if second is not None:
+            journeys.append(SplitJourney(first, second))
+    return journeys
+
+
+class SplitJourneySearch:
+    """Find available split journeys for a sold-out through trip.
+
+    Args:
+        search: ``(dep, arr, date, time) -> List[SRTTrain]``, called once per
+            leg; must be safe to call from several threads
+        cache: Leg cache shared between searches
+        max_workers: Legs searched concurrently
+
+    Examples:
+        >>> finder = SplitJourneySearch(lambda *leg: client.search_train(*leg, available_only=False))
+        >>> for journey in finder.find("수서", "부산", "20250101", "080000"):
+        ...     print(journey.via, journey.first, journey.second)
+    """
+
+    def __init__(
+        self, search: SearchFn, cache: LegCache | None = None, max_workers: int = MAX_WORKERS
+    ) -> None:
+        self._search = search
+        self._cache = cache or LegCache()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="split-journey")
+
+    def find(
+        self,
+        dep: str,
+        arr: str,
+        date: str,
+        time: str,
+        train_number: str | None = None,
+        seat_type: str | None = None,
+        max_stops: int = MAX_STOPS,
+        limit: int = 10,
+    ) -> List[SplitJourney]:
+        """Return available split journeys, best first.
+
+        Args:
+            dep: Origin station name
+            arr: Destination station name
+            date: Date in YYYYMMDD format
+            time: Earliest departure in HHMMSS format
+            train_number: Only consider this train
+            seat_type: "GENERAL", "SPECIAL" or None for either class
+            max_stops: Number of cut stations to try
+            limit: Maximum number of combinations returned
+        """
+        stops = intermediate_stops(dep, arr, max_stops)
+        legs = {
+            key: self._pool.submit(self._cache.get, key, self._search)
+            for stop in stops
+            for key in ((dep, stop, date, time), (stop, arr, date, time))
+        }
+
+        journeys: List[SplitJourney] = []
+        for stop in stops:
+            try:
+                first_legs = legs[(dep, stop, date, time)].result()
+                second_legs = legs[(stop, arr, date, time)].result()
+            except Exception:
+                continue  # no trains (or an upstream error) on one leg of this cut
+            journeys.extend(
+                j
+                for j in join_legs(first_legs, second_legs)
+                if (not train_number or j.first.train_number == train_number)
+                and j.available(seat_type)
+            )
+
+        journeys.sort(key=SplitJourney.rank_key)
+        return journeys[:limit]
@@ -1,11 +1,5 @@
 import abc
-try:
-    import curl_cffi
-    HAS_CURL_CFFI = True
-except ImportError:
-    import requests
-    HAS_CURL_CFFI = False
-
+import functools
 import json
 import re
 import time
@@ -13,6 +7,12 @@ from enum import Enum
 from datetime import datetime
 from typing import Dict, List, Pattern
 
+import clock
+import request_policy
+import session_store as session_stores
+import transport
+from train_table import TrainTable
+
 # Constants
 EMAIL_REGEX: Pattern = re.compile(r"[^@]+@[^@]+\.[^@]+")
 PHONE_NUMBER_REGEX: Pattern = re.compile(r"(\d{3})-(\d{3,4})-(\d{4})")
@@ -133,6 +133,32 @@ class SRTNetFunnelError(SRTError):
     pass
 
 
+def _relogin_if_expired(method):
+    """Log in again and retry once if a restored session turns out to be expired.
+
+    Restored sessions are not verified up front; the first authenticated call
+    doubles as the check.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self._restored:
+            return method(self, *args, **kwargs)
+        try:
+            result = method(self, *args, **kwargs)
+        except SRTResponseError as ex:
+            if "로그인" not in ex.msg:
+                raise
+            self._log("Restored session expired, logging in again")
+            self._restored = False
+            self.login()
+            return method(self, *args, **kwargs)
+        self._restored = False
+        return result
+
+    return wrapper
+
+
 # Passenger class
 class Passenger(metaclass=abc.ABCMeta):
     """Base class for different passenger types."""
@@ -363,30 +389,75 @@ class SRTReservation:
 
 
 # SRTResponseData class
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
 class SRTResponseData:
-    """SRT Response data class that parses JSON response from API request"""
+    """SRT Response data class that parses JSON response from API request
+
+    The body is parsed on first access, with orjson when it is installed.
+    Pass ``datasets`` to keep only ``resultMap`` and those top-level keys,
+    and read them with ``get()``, which returns them without copying.
+
+    Args:
+        response: Response body
+        datasets: Top-level keys to keep besides ``resultMap`` (default: all)
+    """
 
     STATUS_SUCCESS = "SUCC"
     STATUS_FAIL = "FAIL"
 
-    def __init__(self, response: str) -> None:
-        self._json = json.loads(response)
-        self._status = self._parse()
+    __slots__ = ("_response", "_datasets", "_data", "_result")
+
+    def __init__(self, response: str | bytes, datasets: tuple[str, ...] | None = None) -> None:
+        self._response = response
+        self._datasets = datasets
+        self._data: dict | None = None
+        self._result: dict | None = None
 
     def __str__(self) -> str:
         return json.dumps(self._json)
 
     dump = __str__  # Alias dump() to __str__()
 
+    @property
+    def _json(self) -> dict:
+        return self._data if self._data is not None else self._load()
+
+    def _load(self) -> dict:
+        data = _json_loads(self._response)
+        datasets = self._datasets
+        if datasets is not None and "resultMap" in data:
+            kept = {"resultMap": data["resultMap"]}
+            for key in datasets:
+                if key in data:
+                    kept[key] = data[key]
+            data = kept
+        self._data = data
+        self._response = None  # the body is not needed any more
+        return data
+
+    @property
+    def _status(self) -> dict:
+        if self._result is None:
+            self._result = self._parse()
+        return self._result
+
     def _parse(self) -> dict:
-        if "resultMap" in self._json:
-            return self._json["resultMap"][0]
+        data = self._json
+        if "resultMap" in data:
+            return data["resultMap"][0]
 
-        if "ErrorCode" in self._json and "ErrorMsg" in self._json:
+        if "ErrorCode" in data and "ErrorMsg" in data:
             raise SRTResponseError(
-                f'Undefined result status "[{self._json["ErrorCode"]}]: {self._json["ErrorMsg"]}"'
+                f'Undefined result status "[{data["ErrorCode"]}]: {data["ErrorMsg"]}"'
             )
-        raise SRTError(f"Unexpected case [{self._json}]")
+        raise SRTError(f"Unexpected case [{data}]")
 
     def success(self) -> bool:
         result = self._status.get("strResult")
@@ -403,6 +474,11 @@ class SRTResponseData:
     def message(self) -> str:
         return self._status.get("msgTxt", "")
 
+    def get(self, key: str):
+        """Return one dataset of the response as is (not a copy)."""
+        data = self._data
+        return (data if data is not None else self._load())[key]
+
     def get_all(self) -> dict:
         return self._json.copy()
 
@@ -532,11 +608,9 @@ class NetFunnelHelper:
     }
 
     def __init__(self, debug=False):
-        if HAS_CURL_CFFI:
-            self._session = curl_cffi.Session(impersonate="chrome")
-        else:
-            self._session = requests.session()
-        self._session.headers.update(self.DEFAULT_HEADERS)
+        self._session = request_policy.PolicySession(
+            NETFUNNEL_POOL.lease(self), {}, default=NETFUNNEL_POLICY
+        )
         self._cached_key = None
         self._last_fetch_time = 0
         self._cache_ttl = 48  # 48 seconds
@@ -633,6 +707,26 @@ class NetFunnelHelper:
         )
 
 
+NETFUNNEL_POOL = transport.pool(
+    "srt-netfunnel", "https://nf.letskorail.com", "chrome", NetFunnelHelper.DEFAULT_HEADERS
+)
+SESSION_POOL = transport.pool("srt", SRT_MOBILE, "chrome", DEFAULT_HEADERS)
+
+# Requests not listed here (reserve, payment, cancel, refund, ...) may have
+# reached the server when they fail, so they are never re-sent
+REQUEST_POLICIES = {
+    API_ENDPOINTS["login"]: request_policy.Policy(
+        timeout=10.0, deadline=20.0, retries=1, idempotent=True
+    ),
+    API_ENDPOINTS["logout"]: request_policy.READ,
+    API_ENDPOINTS["search_schedule"]: request_policy.HEDGED_READ,
+    API_ENDPOINTS["tickets"]: request_policy.READ,
+    API_ENDPOINTS["ticket_info"]: request_policy.HEDGED_READ,
+    API_ENDPOINTS["reserve_info"]: request_policy.READ,
+}
+NETFUNNEL_POLICY = request_policy.Policy(timeout=5.0)
+
+
 # SRT class
 class SRT:
     """SRT client class for interacting with the SRT train booking system.
@@ -642,6 +736,7 @@ class SRT:
         srt_pw (str): SRT account password
         auto_login (bool): Whether to automatically login on initialization
         verbose (bool): Whether to print debug logs
+        session_store (SessionStore): Where to restore and save the login state
 
     Examples:
         >>> srt = SRT("1234567890", YOUR_PASSWORD) # with membership number
@@ -650,13 +745,19 @@ class SRT:
     """
 
     def __init__(
-        self, srt_id: str, srt_pw: str, auto_login: bool = True, verbose: bool = False
+        self,
+        srt_id: str,
+        srt_pw: str,
+        auto_login: bool = True,
+        verbose: bool = False,
+        session_store: session_stores.SessionStore | None = None,
     ) -> None:
-        if HAS_CURL_CFFI:
-            self._session = curl_cffi.Session(impersonate="chrome")
-        else:
-            self._session = requests.session()
-        self._session.headers.update(DEFAULT_HEADERS)
+        self._session = request_policy.PolicySession(
+            SESSION_POOL.lease(self),
+            REQUEST_POLICIES,
+            spare=SESSION_POOL.acquire,
+            release=SESSION_POOL.release,
+        )
         self._netfunnel = NetFunnelHelper(debug=verbose)
         self.srt_id = srt_id
         self.srt_pw = srt_pw
@@ -665,8 +766,10 @@ class SRT:
         self.membership_number = None
         self.membership_name = None
         self.phone_number = None
+        self._session_store = session_store
+        self._restored = False
 
-        if auto_login:
+        if auto_login and not self._restore_session():
             self.login()
 
     def _log(self, msg: str) -> None:
@@ -731,8 +834,41 @@ class SRT:
         print(
             f"로그인 성공: {self.membership_name} (멤버십번호: {self.membership_number}, 전화번호: {self.phone_number})"
         )
+        self._save_session()
+        return True
+
+    def _restore_session(self) -> bool:
+        """Resume the login state saved by an earlier process, if any."""
+        if not self._session_store:
+            return False
+        state = self._session_store.load("SRT", self.srt_id)
+        if not state or state.get("password") != session_stores.password_digest(self.srt_pw):
+            return False
+
+        session_stores.restore_cookies(self._session, state["cookies"])
+        self.membership_number = state["membership_number"]
+        self.membership_name = state["membership_name"]
+        self.phone_number = state["phone_number"]
+        self.is_login = True
+        self._restored = True
+        self._log(f"Restored session of {self.membership_number}")
         return True
 
+    def _save_session(self) -> None:
+        if not self._session_store:
+            return
+        self._session_store.save(
+            "SRT",
+            self.srt_id,
+            {
+                "password": session_stores.password_digest(self.srt_pw),
+                "cookies": session_stores.dump_cookies(self._session),
+                "membership_number": self.membership_number,
+                "membership_name": self.membership_name,
+                "phone_number": self.phone_number,
+            },
+        )
+
     def logout(self) -> bool:
         """Logout from SRT server.
 
@@ -753,6 +889,8 @@ class SRT:
 
         self.is_login = False
         self.membership_number = None
+        if self._session_store:
+            self._session_store.delete("SRT", self.srt_id)
         return True
 
     def search_train(
@@ -770,7 +908,7 @@ class SRT:
         Args:
             dep: Departure station name
             arr: Arrival station name
-            date: Date in YYYYMMDD format (default: today)
+            date: Date in YYYYMMDD format (default: today on the SRT server clock)
             time: Time in HHMMSS format (default: 000000)
             time_limit: Only return trains before this time
             passengers: List of passengers (default: 1 adult)
@@ -779,13 +917,41 @@ class SRT:
         Returns:
             List of matching SRTTrain objects
 
+        Raises:
+            ValueError: If invalid station names provided
+        """
+        table = self.search_table(dep, arr, date, time, passengers)
+        return table.filter(
+            available=True if available_only else None, dep_to=time_limit or None
+        ).to_trains()
+
+    def search_table(
+        self,
+        dep: str,
+        arr: str,
+        date: str | None = None,
+        time: str | None = None,
+        passengers: list[Passenger] | None = None,
+    ) -> TrainTable:
+        """Search for trains and return every SRT train as a ``TrainTable``.
+
+        Filtering and ranking the table selects rows without building
+        ``SRTTrain`` objects; ``to_trains()`` builds them for the rows kept.
+
+        Args:
+            dep: Departure station name
+            arr: Arrival station name
+            date: Date in YYYYMMDD format (default: today on the SRT server clock)
+            time: Time in HHMMSS format (default: 000000)
+            passengers: List of passengers (default: 1 adult)
+
         Raises:
             ValueError: If invalid station names provided
         """
         if dep not in STATION_CODE or arr not in STATION_CODE:
             raise ValueError(f'Invalid station: "{dep}" or "{arr}"')
 
-        now = datetime.now()
+        now = clock.kst_now("srt")
         today = now.strftime("%Y%m%d")
         date = date or today
 
@@ -824,21 +990,19 @@ class SRT:
 
         r = self._session.post(url=API_ENDPOINTS["search_schedule"], data=data)
         self._log(r.text)
-        parser = SRTResponseData(r.text)
+        parser = SRTResponseData(r.text, datasets=("outDataSets",))
 
         if not parser.success():
             raise SRTResponseError(parser.message())
 
-        return [
-            train
-            for train in (
-                SRTTrain(t)
-                for t in parser.get_all()["outDataSets"]["dsOutput1"]
+        return TrainTable.from_srt(
+            [
+                t
+                for t in parser.get("outDataSets")["dsOutput1"]
                 if t["stlbTrnClsfCd"] == "17"
-            )
-            if (not available_only or train.seat_available)
-            and (not time_limit or train.dep_time <= time_limit)
-        ]
+            ],
+            SRTTrain,
+        )
 
     def reserve(
         self,
@@ -944,6 +1108,30 @@ class SRT:
             ValueError: If train is not SRT
             SRTError: If reservation not found after creation
         """
+        data = self._reserve_payload(
+            jobid, train, passengers, option, mblPhone=mblPhone, window_seat=window_seat
+        )
+        return self._submit_reserve(data)
+
+    def _reserve_payload(
+        self,
+        jobid: str,
+        train: SRTTrain,
+        passengers: list[Passenger] | None = None,
+        option: SeatType = SeatType.GENERAL_FIRST,
+        mblPhone: str | None = None,
+        window_seat: bool | None = None,
+    ) -> dict:
+        """Build the form data of a reservation request without sending it.
+
+        The NetFunnel key is acquired here, so a payload built shortly before
+        a ticket-open instant can be sent with ``_submit_reserve`` at once.
+
+        Raises:
+            SRTNotLoggedInError: If not logged in
+            TypeError: If train is not SRTTrain
+            ValueError: If train is not SRT
+        """
         if not self.is_login:
             raise SRTNotLoggedInError()
 
@@ -998,22 +1186,33 @@ class SRT:
                 passengers, special_seat=is_special_seat, window_seat=window_seat
             )
         )
+        return data
+
+    @_relogin_if_expired
+    def _submit_reserve(self, data: dict) -> SRTReservation:
+        """Send a payload built by ``_reserve_payload``.
 
+        Raises:
+            SRTResponseError: If server returns error
+            SRTError: If reservation not found after creation
+        """
         r = self._session.post(url=API_ENDPOINTS["reserve"], data=data)
         self._log(r.text)
-        parser = SRTResponseData(r.text)
+        parser = SRTResponseData(r.text, datasets=("reservListMap",))
 
         if not parser.success():
             raise SRTResponseError(parser.message())
 
-        reservation_number = parser.get_all()["reservListMap"][0]["pnrNo"]
+        reservation_number = parser.get("reservListMap")[0]["pnrNo"]
 
-        for ticket in self.get_reservations():
+        for ticket in self.get_reservations(with_tickets=False):
             if ticket.reservation_number == reservation_number:
+                ticket._tickets = self.ticket_info(reservation_number)
                 return ticket
 
         raise SRTError("Ticket not found: check reservation status")
 
+    @_relogin_if_expired
     def reserve_standby_option_settings(
         self,
         reservation: SRTReservation | int,
@@ -1053,11 +1252,17 @@ class SRT:
         self._log(r.text)
         return r.status_code == 200
 
-    def get_reservations(self, paid_only: bool = False) -> list[SRTReservation]:
+    @_relogin_if_expired
+    def get_reservations(
+        self, paid_only: bool = False, with_tickets: bool = True
+    ) -> list[SRTReservation]:
         """Get all reservations.
 
         Args:
             paid_only: Whether to only return paid reservations
+            with_tickets: Whether to fetch each reservation's tickets. Without
+                them this is a single request (status, payment deadline and
+                train only); ``tickets`` of the returned reservations is None.
 
         Returns:
             List of SRTReservation objects
@@ -1071,19 +1276,22 @@ class SRT:
 
         r = self._session.post(url=API_ENDPOINTS["tickets"], data={"pageNo": "0"})
         self._log(r.text)
-        parser = SRTResponseData(r.text)
+        parser = SRTResponseData(r.text, datasets=("trainListMap", "payListMap"))
 
         if not parser.success():
             raise SRTResponseError(parser.message())
 
         return [
-            SRTReservation(train, pay, self.ticket_info(train["pnrNo"]))
+            SRTReservation(
+                train, pay, self.ticket_info(train["pnrNo"]) if with_tickets else None
+            )
             for train, pay in zip(
-                parser.get_all()["trainListMap"], parser.get_all()["payListMap"]
+                parser.get("trainListMap"), parser.get("payListMap")
             )
             if not paid_only or pay["stlFlg"] != "N"
         ]
 
+    @_relogin_if_expired
     def ticket_info(self, reservation: SRTReservation | int) -> list[SRTTicket]:
         """Get detailed ticket information.
 
@@ -1107,13 +1315,14 @@ class SRT:
             data={"pnrNo": reservation_number, "jrnySqno": "1"},
         )
         self._log(r.text)
-        parser = SRTResponseData(r.text)
+        parser = SRTResponseData(r.text, datasets=("trainListMap",))
 
         if not parser.success():
             raise SRTResponseError(parser.message())
 
-        return [SRTTicket(ticket) for ticket in parser.get_all()["trainListMap"]]
+        return [SRTTicket(ticket) for ticket in parser.get("trainListMap")]
 
+    @_relogin_if_expired
     def cancel(self, reservation: SRTReservation | int) -> bool:
         """Cancel a reservation.
 
@@ -1149,6 +1358,7 @@ class SRT:
 
         return True
 
+    @_relogin_if_expired
     def pay_with_card(
         self,
         reservation: SRTReservation,
@@ -1227,6 +1437,7 @@ class SRT:
 
         return True
 
+    @_relogin_if_expired
     def reserve_info(self, reservation: SRTReservation | int) -> dict:
         if not isinstance(reservation, (SRTReservation, int, str)):
             raise TypeError("reservation must be SRTReservation or reservation number")
@@ -1241,6 +1452,7 @@ class SRT:
         else:
             raise SRTResponseError(response.get("ErrorMsg") or "Failed to get reservation info")
 
+    @_relogin_if_expired
     def refund(self, reservation: SRTReservation | int) -> bool:
         info = self.reserve_info(reservation)
         data = {
@@ -0,0 +1,222 @@
+"""SRT waitlist (예약대기) monitor.
+
+A standby reservation (``SRTReservation.is_waiting``) turns into a seat when
+the upstream waitlist is served; from that moment it has a payment deadline
+and is released if not paid. The monitor polls the reservation list of every
+account with a watched standby — one status-only request per account
+(``SRT.get_reservations(with_tickets=False)``), however many standbys the
+account holds — and:
+
+* pushes a notification and hands the reservation to ``on_seat`` (which
+  starts the payment-deadline watchdog) when a seat is assigned;
+* drops standbys that disappeared (cancelled, or expired unserved) or whose
+  train has departed.
+
+Polling is frequent only when it matters: an account is polled at the
+interval of its standby departing soonest (``POLL_INTERVALS``). Polls are
+dispatched by the shared ``scheduler.Scheduler``, each account counting as
+one user of the SRT budget.
+"""
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import clock
+from scheduler import Scheduler
+
+# (seconds to departure at least, poll interval in seconds), nearest last
+POLL_INTERVALS = (
+    (24 * 60 * 60, 10 * 60),
+    (6 * 60 * 60, 3 * 60),
+    (60 * 60, 60),
+    (0, 20),
+)
+MAX_ERROR_BACKOFF = 10 * 60  # seconds
+
+
+def poll_interval(seconds_to_departure: float, intervals=POLL_INTERVALS) -> float:
+    for threshold, interval in intervals:
+        if seconds_to_departure >= threshold:
+            return interval
+    return intervals[-1][1]
+
+
+class Standby:
+    """A watched waitlist reservation.
+
+    Args:
+        account: Account id the reservation was made with
+        pnr: Reservation number
+        departure: Departure time (epoch seconds)
+        summary: Short description used in notifications
+    """
+
+    def __init__(self, account: str, pnr: str, departure: float, summary: str = "") -> None:
+        self.account = account
+        self.pnr = pnr
+        self.departure = departure
+        self.summary = summary
+        self.checks = 0
+        self.last_checked: float | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "pnr": self.pnr,
+            "departure": self.departure,
+            "summary": self.summary,
+            "checks": self.checks,
+            "last_checked": self.last_checked,
+        }
+
+
+class StandbyMonitor:
+    """Background polling of SRT waitlist reservations.
+
+    Args:
+        fetch: Called with an account id; returns that account's reservations
+            (status only, no tickets needed)
+        notify: Called with ``(title, body, standby)``, ``standby`` being the
+            ``Standby`` concerned
+        on_seat: Called with ``(account, reservation)`` once a seat is assigned
+        intervals: ``(seconds to departure at least, poll interval)`` pairs
+        scheduler: Dispatches the polls (a private one if not given)
+
+    Examples:
+        >>> monitor = StandbyMonitor(fetch, send_push, lambda account, r: watchdog.track("SRT", account, r))
+        >>> monitor.track(account_id, reservation)  # reservation.is_waiting
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], list],
+        notify: Callable[[str, str, Standby], None],
+        on_seat: Callable[[str, object], None],
+        intervals: Tuple[Tuple[float, float], ...] = POLL_INTERVALS,
+        scheduler: Scheduler | None = None,
+        now: Callable[[], float] = clock.now,
+    ) -> None:
+        self.intervals = intervals
+        self._fetch = fetch
+        self._notify = notify
+        self._on_seat = on_seat
+        self._now = now
+        self._standbys: Dict[str, Dict[str, Standby]] = {}  # account -> pnr -> standby
+        self._due: Dict[str, float] = {}  # account -> next poll
+        self._errors: Dict[str, int] = {}
+        self._scheduler = scheduler or Scheduler()
+        self._lock = threading.Lock()
+
+    def track(self, account: str, reservation) -> Standby | None:
+        """Start watching a waitlist reservation (no-op for anything else)."""
+        if not reservation.is_waiting or reservation.paid:
+            return None
+        departure = (
+            datetime.strptime(reservation.dep_date + reservation.dep_time, "%Y%m%d%H%M%S")
+            .replace(tzinfo=clock.KST)
+            .timestamp()
+        )
+        now = self._now()
+        if departure <= now:
+            return None
+        standby = Standby(
+            account,
+            reservation.reservation_number,
+            departure,
+            f"{reservation.dep_station_name} → {reservation.arr_station_name}",
+        )
+        with self._lock:
+            watched = self._standbys.setdefault(account, {})
+            if standby.pnr in watched:
+                return watched[standby.pnr]
+            watched[standby.pnr] = standby
+            self._schedule(account, now + self._interval(standby, now))
+        return standby
+
+    def untrack(self, pnr: str) -> None:
+        """Stop watching a reservation (e.g. it was cancelled by the user)."""
+        with self._lock:
+            for account, watched in list(self._standbys.items()):
+                if watched.pop(pnr, None) is not None and not watched:
+                    self._forget(account)
+
+    def pending(self) -> List[dict]:
+        with self._lock:
+            return sorted(
+                (
+                    {**s.as_dict(), "next_check": self._due.get(account)}
+                    for account, watched in self._standbys.items()
+                    for s in watched.values()
+                ),
+                key=lambda s: s["departure"],
+            )
+
+    def _interval(self, standby: Standby, now: float) -> float:
+        return poll_interval(standby.departure - now, self.intervals)
+
+    def _schedule(self, account: str, due: float) -> None:
+        # An earlier poll always wins; the scheduler merges it with the pending one
+        if account in self._due and self._due[account] <= due:
+            return
+        self._due[account] = due
+        self._scheduler.submit(
+            ("standby", account), lambda: self._tick(account), due - self._now(),
+            provider="SRT", users=[account],
+            deadline=min(s.departure for s in self._standbys[account].values()),
+        )
+
+    def _forget(self, account: str) -> None:
+        self._standbys.pop(account, None)
+        self._due.pop(account, None)
+        self._errors.pop(account, None)
+        self._scheduler.cancel(("standby", account))
+
+    def _tick(self, account: str) -> None:
+        with self._lock:
+            if self._due.pop(account, None) is None:
+                return  # no longer watched
+        try:
+            self._poll(account)
+        except Exception:
+            pass  # a failing callback must not stop the monitor
+
+    def _poll(self, account: str) -> None:
+        try:
+            reservations = {r.reservation_number: r for r in self._fetch(account)}
+        except Exception:
+            with self._lock:
+                if account not in self._standbys:
+                    return
+                errors = self._errors[account] = self._errors.get(account, 0) + 1
+                now = self._now()
+                interval = min(self._interval(s, now) for s in self._standbys[account].values())
+                self._schedule(account, now + min(interval * 2 ** errors, MAX_ERROR_BACKOFF))
+            return
+
+        now = self._now()
+        seated, dropped = [], []
+        with self._lock:
+            watched = self._standbys.get(account, {})
+            self._errors.pop(account, None)
+            for pnr, standby in list(watched.items()):
+                standby.checks += 1
+                standby.last_checked = now
+                reservation = reservations.get(pnr)
+                if reservation is None:
+                    del watched[pnr]
+                    if standby.departure > now:
+                        dropped.append(standby)
+                elif not reservation.is_waiting:
+                    del watched[pnr]
+                    seated.append((standby, reservation))
+                elif standby.departure <= now:
+                    del watched[pnr]
+            if watched:
+                self._schedule(account, now + min(self._interval(s, now) for s in watched.values()))
+            else:
+                self._forget(account)
+
+        for standby, reservation in seated:
+            self._notify("🎉 예약대기 좌석 배정", f"{standby.summary} 예약대기({standby.pnr})에 좌석이 배정되었습니다. 결제 기한 안에 결제해 주세요.", standby)
+            self._on_seat(account, reservation)
+        for standby in dropped:
+            self._notify("❌ 예약대기 종료", f"{standby.summary} 예약대기({standby.pnr})가 더 이상 예약 내역에 없습니다.", standby)
@@ -0,0 +1,217 @@
+"""Station and route index for SRT and Korail.
+
+The index is loaded once from ``stations.json`` next to this module (station
+names and codes, line stop lists and aliases for both providers) and answers,
+without any upstream call:
+
+* fuzzy name lookup: exact names, aliases (``"신경주"`` → ``"경주"``),
+  spelling variants (``"김천구미역"`` → ``"김천(구미)"``), consonant-only input
+  (``"ㄷㄷㄱ"`` → ``"동대구"``) and close typos;
+* code ↔ name mapping;
+* the stops between two stations on each line serving both, and each
+  station's neighbouring stops, which give alternative origins and
+  destinations when a trip is sold out.
+
+SRT station codes mirror ``srt.STATION_CODE``, and the SRT list is complete, so
+unknown SRT names are rejected. The Korail list only covers the KTX lines:
+Korail codes are filled in where they are known to match the SRT ones (Korail
+is queried by name), and unknown Korail names are passed through unchanged.
+Aliases are per provider: ``"천안"`` means 천안아산 on SRT, which does not stop
+at 천안, but is a real Korail station and reaches Korail unchanged.
+"""
+import difflib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+DATA_FILE = Path(__file__).with_name("stations.json")
+
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+FUZZY_CUTOFF = 0.6
+
+_index: "StationIndex | None" = None
+_index_lock = threading.Lock()
+
+
+class UnknownStationError(ValueError):
+    """Raised for a station name that cannot be resolved.
+
+    Attributes:
+        name: The name as given
+        suggestions: Closest known station names
+    """
+
+    def __init__(self, provider: str, name: str, suggestions: List[str]) -> None:
+        hint = f" (did you mean {', '.join(suggestions)}?)" if suggestions else ""
+        super().__init__(f'Unknown {provider} station: "{name}"{hint}')
+        self.name = name
+        self.suggestions = suggestions
+
+
+def normalize(name: str) -> str:
+    """Key that ignores spacing, brackets, a trailing "역" and ASCII case."""
+    key = "".join(name.split()).replace("(", "").replace(")", "").upper()
+    return key[:-1] if len(key) > 1 and key.endswith("역") else key
+
+
+def choseong(name: str) -> str:
+    """Initial consonants of the Hangul syllables in ``name``."""
+    return "".join(
+        CHOSEONG[(ord(ch) - 0xAC00) // 588] if "가" <= ch <= "힣" else ch for ch in name
+    )
+
+
+class ProviderIndex:
+    """Lookups for the stations and lines of one provider."""
+
+    def __init__(
+        self,
+        stations: Dict[str, str | None],
+        routes: Dict[str, List[str]],
+        aliases: Dict[str, str],
+        complete: bool = True,
+    ) -> None:
+        self.complete = complete
+        self.codes = stations
+        self.names = {code: name for name, code in stations.items() if code}
+        self.routes = routes
+        self._by_key = {normalize(name): name for name in stations}
+        self._by_choseong: Dict[str, List[str]] = {}
+        for name in stations:
+            self._by_choseong.setdefault(choseong(normalize(name)), []).append(name)
+        self._aliases = {
+            normalize(alias): target for alias, target in aliases.items() if target in stations
+        }
+        self._positions: Dict[str, List[Tuple[str, int]]] = {}
+        for line, stops in routes.items():
+            for position, stop in enumerate(stops):
+                self._positions.setdefault(stop, []).append((line, position))
+
+    def resolve(self, name: str) -> str | None:
+        """Canonical station name for ``name``, or None if it is ambiguous or unknown."""
+        if not name:
+            return None
+        if name in self.codes:
+            return name
+        key = normalize(name)
+        found = self._by_key.get(key) or self._aliases.get(key)
+        if found:
+            return found
+        matches = self._by_choseong.get(key, [])
+        return matches[0] if len(matches) == 1 else None
+
+    def suggest(self, name: str, limit: int = 3) -> List[str]:
+        """Known station names closest to ``name``, best first."""
+        key = normalize(name or "")
+        suggestions = list(self._by_choseong.get(choseong(key), []))
+        suggestions += [
+            self._by_key[match]
+            for match in difflib.get_close_matches(key, list(self._by_key), limit, FUZZY_CUTOFF)
+        ]
+        if key in self._aliases:
+            suggestions.insert(0, self._aliases[key])
+        return list(dict.fromkeys(suggestions))[:limit]
+
+    def lookup(self, provider: str, name: str) -> str:
+        """Like ``resolve``, but raise ``UnknownStationError`` with suggestions.
+
+        For an incomplete station list an unknown (non-empty) name is returned
+        as given, since it may be a station the list does not cover.
+        """
+        resolved = self.resolve(name)
+        if resolved is None:
+            if name and not self.complete:
+                return name
+            raise UnknownStationError(provider, name, self.suggest(name))
+        return resolved
+
+    def code(self, name: str) -> str | None:
+        resolved = self.resolve(name)
+        return self.codes.get(resolved) if resolved else None
+
+    def name(self, code: str) -> str | None:
+        return self.names.get(code)
+
+    def lines(self, dep: str, arr: str) -> List[str]:
+        """Lines on which ``dep`` and ``arr`` are both stops."""
+        arr_lines = {line for line, _ in self._positions.get(arr, [])}
+        return [line for line, _ in self._positions.get(dep, []) if line in arr_lines]
+
+    def stops_between(self, dep: str, arr: str) -> Dict[str, List[str]]:
+        """Per line serving both stations, the stops strictly between them in travel order."""
+        result = {}
+        for line in self.lines(dep, arr):
+            stops = self.routes[line]
+            i, j = stops.index(dep), stops.index(arr)
+            step = 1 if i < j else -1
+            result[line] = stops[i + step : j : step]
+        return result
+
+    def neighbours(self, name: str, distance: int = 1) -> List[str]:
+        """Stops within ``distance`` stops of ``name`` on any line, nearest first."""
+        ranked: Dict[str, int] = {}
+        for line, position in self._positions.get(name, []):
+            stops = self.routes[line]
+            for offset in range(1, distance + 1):
+                for other in (position - offset, position + offset):
+                    if 0 <= other < len(stops):
+                        ranked[stops[other]] = min(ranked.get(stops[other], offset), offset)
+        return sorted(ranked, key=ranked.get)
+
+    def alternatives(self, dep: str, arr: str, distance: int = 1) -> Dict[str, List[str]]:
+        """Nearby origins/destinations that still share a line with the other end."""
+        return {
+            "dep": [s for s in self.neighbours(dep, distance) if s != arr and self.lines(s, arr)],
+            "arr": [s for s in self.neighbours(arr, distance) if s != dep and self.lines(dep, s)],
+        }
+
+
+class StationIndex:
+    """Indexes of every provider, built from ``stations.json``.
+
+    Examples:
+        >>> idx = index()
+        >>> idx["SRT"].resolve("김천구미역")
+        '김천(구미)'
+        >>> idx.validate("SRT", "수서", "부산ㅇ")
+        Traceback (most recent call last):
+        UnknownStationError: Unknown SRT station: "부산ㅇ" (did you mean 부산?)
+    """
+
+    def __init__(self, data: dict) -> None:
+        self.providers = {
+            provider: ProviderIndex(
+                stations,
+                data["routes"].get(provider, {}),
+                data.get("aliases", {}).get(provider, {}),
+                data.get("complete", {}).get(provider, True),
+            )
+            for provider, stations in data["stations"].items()
+        }
+
+    @classmethod
+    def load(cls, path: Path = DATA_FILE) -> "StationIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __getitem__(self, provider: str) -> ProviderIndex:
+        return self.providers[provider]
+
+    def validate(self, provider: str, dep: str, arr: str) -> Tuple[str, str]:
+        """Resolve both ends of a trip, raising ``UnknownStationError`` for bad input."""
+        index = self.providers[provider]
+        dep, arr = index.lookup(provider, dep), index.lookup(provider, arr)
+        if dep == arr:
+            raise ValueError("Departure and arrival stations are the same")
+        return dep, arr
+
+
+def index() -> StationIndex:
+    """Return the process-wide index, loading it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = StationIndex.load()
+    return _index
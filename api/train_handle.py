@@ -0,0 +1,172 @@
+"""Signed, compact train handles.
+
+``/api/search`` hands one handle per train to the browser so that the reserve
+routes can rebuild the exact ``SRTTrain``/``ktx.Train`` the user saw without
+another search round trip (and, on SRT, another NetFunnel pass).
+
+A handle is ``v2.<payload>.<signature>`` where the payload is the url-safe
+base64 of a JSON list ``[provider, issued_at, *fields]`` and the signature is a
+truncated HMAC-SHA256 over the payload.
+
+Only the train's identity is signed. Seat availability changes by the
+second, so a handle never carries it: a decoded train is rebuilt as bookable
+in both classes without a waitlist (``SRT_SEATS``/``KTX_SEATS``), which makes
+the providers ask for a seat in the preferred class. A sold-out answer then
+means the state has changed; search again for the current one (and the
+waitlist choice) rather than trusting the handle.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, List, Tuple
+
+VERSION = "v2"
+MAX_AGE = 24 * 60 * 60  # 24 hours
+SIGNATURE_SIZE = 16
+
+# (upstream key, attribute) pairs. Decoding feeds the upstream keys back to
+# the provider's own constructor, so the rebuilt train is indistinguishable
+# from one parsed out of a search response.
+SRT_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("stlbTrnClsfCd", "train_code"),
+    ("trnNo", "train_number"),
+    ("dptDt", "dep_date"),
+    ("dptTm", "dep_time"),
+    ("dptRsStnCd", "dep_station_code"),
+    ("dptStnRunOrdr", "dep_station_run_order"),
+    ("dptStnConsOrdr", "dep_station_constitution_order"),
+    ("arvDt", "arr_date"),
+    ("arvTm", "arr_time"),
+    ("arvRsStnCd", "arr_station_code"),
+    ("arvStnRunOrdr", "arr_station_run_order"),
+    ("arvStnConsOrdr", "arr_station_constitution_order"),
+)
+
+KTX_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("h_trn_clsf_cd", "train_type"),
+    ("h_trn_clsf_nm", "train_type_name"),
+    ("h_trn_gp_cd", "train_group"),
+    ("h_trn_no", "train_no"),
+    ("h_dpt_rs_stn_nm", "dep_name"),
+    ("h_dpt_rs_stn_cd", "dep_code"),
+    ("h_dpt_dt", "dep_date"),
+    ("h_dpt_tm", "dep_time"),
+    ("h_arv_rs_stn_nm", "arr_name"),
+    ("h_arv_rs_stn_cd", "arr_code"),
+    ("h_arv_dt", "arr_date"),
+    ("h_arv_tm", "arr_time"),
+    ("h_run_dt", "run_date"),
+)
+
+FIELDS = {"SRT": SRT_FIELDS, "KTX": KTX_FIELDS}
+
+# Seat state given to decoded trains: both classes open, no waitlist
+SRT_SEATS = {
+    "gnrmRsvPsbStr": "예약가능",
+    "sprmRsvPsbStr": "예약가능",
+    "rsvWaitPsbCdNm": "",
+    "rsvWaitPsbCd": "-1",
+}
+KTX_SEATS = {
+    "h_rsv_psb_flg": "Y",
+    "h_rsv_psb_nm": "",
+    "h_spe_rsv_cd": "11",
+    "h_gen_rsv_cd": "11",
+    "h_wait_rsv_flg": "-1",
+}
+
+_SECRET = (os.environ.get("TRAIN_HANDLE_SECRET") or "").encode("utf-8") or os.urandom(32)
+
+
+class InvalidHandleError(ValueError):
+    pass
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_SECRET, payload.encode("ascii"), hashlib.sha256).digest()
+    return _b64encode(digest[:SIGNATURE_SIZE])
+
+
+def encode(provider: str, train: Any) -> str:
+    """Return a signed handle for a train returned by ``search_train``.
+
+    Args:
+        provider: "SRT" or "KTX"
+        train: ``srt.SRTTrain`` or ``ktx.Train`` instance
+
+    Returns:
+        str: Handle safe to hand out to the browser
+    """
+    if provider not in FIELDS:
+        raise ValueError(f"Unknown provider: {provider}")
+
+    values: List[Any] = [provider, int(time.time())]
+    values.extend(getattr(train, attr) for _, attr in FIELDS[provider])
+    payload = _b64encode(
+        json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+    return f"{VERSION}.{payload}.{_sign(payload)}"
+
+
+def decode_fields(handle: str, provider: str | None = None) -> Tuple[str, dict]:
+    """Verify a handle and return ``(provider, upstream_fields)``.
+
+    Raises:
+        InvalidHandleError: If the handle is malformed, tampered with,
+            expired or issued for another provider
+    """
+    try:
+        version, payload, signature = handle.split(".")
+    except (AttributeError, ValueError):
+        raise InvalidHandleError("Malformed train handle")
+
+    if version != VERSION:
+        raise InvalidHandleError(f"Unsupported train handle version: {version}")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidHandleError("Train handle signature mismatch")
+
+    try:
+        values = json.loads(_b64decode(payload).decode("utf-8"))
+        handle_provider, issued_at, *fields = values
+    except (ValueError, TypeError):
+        raise InvalidHandleError("Malformed train handle payload")
+
+    if provider and handle_provider != provider:
+        raise InvalidHandleError(
+            f"Train handle issued for {handle_provider}, not {provider}"
+        )
+    if handle_provider not in FIELDS or len(fields) != len(FIELDS[handle_provider]):
+        raise InvalidHandleError("Train handle does not match the field layout")
+    if time.time() - issued_at > MAX_AGE:
+        raise InvalidHandleError("Train handle expired")
+
+    keys = (key for key, _ in FIELDS[handle_provider])
+    return handle_provider, dict(zip(keys, fields))
+
+
+def decode(handle: str, provider: str | None = None) -> Any:
+    """Rebuild the ``srt.SRTTrain``/``ktx.Train`` a handle was issued for.
+
+    The seat state is not the one observed at search time but ``SRT_SEATS``
+    or ``KTX_SEATS``; see the module docstring.
+    """
+    provider, data = decode_fields(handle, provider)
+    if provider == "SRT":
+        import srt
+
+        return srt.SRTTrain({**data, **SRT_SEATS})
+
+    import ktx
+
+    return ktx.Train({**data, **KTX_SEATS})
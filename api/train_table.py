@@ -0,0 +1,301 @@
+"""Columnar search results.
+
+``SRT.search_train``/``Korail.search_train`` used to build one object per
+row of the raw payload (``dsOutput1``/``trn_info``) and then filter the
+objects with comprehensions. A ``TrainTable`` instead keeps the raw rows and
+extracts the handful of fields that searches filter and rank on into
+columns:
+
+=================  ======  ==============================================
+column             type    meaning
+=================  ======  ==============================================
+``train_number``   str     train number
+``train_code``     str     train class code (SRT ``"17"``, KTX ``"00"``...)
+``dep_date``       str     departure date, YYYYMMDD
+``dep_time``       str     departure time, HHMMSS
+``dep_at``         int     departure, minutes since 0001-01-01
+``arr_at``         int     arrival, minutes since 0001-01-01
+``duration``       int     minutes
+``general``        bool    general class seats available
+``special``        bool    special class seats available
+``waitlist``       int     waitlist code (9: open, 0: full, -1: none...)
+=================  ======  ==============================================
+
+Filters and sorts work on whole columns and only select row indices;
+``to_trains()`` builds ``SRTTrain``/``ktx.Train`` objects for the rows that
+are left. ``dep_at``/``arr_at`` are absolute, so tables of several dates or
+routes can be concatenated and ranked together.
+
+With NumPy installed the columns are NumPy arrays and filters/sorts are
+vectorized; without it they are ``array``/``list`` columns with the same API.
+"""
+from array import array
+from datetime import date as date_cls
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INT_COLUMNS = ("dep_at", "arr_at", "duration", "waitlist")
+BOOL_COLUMNS = ("general", "special")
+STR_COLUMNS = ("train_number", "train_code", "dep_date", "dep_time")
+
+_day_minutes: Dict[str, int] = {}
+
+
+def minutes(date: str, time: str) -> int:
+    """Minutes since 0001-01-01 of a YYYYMMDD date and HHMMSS time."""
+    day = _day_minutes.get(date)
+    if day is None:
+        day = _day_minutes[date] = date_cls(int(date[:4]), int(date[4:6]), int(date[6:8])).toordinal() * 1440
+    return day + int(time[:2]) * 60 + int(time[2:4])
+
+
+def _srt_row(row: dict) -> tuple:
+    return (
+        row["trnNo"],
+        row["stlbTrnClsfCd"],
+        row["dptDt"],
+        row["dptTm"],
+        minutes(row["dptDt"], row["dptTm"]),
+        minutes(row["arvDt"], row["arvTm"]),
+        "예약가능" in row["gnrmRsvPsbStr"],
+        "예약가능" in row["sprmRsvPsbStr"],
+        int(row["rsvWaitPsbCd"]),
+    )
+
+
+def _korail_row(row: dict) -> tuple:
+    dep_date, dep_time = row.get("h_dpt_dt"), row.get("h_dpt_tm")
+    return (
+        row.get("h_trn_no"),
+        row.get("h_trn_clsf_cd"),
+        dep_date,
+        dep_time,
+        minutes(dep_date, dep_time),
+        minutes(row.get("h_arv_dt") or dep_date, row.get("h_arv_tm")),
+        row.get("h_gen_rsv_cd") == "11",
+        row.get("h_spe_rsv_cd") == "11",
+        int(row.get("h_wait_rsv_flg") or -1),
+    )
+
+
+def _column(name: str, values: Iterable) -> Sequence:
+    if np is not None:
+        dtype = np.int64 if name in INT_COLUMNS else bool if name in BOOL_COLUMNS else object
+        return np.fromiter(values, dtype=dtype) if dtype is not object else np.array(list(values), dtype=object)
+    if name in INT_COLUMNS:
+        return array("q", values)
+    if name in BOOL_COLUMNS:
+        return array("b", values)
+    return list(values)
+
+
+class TrainTable:
+    """Search results of one provider as columns over the raw payload rows.
+
+    Args:
+        rows: Raw payload rows (``dsOutput1`` or ``trn_info`` items)
+        columns: Column name -> values, one per row
+        factory: Builds a train object from a raw row
+
+    Examples:
+        >>> table = client.search_table("수서", "부산", "20250101", "060000")
+        >>> kept = table.filter(available=True, seat_type="GENERAL", dep_to="120000").sort("duration", "dep_at")
+        >>> kept.head(3).to_trains()
+    """
+
+    def __init__(self, rows: List[dict], columns: Dict[str, Sequence], factory: Callable[[dict], Any]) -> None:
+        self.rows = rows
+        self.columns = columns
+        self.factory = factory
+
+    @classmethod
+    def _build(cls, rows: List[dict], extract: Callable[[dict], tuple], factory: Callable[[dict], Any]) -> "TrainTable":
+        fields = STR_COLUMNS + ("dep_at", "arr_at") + BOOL_COLUMNS + ("waitlist",)
+        values = list(zip(*map(extract, rows))) or [()] * len(fields)
+        columns = {name: _column(name, column) for name, column in zip(fields, values)}
+        if np is not None:
+            columns["duration"] = columns["arr_at"] - columns["dep_at"]
+        else:
+            columns["duration"] = array("q", (a - d for d, a in zip(columns["dep_at"], columns["arr_at"])))
+        return cls(rows, columns, factory)
+
+    @classmethod
+    def from_srt(cls, rows: List[dict], factory: Callable[[dict], Any]) -> "TrainTable":
+        return cls._build(rows, _srt_row, factory)
+
+    @classmethod
+    def from_korail(cls, rows: List[dict], factory: Callable[[dict], Any]) -> "TrainTable":
+        return cls._build(rows, _korail_row, factory)
+
+    @classmethod
+    def concat(cls, tables: List["TrainTable"]) -> "TrainTable":
+        """One table of the rows of several tables (e.g. a multi-date sweep)."""
+        if not tables:
+            raise ValueError("At least one table is required")
+        rows = [row for table in tables for row in table.rows]
+        columns = {}
+        for name in tables[0].columns:
+            parts = [table.columns[name] for table in tables]
+            if np is not None:
+                columns[name] = np.concatenate(parts)
+            else:
+                columns[name] = _column(name, (value for part in parts for value in part))
+        return cls(rows, columns, tables[0].factory)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, name: str) -> Sequence:
+        return self.columns[name]
+
+    def mask(
+        self,
+        available: bool | None = None,
+        seat_type: str | None = None,
+        dep_from: str | None = None,
+        dep_to: str | None = None,
+        max_duration: int | None = None,
+        waitlist: int | None = None,
+        train_code: str | None = None,
+        train_number: str | None = None,
+    ) -> Sequence:
+        """Row mask for the given conditions (all must hold).
+
+        Args:
+            available: True for rows with seats in ``seat_type``, False for rows without
+            seat_type: "GENERAL", "SPECIAL" or None for either class
+            dep_from: Earliest departure time, HHMMSS (inclusive)
+            dep_to: Latest departure time, HHMMSS (inclusive)
+            max_duration: Longest trip in minutes
+            waitlist: Required waitlist code
+            train_code: Required train class code
+            train_number: Required train number
+        """
+        c = self.columns
+        conditions = []
+        if available is not None:
+            if seat_type == "GENERAL":
+                seats = c["general"]
+            elif seat_type == "SPECIAL":
+                seats = c["special"]
+            else:
+                seats = _or(c["general"], c["special"])
+            conditions.append(seats if available else _not(seats))
+        if dep_from is not None:
+            conditions.append(_compare(c["dep_time"], lambda t: t >= dep_from))
+        if dep_to is not None:
+            conditions.append(_compare(c["dep_time"], lambda t: t <= dep_to))
+        if max_duration is not None:
+            conditions.append(_compare(c["duration"], lambda d: d <= max_duration))
+        if waitlist is not None:
+            conditions.append(_compare(c["waitlist"], lambda w: w == waitlist))
+        if train_code is not None:
+            conditions.append(_compare(c["train_code"], lambda t: t == train_code))
+        if train_number is not None:
+            conditions.append(_compare(c["train_number"], lambda t: t == train_number))
+
+        result = _full(len(self), True)
+        for condition in conditions:
+            result = _and(result, condition)
+        return result
+
+    def filter(self, **conditions: Any) -> "TrainTable":
+        """Rows matching ``mask(**conditions)``."""
+        return self.where(self.mask(**conditions))
+
+    def where(self, mask: Sequence) -> "TrainTable":
+        """Rows whose mask value is true (combine masks with ``any_of``/``all_of``)."""
+        if np is not None:
+            return self.take(np.flatnonzero(np.asarray(mask, dtype=bool)))
+        return self.take([i for i, keep in enumerate(mask) if keep])
+
+    def take(self, indices: Sequence[int]) -> "TrainTable":
+        if np is not None:
+            indices = np.asarray(indices, dtype=np.int64)
+            columns = {name: column[indices] for name, column in self.columns.items()}
+        else:
+            columns = {name: _column(name, (column[i] for i in indices)) for name, column in self.columns.items()}
+        return TrainTable([self.rows[i] for i in indices], columns, self.factory)
+
+    def sort(self, *keys: str) -> "TrainTable":
+        """Rows ordered by the given columns; prefix a column with "-" for descending."""
+        if not keys or not len(self):
+            return self
+        if np is not None:
+            arrays = []
+            for key in reversed(keys):
+                column = self.columns[key.lstrip("-")]
+                if column.dtype == object:
+                    column = np.unique(column, return_inverse=True)[1]
+                arrays.append(-column.astype(np.int64) if key.startswith("-") else column)
+            return self.take(np.lexsort(arrays))
+
+        order = list(range(len(self)))
+        # Stable sorts from the least to the most significant key
+        for key in reversed(keys):
+            column = self.columns[key.lstrip("-")]
+            order.sort(key=column.__getitem__, reverse=key.startswith("-"))
+        return self.take(order)
+
+    def around(self, dep_at: int, window: int) -> "TrainTable":
+        """Rows departing within ``window`` minutes of ``dep_at``, nearest first."""
+        if np is not None:
+            gaps = np.abs(self.columns["dep_at"] - dep_at)
+            keep = np.flatnonzero(gaps <= window)
+            return self.take(keep[np.argsort(gaps[keep], kind="stable")])
+        gaps = [abs(d - dep_at) for d in self.columns["dep_at"]]
+        return self.take(sorted((i for i, gap in enumerate(gaps) if gap <= window), key=gaps.__getitem__))
+
+    def head(self, n: int) -> "TrainTable":
+        return self.take(range(min(n, len(self))))
+
+    def to_trains(self) -> list:
+        """Train objects for the rows of this table, in table order."""
+        return [self.factory(row) for row in self.rows]
+
+
+def any_of(*masks: Sequence) -> Sequence:
+    result = masks[0]
+    for mask in masks[1:]:
+        result = _or(result, mask)
+    return result
+
+
+def all_of(*masks: Sequence) -> Sequence:
+    result = masks[0]
+    for mask in masks[1:]:
+        result = _and(result, mask)
+    return result
+
+
+def _full(n: int, value: bool) -> Sequence:
+    return np.full(n, value, dtype=bool) if np is not None else array("b", [value]) * n
+
+
+def _compare(column: Sequence, predicate: Callable[[Any], bool]) -> Sequence:
+    if np is not None:
+        # Comparisons of NumPy columns with a scalar are vectorized
+        return np.asarray(predicate(column), dtype=bool)
+    return array("b", map(predicate, column))
+
+
+def _and(a: Sequence, b: Sequence) -> Sequence:
+    if np is not None:
+        return np.logical_and(a, b)
+    return array("b", (x and y for x, y in zip(a, b)))
+
+
+def _or(a: Sequence, b: Sequence) -> Sequence:
+    if np is not None:
+        return np.logical_or(a, b)
+    return array("b", (x or y for x, y in zip(a, b)))
+
+
+def _not(a: Sequence) -> Sequence:
+    if np is not None:
+        return np.logical_not(a)
+    return array("b", (not x for x in a))
@@ -0,0 +1,156 @@
+"""Warm, shared HTTP sessions for the upstream hosts.
+
+Each upstream host gets a ``SessionPool`` of keep-alive sessions. Clients and
+their NetFunnel helpers lease a session for their lifetime instead of opening
+(and throwing away) their own, so the DNS lookup, TCP connect and TLS
+handshake are paid once per pooled session rather than once per request
+handler. Leased sessions come back to the pool with their cookies cleared when
+the owner is garbage collected.
+
+``start()`` pre-connects every registered pool and then pings idle sessions
+periodically so the first booking request after a quiet period does not hit a
+cold connection.
+
+The HTTP library (curl_cffi, or requests as a fallback) is only imported when
+the first session is created, which keeps importing this module cheap.
+"""
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Tuple
+
+POOL_SIZE = 2  # idle sessions kept per host
+KEEPALIVE_INTERVAL = 25.0  # seconds, below typical server idle timeouts
+PING_TIMEOUT = 5.0  # seconds
+
+POOLS: Dict[str, "SessionPool"] = {}
+
+_thread: threading.Thread | None = None
+_thread_lock = threading.Lock()
+_session_factory: Callable[[str], Any] | None = None
+
+
+def new_session(impersonate: str = "chrome") -> Any:
+    global _session_factory
+    if _session_factory is None:
+        try:
+            import curl_cffi
+
+            _session_factory = lambda fingerprint: curl_cffi.Session(impersonate=fingerprint)
+        except ImportError:
+            import requests
+
+            _session_factory = lambda fingerprint: requests.session()
+    return _session_factory(impersonate)
+
+
+class SessionPool:
+    """Keep-alive sessions for one upstream host.
+
+    Args:
+        name: Pool name
+        base_url: URL pinged to open and keep the connection alive
+        impersonate: curl_cffi browser fingerprint
+        headers: Default headers restored on every lease
+        size: Number of idle sessions to keep
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        impersonate: str = "chrome",
+        headers: Dict[str, str] | None = None,
+        size: int = POOL_SIZE,
+    ) -> None:
+        self.name = name
+        self.base_url = base_url
+        self.impersonate = impersonate
+        self.headers = dict(headers or {})
+        self.size = size
+        self._idle: List[Tuple[Any, float]] = []  # (session, last_used)
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Any:
+        """Return a warm session (or a new one) with clean cookies and headers."""
+        with self._lock:
+            session = self._idle.pop()[0] if self._idle else None
+        if session is None:
+            session = new_session(self.impersonate)
+        session.cookies.clear()
+        session.headers.clear()
+        session.headers.update(self.headers)
+        return session
+
+    def release(self, session: Any) -> None:
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((session, time.monotonic()))
+                return
+        session.close()
+
+    def lease(self, owner: Any) -> Any:
+        """Acquire a session that returns to the pool once ``owner`` is collected."""
+        session = self.acquire()
+        weakref.finalize(owner, self.release, session)
+        return session
+
+    def warm_up(self) -> None:
+        """Fill the pool and open a connection on every idle session."""
+        with self._lock:
+            missing = self.size - len(self._idle)
+        sessions = [new_session(self.impersonate) for _ in range(missing)]
+        for session in sessions:
+            session.headers.update(self.headers)
+            self._ping(session)
+            self.release(session)
+
+    def ping_idle(self, max_idle: float = KEEPALIVE_INTERVAL) -> None:
+        """Ping sessions that have been idle for longer than ``max_idle`` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [entry for entry in self._idle if now - entry[1] >= max_idle]
+            self._idle = [entry for entry in self._idle if now - entry[1] < max_idle]
+        for session, _ in stale:
+            self._ping(session)
+            self.release(session)
+
+    def _ping(self, session: Any) -> None:
+        try:
+            session.head(self.base_url, timeout=PING_TIMEOUT)
+        except Exception:
+            pass  # the next real request reconnects on its own
+
+
+def pool(
+    name: str,
+    base_url: str,
+    impersonate: str = "chrome",
+    headers: Dict[str, str] | None = None,
+    size: int = POOL_SIZE,
+) -> SessionPool:
+    """Register (or return the already registered) pool called ``name``."""
+    if name not in POOLS:
+        POOLS[name] = SessionPool(name, base_url, impersonate, headers, size)
+    return POOLS[name]
+
+
+def start(interval: float = KEEPALIVE_INTERVAL) -> None:
+    """Pre-connect every pool and keep idle sessions alive (idempotent)."""
+    global _thread
+    with _thread_lock:
+        if _thread and _thread.is_alive():
+            return
+        _thread = threading.Thread(
+            target=_keepalive_loop, args=(interval,), name="transport-keepalive", daemon=True
+        )
+        _thread.start()
+
+
+def _keepalive_loop(interval: float) -> None:
+    for p in list(POOLS.values()):
+        p.warm_up()
+    while True:
+        time.sleep(interval)
+        for p in list(POOLS.values()):
+            p.ping_idle(interval)
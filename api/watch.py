@@ -0,0 +1,182 @@
+"""Long-poll support: change fingerprints and wake-ups across threads.
+
+A watcher sends the ``etag`` of the state it last saw and is answered as soon
+as the state's etag differs, or with the unchanged state when its timeout
+runs out. The state lives in worker threads (jobs, monitors, pollers) while
+async watchers wait on the event loop, so producers call
+``changes.notify(key)`` from any thread on every change to wake the
+watchers of ``key``; an idle watcher costs no work until then.
+``RECHECK_INTERVAL`` is only a safety net for a missed notify.
+
+Waiting is done by ``asgi.py``; under a WSGI server a watch request answers
+immediately with the current state and etag (a plain poll).
+
+Watchers are told apart by a ``watcher`` cookie the server issues and signs
+(``watcher``/``issue_watcher``), never by what the request claims, so the
+fair share of background polls is per browser rather than per proxy address.
+The cookie is signed with its own key, ``server_keys.key("watcher")``, so no
+other value the server signs (e.g. a train handle) passes as one.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+from http.cookies import CookieError, SimpleCookie
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Tuple
+
+import server_keys
+
+WATCH_TIMEOUT = 25.0  # seconds
+MAX_WATCH_TIMEOUT = 60.0  # seconds
+RECHECK_INTERVAL = 10.0  # seconds
+WATCHER_COOKIE = "watcher"
+WATCHER_MAX_AGE = 365 * 24 * 60 * 60  # seconds
+
+
+def etag(state: Any) -> str:
+    """Fingerprint of a JSON-serializable state."""
+    data = json.dumps(state, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def _sign(watcher_id: str) -> str:
+    digest = hmac.new(server_keys.key("watcher"), watcher_id.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b"=").decode("ascii")
+
+
+def watcher(cookie: str | None) -> str | None:
+    """Watcher id in a ``watcher`` cookie value, or None if it is missing or not signed by us."""
+    watcher_id, _, signature = (cookie or "").partition(".")
+    if not watcher_id or not signature:
+        return None
+    try:
+        valid = hmac.compare_digest(signature, _sign(watcher_id))
+    except (TypeError, UnicodeEncodeError):
+        return None
+    return watcher_id if valid else None
+
+
+def watcher_from_header(header: str | None) -> str | None:
+    """``watcher()`` of the cookie in a raw ``Cookie`` request header."""
+    try:
+        morsel = SimpleCookie(header or "").get(WATCHER_COOKIE)
+    except CookieError:
+        return None
+    return watcher(morsel.value if morsel else None)
+
+
+def issue_watcher() -> Tuple[str, str]:
+    """A new watcher id and the ``Set-Cookie`` header value that hands it out.
+
+    Examples:
+        >>> watcher_id, set_cookie = issue_watcher()
+        >>> watcher(SimpleCookie(set_cookie)[WATCHER_COOKIE].value) == watcher_id
+        True
+    """
+    watcher_id = secrets.token_urlsafe(12)
+    cookie = SimpleCookie()
+    cookie[WATCHER_COOKIE] = f"{watcher_id}.{_sign(watcher_id)}"
+    cookie[WATCHER_COOKIE].update({"path": "/", "max-age": WATCHER_MAX_AGE, "httponly": True, "samesite": "Lax"})
+    return watcher_id, cookie[WATCHER_COOKIE].OutputString()
+
+
+def timeout_arg(value: str | None) -> float:
+    """Watch timeout from a query argument, clamped to ``[0, MAX_WATCH_TIMEOUT]``."""
+    try:
+        timeout = float(value) if value else WATCH_TIMEOUT
+    except ValueError:
+        timeout = WATCH_TIMEOUT
+    return max(0.0, min(timeout, MAX_WATCH_TIMEOUT))
+
+
+class Changes:
+    """Wakes coroutines waiting on a key, from any thread.
+
+    Examples:
+        >>> changes.notify(("open-sale", job.id))  # worker thread
+        >>> await changes.wait(("open-sale", job.id), timeout=1.0)  # event loop
+    """
+
+    def __init__(self) -> None:
+        self._waiters: Dict[Hashable, Set[asyncio.Future]] = {}
+        self._lock = threading.Lock()
+
+    def notify(self, key: Hashable) -> None:
+        with self._lock:
+            waiters = self._waiters.pop(key, ())
+        for future in waiters:
+            future.get_loop().call_soon_threadsafe(_wake, future)
+
+    async def wait(self, key: Hashable, timeout: float) -> bool:
+        """Wait for a ``notify(key)``; False if ``timeout`` passed first."""
+        future = self.subscribe(key)
+        try:
+            done, _ = await asyncio.wait([future], timeout=timeout)
+            return bool(done)
+        finally:
+            self.unsubscribe(key, future)
+
+    def subscribe(self, key: Hashable) -> asyncio.Future:
+        """Future resolved by the next ``notify(key)``; subscribe before reading
+        the state, so a change made in between is not missed."""
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(future)
+        return future
+
+    def unsubscribe(self, key: Hashable, future: asyncio.Future) -> None:
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[key]
+
+    def watchers(self) -> int:
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+changes = Changes()
+
+
+async def until_changed(
+    key: Hashable,
+    snapshot: Callable[[], Tuple[Any, Any]] | Callable[[], Awaitable[Tuple[Any, Any]]],
+    since: str | None,
+    timeout: float,
+) -> Tuple[Any, str, bool]:
+    """Wait until the watched state's etag differs from ``since``.
+
+    Args:
+        key: Key producers notify on
+        snapshot: Returns ``(payload, state)``; ``state`` is the part of the
+            payload that counts as a change (e.g. without clock estimates)
+        since: Etag the watcher already has
+        timeout: Seconds to wait for a change
+
+    Returns:
+        ``(payload, etag, changed)``
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        future = changes.subscribe(key)
+        try:
+            result = snapshot()
+            payload, state = await result if asyncio.iscoroutine(result) else result
+            tag = etag(state)
+            remaining = deadline - loop.time()
+            if tag != since or remaining <= 0:
+                return payload, tag, tag != since
+            await asyncio.wait([future], timeout=min(remaining, RECHECK_INTERVAL))
+        finally:
+            changes.unsubscribe(key, future)
@@ -0,0 +1,585 @@
+"""Concurrency load test for the Flask API.
+
+Runs ``api/app.py`` under one or more server models against a local SRT
+stand-in and drives it with virtual users, then reports throughput, tail
+latency per endpoint and how busy every server worker was.
+
+Pieces (all started by ``run``):
+
+- ``stub``: a threaded HTTP server answering the SRT endpoints the API uses
+  (login, schedule search, reserve, reservation list, ticket info) after a
+  configurable latency, with a configurable sold-out rate for reserves.
+- the API under test, started per server model with its SRT endpoints,
+  NetFunnel and keep-alive pools pointed at the stub (``create_app``), and
+  a WSGI middleware that records each worker process's busy time and
+  in-flight requests.
+- virtual users, each looping over a weighted mix of scenarios:
+  ``search`` (GET /api/search), ``reserve`` (search, then POST /api/reserve
+  with the returned handle), ``auto_retry`` (search, then POST
+  /api/auto-retry until it books or gives up) and ``reservations``
+  (GET /api/reservations).
+
+Server models: ``threaded`` (Werkzeug ``run_simple(threaded=True)``),
+``gunicorn-sync``, ``gunicorn-gthread``, ``gevent`` (gunicorn's gevent
+worker) and ``asgi`` (``api/asgi.py`` under uvicorn). Models whose packages
+are not installed are skipped. Only SRT is simulated.
+
+Usage:
+    python benchmarks/loadtest.py run [--models threaded,gunicorn-sync,gevent]
+        [--concurrency 1,8,32,64] [--duration 20] [--workers 4]
+        [--mix search=5,reserve=1,auto_retry=3,reservations=1]
+        [--upstream-latency 0.15] [--sold-out 0.7] [--accounts 4]
+        [--save benchmarks/results]
+    python benchmarks/loadtest.py compare benchmarks/results/*.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib import error as urlerror
+from urllib import parse
+from urllib import request as urlrequest
+
+BENCH_DIR = Path(__file__).resolve().parent
+API_DIR = BENCH_DIR.parent / "api"
+RESULTS_DIR = BENCH_DIR / "results"
+
+DEFAULT_MIX = "search=5,reserve=1,auto_retry=3,reservations=1"
+STARTUP_TIMEOUT = 30.0  # seconds
+REQUEST_TIMEOUT = 60.0  # seconds
+STATS_INTERVAL = 0.5  # seconds between worker stats dumps
+
+
+# --- Upstream stand-in ---------------------------------------------------------
+
+class Upstream:
+    """State and knobs of the SRT stand-in."""
+
+    def __init__(self, latency: float, jitter: float, sold_out: float, held: int, trains: int) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.sold_out = sold_out
+        self.trains = trains
+        self.held = deque(maxlen=held)  # pnrs listed by the reservation list
+        self.recent = deque()  # (created, pnr) of the last seconds
+        self.next_pnr = 310000000
+        self.lock = threading.Lock()
+
+    def delay(self) -> None:
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def reserve(self, form: dict) -> dict:
+        if random.random() < self.sold_out:
+            return result("FAIL", "잔여석없음")
+        with self.lock:
+            self.next_pnr += 1
+            pnr = str(self.next_pnr)
+            self.held.append((pnr, form.get("dptDt1", ""), form.get("dptTm1", "")))
+            self.recent.append((time.monotonic(), self.held[-1]))
+        return dict(result("SUCC"), reservListMap=[{"pnrNo": pnr}])
+
+    def reservations(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0][0] > 5:
+                self.recent.popleft()
+            # Fresh reservations must be listed so reserve can look them up
+            listed = list(dict.fromkeys(list(self.held) + [entry for _, entry in self.recent]))
+        trains, pays = [], []
+        for pnr, date, time_ in listed:
+            trains.append({"pnrNo": pnr, "rcvdAmt": "52600", "tkSpecNum": "1", "seatNum": "1"})
+            pays.append({
+                "stlbTrnClsfCd": "17", "trnNo": "00301", "dptDt": date or "20300101",
+                "dptTm": time_ or "060000", "dptRsStnCd": "0551", "arvTm": "083000",
+                "arvRsStnCd": "0020", "iseLmtDt": date or "20300101", "iseLmtTm": "050000",
+                "stlFlg": "N",
+            })
+        return dict(result("SUCC"), trainListMap=trains, payListMap=pays)
+
+    def search(self, form: dict) -> dict:
+        date, start = form.get("dptDt", "20300101"), int(form.get("dptTm", "060000")[:2])
+        rows = []
+        for i in range(self.trains):
+            hour, minute = min(23, start + i // 3), (i % 3) * 20
+            rows.append({
+                "stlbTrnClsfCd": "17", "trnNo": f"{301 + i:05d}", "dptDt": date,
+                "dptTm": f"{hour:02d}{minute:02d}00", "dptRsStnCd": form.get("dptRsStnCd", "0551"),
+                "dptStnRunOrdr": "000001", "dptStnConsOrdr": "000001", "arvDt": date,
+                "arvTm": f"{min(23, hour + 2):02d}{minute:02d}00", "arvRsStnCd": form.get("arvRsStnCd", "0020"),
+                "arvStnRunOrdr": "000009", "arvStnConsOrdr": "000009",
+                "gnrmRsvPsbStr": random.choice(["예약가능", "매진"]), "sprmRsvPsbStr": "매진",
+                "rsvWaitPsbCd": "-1", "rsvWaitPsbCdNm": "",
+            })
+        return dict(result("SUCC"), outDataSets={"dsOutput1": rows})
+
+
+def result(status: str, message: str = "") -> dict:
+    return {"resultMap": [{"strResult": status, "msgTxt": message}]}
+
+
+LOGIN = {"userMap": {"MB_CRD_NO": "1234567890", "CUST_NM": "부하시험", "MBL_PHONE": "01000000000"}}
+TICKET = {"scarNo": "5", "seatNo": "7A", "psrmClCd": "1", "dcntKndCd": "000",
+          "rcvdAmt": "52600", "stdrPrc": "52600", "dcntPrc": "0"}
+
+
+def stub_handler(upstream: Upstream):
+    routes = {
+        "selectListApb01080_n.do": lambda form: LOGIN,
+        "selectListAra10007_n.do": upstream.search,
+        "selectListArc05013_n.do": upstream.reserve,
+        "selectListAtc14016_n.do": lambda form: upstream.reservations(),
+        "selectListArd02019_n.do": lambda form: dict(result("SUCC"), trainListMap=[TICKET]),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, body: dict) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json;charset=UTF-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            form = dict(parse.parse_qsl(self.rfile.read(length).decode("utf-8")))
+            upstream.delay()
+            route = routes.get(self.path.rsplit("/", 1)[-1].split("?")[0])
+            self._reply(route(form) if route else result("SUCC"))
+
+        def do_GET(self) -> None:
+            upstream.delay()
+            self._reply(result("SUCC"))
+
+        def do_HEAD(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return Handler
+
+
+def serve_stub(args: argparse.Namespace) -> None:
+    upstream = Upstream(args.latency, args.jitter, args.sold_out, args.held, args.trains)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), stub_handler(upstream))
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+# --- API under test ------------------------------------------------------------
+
+class WorkerStats:
+    """WSGI middleware recording the busy time and concurrency of one worker process."""
+
+    def __init__(self, app, stats_dir: str | None) -> None:
+        self.app = app
+        self.path = Path(stats_dir) / f"{os.getpid()}.json" if stats_dir else None
+        self.busy = 0.0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        if self.path:
+            threading.Thread(target=self._dump_loop, daemon=True).start()
+
+    def __call__(self, environ, start_response):
+        started = time.monotonic()
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return list(self.app(environ, start_response))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.requests += 1
+                self.busy += time.monotonic() - started
+
+    def _dump_loop(self) -> None:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            with self.lock:
+                snapshot = {"pid": os.getpid(), "busy": self.busy, "requests": self.requests,
+                            "max_in_flight": self.max_in_flight, "at": time.time()}
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(snapshot))
+            os.replace(tmp, self.path)
+
+
+def create_app(upstream: str | None = None, stats_dir: str | None = None):
+    """The Flask app with every SRT upstream pointed at the stand-in."""
+    sys.path.insert(0, str(API_DIR))
+    upstream = upstream or os.environ["LOADTEST_UPSTREAM"]
+    stats_dir = stats_dir or os.environ.get("LOADTEST_STATS_DIR")
+
+    import srt
+    import transport
+
+    for name, url in list(srt.API_ENDPOINTS.items()):
+        srt.API_ENDPOINTS[name] = url.replace(srt.SRT_MOBILE, upstream)
+    policies = {url.replace(srt.SRT_MOBILE, upstream): p for url, p in srt.REQUEST_POLICIES.items()}
+    srt.REQUEST_POLICIES.clear()
+    srt.REQUEST_POLICIES.update(policies)
+    srt.NetFunnelHelper.run = lambda self: "loadtest"
+    for pool in transport.POOLS.values():
+        pool.base_url = upstream
+
+    import app
+
+    app.app.wsgi_app = WorkerStats(app.app.wsgi_app, stats_dir)
+    return app.app
+
+
+def create_asgi():
+    """``create_app()`` served by ``api/asgi.py``."""
+    create_app()
+    import asgi
+
+    return asgi.app
+
+
+def serve_threaded(args: argparse.Namespace) -> None:
+    from werkzeug.serving import run_simple
+
+    run_simple("127.0.0.1", args.port, create_app(), threaded=True)
+
+
+def gunicorn(worker_class: str, *extra: str):
+    def command(port: int, workers: int) -> list:
+        return [
+            sys.executable, "-m", "gunicorn", "-k", worker_class, "-w", str(workers), *extra,
+            "--timeout", "120", "-b", f"127.0.0.1:{port}", "--chdir", str(BENCH_DIR),
+            "loadtest:create_app()",
+        ]
+
+    return command
+
+
+MODELS = {
+    "threaded": ((), lambda port, workers: [sys.executable, __file__, "serve", "--port", str(port)]),
+    "gunicorn-sync": (("gunicorn",), gunicorn("sync")),
+    "gunicorn-gthread": (("gunicorn",), gunicorn("gthread", "--threads", "8")),
+    "gevent": (("gunicorn", "gevent"), gunicorn("gevent", "--worker-connections", "1000")),
+    "asgi": (("uvicorn",), lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "--factory", "--workers", str(workers), "--port", str(port),
+        "--app-dir", str(BENCH_DIR), "--log-level", "warning", "loadtest:create_asgi",
+    ]),
+}
+
+
+# --- Load generation -----------------------------------------------------------
+
+class Recorder:
+    def __init__(self) -> None:
+        self.samples: dict = {}
+        self.lock = threading.Lock()
+
+    def add(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+
+def http(base: str, method: str, path: str, recorder: Recorder, endpoint: str, data: dict | None = None):
+    body = parse.urlencode(data).encode("utf-8") if data is not None else None
+    req = urlrequest.Request(base + path, data=body, method=method)
+    if body is not None:
+        req.add_header("Content-Type", "application/x-www-form-urlencoded")
+        req.add_header("Idempotency-Key", uuid.uuid4().hex)
+    started = time.monotonic()
+    try:
+        with urlrequest.urlopen(req, timeout=REQUEST_TIMEOUT) as response:
+            payload = json.loads(response.read() or b"{}")
+            ok = "error_message" not in payload and "error" not in payload
+    except (urlerror.URLError, OSError, ValueError):
+        payload, ok = {}, False
+    recorder.add(endpoint, time.monotonic() - started, ok)
+    return payload
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base: str, mix: list, deadline: float, recorder: Recorder, args: argparse.Namespace) -> None:
+        super().__init__(daemon=True)
+        self.base = base
+        self.scenarios, self.weights = zip(*mix)
+        self.deadline = deadline
+        self.recorder = recorder
+        self.args = args
+        self.trip = {
+            "type": "SRT", "dep": "수서", "arr": "부산",
+            "date": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d"),
+            "time": "06:00", "adults": "1",
+        }
+
+    def run(self) -> None:
+        while time.monotonic() < self.deadline:
+            getattr(self, random.choices(self.scenarios, self.weights)[0])()
+
+    def search(self) -> dict | None:
+        payload = http(self.base, "GET", "/api/search?" + parse.urlencode(self.trip), self.recorder, "search")
+        trains = payload.get("trains") or []
+        return random.choice(trains) if trains else None
+
+    def _reserve_form(self, train: dict) -> dict:
+        return dict(self.trip, train_number=train.get("train_number"), seat_type="GENERAL",
+                    handle=train.get("handle", ""))
+
+    def reserve(self) -> None:
+        train = self.search()
+        if train:
+            http(self.base, "POST", "/api/reserve", self.recorder, "reserve", self._reserve_form(train))
+
+    def auto_retry(self) -> None:
+        train = self.search()
+        if not train:
+            return
+        for _ in range(self.args.max_attempts):
+            payload = http(self.base, "POST", "/api/auto-retry", self.recorder, "auto_retry", self._reserve_form(train))
+            if not payload.get("retry") or time.monotonic() >= self.deadline:
+                return
+            time.sleep(self.args.retry_interval)
+
+    def reservations(self) -> None:
+        http(self.base, "GET", "/api/reservations", self.recorder, "reservations")
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = [s for s, _ in samples]
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 2),
+            "errors": sum(1 for _, ok in samples if not ok),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {"rps": round(total / elapsed, 2), "requests": total, "endpoints": endpoints}
+
+
+def read_worker_stats(stats_dir: Path) -> dict:
+    stats = {}
+    for path in stats_dir.glob("*.json"):
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        stats[entry["pid"]] = entry
+    return stats
+
+
+def worker_saturation(before: dict, after: dict, elapsed: float) -> list:
+    """Per worker: busy time over wall time, i.e. the average number of requests in flight
+    (1.0 saturates a sync worker)."""
+    workers = []
+    for pid, end in sorted(after.items()):
+        start = before.get(pid, {"busy": 0.0, "requests": 0})
+        workers.append({
+            "pid": pid,
+            "requests": end["requests"] - start["requests"],
+            "utilization": round((end["busy"] - start["busy"]) / elapsed, 2),
+            "max_in_flight": end["max_in_flight"],
+        })
+    return workers
+
+
+def wait_ready(base: str, proc: subprocess.Popen) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            urlrequest.urlopen(base + "/api/clock", timeout=2).read()
+            return
+        except urlerror.HTTPError:
+            return  # it answers
+        except (urlerror.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_mix(spec: str) -> list:
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("search", "reserve", "auto_retry", "reservations"):
+            raise SystemExit(f"Unknown scenario: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def run_model(model: str, args: argparse.Namespace, upstream: str) -> dict | None:
+    requires, command = MODELS[model]
+    missing = [name for name in requires if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"== {model}: skipped ({', '.join(missing)} not installed)")
+        return None
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    stats_dir = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    accounts = [{"id": f"loadtest{i}", "pw": "-", "rate": args.account_rate, "burst": args.account_rate * 2}
+                for i in range(args.accounts)]
+    env = dict(
+        os.environ, LOADTEST_UPSTREAM=upstream, LOADTEST_STATS_DIR=str(stats_dir),
+        SRT_ACCOUNTS=json.dumps(accounts), TRAIN_HANDLE_SECRET="loadtest",
+        PYTHONPATH=os.pathsep.join(filter(None, [str(BENCH_DIR), str(API_DIR), os.environ.get("PYTHONPATH")])),
+    )
+    proc = subprocess.Popen(command(port, args.workers), env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    levels = []
+    try:
+        wait_ready(base, proc)
+        mix = parse_mix(args.mix)
+        for concurrency in args.concurrency:
+            time.sleep(STATS_INTERVAL * 2)
+            before = read_worker_stats(stats_dir)
+            recorder = Recorder()
+            started = time.monotonic()
+            users = [VirtualUser(base, mix, started + args.duration, recorder, args) for _ in range(concurrency)]
+            for user in users:
+                user.start()
+            for user in users:
+                user.join()
+            elapsed = time.monotonic() - started
+            time.sleep(STATS_INTERVAL * 2)
+
+            level = dict(concurrency=concurrency, elapsed=round(elapsed, 2), **summarize(recorder, elapsed))
+            level["workers"] = worker_saturation(before, read_worker_stats(stats_dir), elapsed)
+            levels.append(level)
+            print_level(model, level)
+    except RuntimeError as ex:
+        stderr = proc.stderr.read() if proc.poll() is not None else ""
+        print(f"== {model}: failed ({ex}) {stderr.strip().splitlines()[-1:] if stderr else ''}")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(stats_dir, ignore_errors=True)
+    return {"model": model, "workers": args.workers, "levels": levels} if levels else None
+
+
+def print_level(model: str, level: dict) -> None:
+    print(f"== {model} c={level['concurrency']}: {level['rps']} req/s ({level['requests']} requests)")
+    for endpoint, e in level["endpoints"].items():
+        print(f"  {endpoint:<13} {e['rps']:>7} req/s  p50 {e['p50_ms']:>8} ms  p95 {e['p95_ms']:>8} ms  "
+              f"p99 {e['p99_ms']:>8} ms  errors {e['errors']}")
+    for w in level["workers"]:
+        print(f"  worker {w['pid']:<8} utilization {w['utilization']:>5}  max in flight {w['max_in_flight']}")
+
+
+def run(args: argparse.Namespace) -> None:
+    port = free_port()
+    upstream = f"http://127.0.0.1:{port}"
+    stub = subprocess.Popen([
+        sys.executable, __file__, "stub", "--port", str(port), "--latency", str(args.upstream_latency),
+        "--jitter", str(args.upstream_jitter), "--sold-out", str(args.sold_out),
+    ])
+    try:
+        time.sleep(0.5)
+        results = [r for r in (run_model(m, args, upstream) for m in args.models) if r]
+    finally:
+        stub.terminate()
+
+    if results and args.save:
+        out = Path(args.save)
+        out.mkdir(parents=True, exist_ok=True)
+        path = out / f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json"
+        settings = {k: v for k, v in vars(args).items() if k not in ("func",)}
+        path.write_text(json.dumps({"settings": settings, "results": results}, indent=2, ensure_ascii=False))
+        print(f"saved {path}")
+
+
+def compare(args: argparse.Namespace) -> None:
+    print(f"{'file':<32} {'model':<17} {'c':>4} {'req/s':>8} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'util':>6}")
+    for name in args.files:
+        report = json.loads(Path(name).read_text())
+        for result_ in report["results"]:
+            for level in result_["levels"]:
+                endpoints = level["endpoints"].values()
+                p95 = max((e["p95_ms"] for e in endpoints), default=0)
+                p99 = max((e["p99_ms"] for e in endpoints), default=0)
+                errors = sum(e["errors"] for e in endpoints)
+                util = statistics.mean([w["utilization"] for w in level["workers"]] or [0])
+                print(f"{Path(name).name:<32} {result_['model']:<17} {level['concurrency']:>4} "
+                      f"{level['rps']:>8} {p95:>9} {p99:>9} {errors:>7} {util:>6.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="start the stand-in and the API, and drive the load")
+    p.add_argument("--models", type=lambda s: s.split(","), default=list(MODELS))
+    p.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 8, 32, 64])
+    p.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    p.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    p.add_argument("--mix", default=DEFAULT_MIX)
+    p.add_argument("--upstream-latency", type=float, default=0.15)
+    p.add_argument("--upstream-jitter", type=float, default=0.05)
+    p.add_argument("--sold-out", type=float, default=0.7, help="share of reserves answered sold out")
+    p.add_argument("--accounts", type=int, default=4)
+    p.add_argument("--account-rate", type=float, default=50.0, help="upstream requests/s per account")
+    p.add_argument("--retry-interval", type=float, default=1.0)
+    p.add_argument("--max-attempts", type=int, default=10)
+    p.add_argument("--save", default=str(RESULTS_DIR))
+    p.set_defaults(func=run)
+
+    p = sub.add_parser("compare", help="tabulate saved results")
+    p.add_argument("files", nargs="+")
+    p.set_defaults(func=compare)
+
+    p = sub.add_parser("stub", help="run the SRT stand-in")
+    p.add_argument("--port", type=int, required=True)
+    p.add_argument("--latency", type=float, default=0.15)
+    p.add_argument("--jitter", type=float, default=0.05)
+    p.add_argument("--sold-out", type=float, default=0.7)
+    p.add_argument("--held", type=int, default=4, help="reservations kept in the reservation list")
+    p.add_argument("--trains", type=int, default=12, help="trains per search")
+    p.set_defaults(func=serve_stub)
+
+    p = sub.add_parser("serve", help="run the API under Werkzeug's threaded server")
+    p.add_argument("--port", type=int, required=True)
+    p.set_defaults(func=serve_threaded)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Microbenchmark for ``srt.SRTResponseData``.
+
+Compares, per payload:
+
+- ``legacy``: the previous ``SRTResponseData`` (``LegacyResponseData``),
+  ``json.loads`` of the whole body in the constructor and a defensive
+  ``get_all()`` copy per dataset access.
+- ``stdlib``: lazy parsing with ``json``, keeping only ``resultMap`` and the
+  datasets the caller asks for, read with ``get()`` (no copies).
+- ``orjson``: the same with orjson as the JSON backend (skipped when orjson is
+  not installed).
+
+Payloads are response bodies recorded from the SRT API, one per file
+(``--payloads DIR``; ``search*.json`` files are read like ``search_train``
+reads them, ``reservations*.json`` like ``get_reservations``). Without
+``--payloads`` synthetic bodies with the same shape are generated (a search
+with ``--rows`` trains and a reservation list).
+
+The cases are timed in turns (one batch of each per round) and the fastest
+round is reported, so drift on a busy machine hits every case alike.
+
+Usage:
+    python benchmarks/srt_response.py [--payloads DIR] [--rows 60] [--number 200] [--repeat 5]
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api"))
+
+import srt  # noqa: E402
+
+# How the client reads each kind of response: (datasets kept, accessed datasets)
+READS = {
+    "search": (("outDataSets",), ("outDataSets",)),
+    "reservations": (("trainListMap", "payListMap"), ("trainListMap", "payListMap")),
+}
+
+
+def synthetic_search(rows: int) -> str:
+    train = {
+        "stlbTrnClsfCd": "17", "trnNo": "00301", "dptDt": "20250101", "dptTm": "053000",
+        "dptRsStnCd": "0551", "dptStnRunOrdr": "000001", "dptStnConsOrdr": "000001",
+        "arvDt": "20250101", "arvTm": "080500", "arvRsStnCd": "0020",
+        "arvStnRunOrdr": "000009", "arvStnConsOrdr": "000009",
+        "gnrmRsvPsbStr": "매진", "sprmRsvPsbStr": "예약가능", "rsvWaitPsbCd": "9",
+        "rsvWaitPsbCdNm": "예약대기 신청", "trnGpCd": "300", "runDt": "20250101",
+        "ocurDlayTnum": "0", "dlayTnumAplFlg": "Y", "seatSelect": "Y",
+        "gnrmPsnrNum": "0", "sprmPsnrNum": "12", "trnCpsCd1": "A", "trnCpsCd2": "",
+    }
+    return json.dumps({
+        "resultMap": [{"strResult": "SUCC", "msgCd": "S111", "msgTxt": "정상적으로 조회 되었습니다."}],
+        "outDataSets": {
+            "dsOutput0": [{"strResult": "SUCC", "msgTxt": ""}],
+            "dsOutput1": [dict(train, trnNo=f"{301 + i:05d}") for i in range(rows)],
+        },
+        "trainListMap": [dict(train, trnNo=f"{301 + i:05d}", stopList="") for i in range(rows)],
+        "commonMap": {"key": "x" * 2048},
+    }, ensure_ascii=False)
+
+
+def synthetic_reservations(count: int = 4) -> str:
+    train = {"pnrNo": "310000", "rcvdAmt": "52600", "tkSpecNum": "1", "seatNum": "1", "rtnFlg": "N"}
+    pay = {
+        "stlbTrnClsfCd": "17", "trnNo": "00301", "dptDt": "20250101", "dptTm": "053000",
+        "dptRsStnCd": "0551", "arvTm": "080500", "arvRsStnCd": "0020",
+        "iseLmtDt": "20241231", "iseLmtTm": "235900", "stlFlg": "N",
+    }
+    return json.dumps({
+        "resultMap": [{"strResult": "SUCC", "msgTxt": ""}],
+        "trainListMap": [dict(train, pnrNo=f"{310000 + i}") for i in range(count)],
+        "payListMap": [pay] * count,
+        "commonMap": {"key": "x" * 1024},
+    }, ensure_ascii=False)
+
+
+def load_payloads(directory: str | None, rows: int) -> dict:
+    if not directory:
+        return {"search": synthetic_search(rows), "reservations": synthetic_reservations()}
+    payloads = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        kind = next((k for k in READS if path.stem.startswith(k)), None)
+        if kind:
+            payloads[path.stem] = path.read_text(encoding="utf-8")
+    if not payloads:
+        raise SystemExit(f"No search*.json or reservations*.json payloads in {directory}")
+    return payloads
+
+
+class LegacyResponseData:
+    """``srt.SRTResponseData`` before lazy parsing, as the baseline."""
+
+    def __init__(self, response: str) -> None:
+        self._json = json.loads(response)
+        self._status = self._parse()
+
+    def _parse(self) -> dict:
+        if "resultMap" in self._json:
+            return self._json["resultMap"][0]
+        raise ValueError("Unexpected case")
+
+    def success(self) -> bool:
+        return self._status.get("strResult") == "SUCC"
+
+    def get_all(self) -> dict:
+        return self._json.copy()
+
+
+def legacy(body: str, accessed: tuple) -> None:
+    parser = LegacyResponseData(body)
+    assert parser.success()
+    for key in accessed:
+        parser.get_all()[key]
+
+
+def lazy(body: str, kept: tuple, accessed: tuple) -> None:
+    parser = srt.SRTResponseData(body, datasets=kept)
+    assert parser.success()
+    for key in accessed:
+        parser.get(key)
+
+
+def backends() -> dict:
+    found = {"stdlib": json.loads}
+    try:
+        import orjson
+
+        found["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--payloads")
+    parser.add_argument("--rows", type=int, default=60)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    report = {}
+    for name, body in load_payloads(args.payloads, args.rows).items():
+        kept, accessed = READS[next(k for k in READS if name.startswith(k))]
+        cases = {"legacy": lambda: legacy(body, accessed)}
+        for backend, loads in backends().items():
+            def case(loads=loads):
+                srt._json_loads = loads
+                lazy(body, kept, accessed)
+
+            cases[backend] = case
+
+        report[name] = {}
+        print(f"== {name} ({len(body.encode()) / 1024:.1f} KiB)")
+        runs = {case_name: [] for case_name in cases}
+        for _ in range(args.repeat):
+            for case_name, fn in cases.items():
+                runs[case_name].append(timeit.timeit(fn, number=args.number))
+        for case_name in cases:
+            us = min(runs[case_name]) / args.number * 1e6
+            report[name][case_name] = round(us, 1)
+            speedup = report[name]["legacy"] / us
+            print(f"  {case_name:<8} {us:>9.1f} us/parse  x{speedup:.2f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
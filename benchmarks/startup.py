@@ -0,0 +1,118 @@
+"""Cold-start benchmark for the serverless API.
+
+Each scenario runs in a fresh interpreter under ``python -X importtime``:
+
+- ``app``: importing ``api/app.py``, which is what a cold start pays before
+  Flask can answer anything.
+- ``first_request``: importing the app and serving one request through the
+  Flask test client (this also triggers the warm-up hook).
+- ``booking``: importing the app plus the whole booking path (srt, ktx,
+  pycryptodome, curl_cffi, pywebpush), i.e. the pre-lazy-loading cost.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--top 15] [--json results.json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+
+SCENARIOS = {
+    "app": "import app",
+    "first_request": "import app; app.app.test_client().get('/api/vapid_public_key')",
+    "booking": (
+        "import app; import srt, ktx, transport; "
+        "import Crypto.Cipher.AES, Crypto.Util.Padding, pywebpush; "
+        "transport.new_session()"
+    ),
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> list:
+    """Return ``(module, self_us, cumulative_us, depth)`` tuples."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def run_scenario(code: str) -> dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=API_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    rows = parse_importtime(proc.stderr)
+    return {
+        "wall_ms": wall_ms,
+        "import_ms": sum(cum for _, _, cum, depth in rows if depth == 0) / 1000,
+        "rows": rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", dest="json_path")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.scenarios:
+        try:
+            runs = [run_scenario(SCENARIOS[name]) for _ in range(args.runs)]
+        except RuntimeError as ex:
+            print(f"{name}: failed ({ex})")
+            continue
+
+        # The breakdown comes from the run with the median wall time
+        runs.sort(key=lambda r: r["wall_ms"])
+        median = runs[len(runs) // 2]
+        top = sorted(
+            (row for row in median["rows"] if row[3] == 0), key=lambda r: r[2], reverse=True
+        )[: args.top]
+
+        report[name] = {
+            "wall_ms_median": round(statistics.median(r["wall_ms"] for r in runs), 1),
+            "import_ms_median": round(statistics.median(r["import_ms"] for r in runs), 1),
+            "top_imports": [
+                {"module": module, "self_ms": self_us / 1000, "cumulative_ms": cum / 1000}
+                for module, self_us, cum, _ in top
+            ],
+        }
+
+        print(
+            f"== {name}: wall {report[name]['wall_ms_median']} ms, "
+            f"imports {report[name]['import_ms_median']} ms (median of {args.runs})"
+        )
+        for entry in report[name]["top_imports"]:
+            print(f"  {entry['cumulative_ms']:>9.1f} ms  {entry['module']}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Idle long-poll watchers benchmark for ``api/asgi.py``.
+
+Starts the API under uvicorn (one process, ``loadtest:create_asgi``) against
+the SRT stand-in from ``loadtest.py``, whose searches here always answer the
+same seats, and parks ``--watchers`` long polls on one route of
+``/api/watch/availability`` with the current etag. While they wait it reports
+what they cost the server:
+
+- ``watchers``: waiters registered in ``watch.changes`` (``/api/asgi-status``);
+- ``threads`` and ``rss_mb``: of the uvicorn process, from ``/proc``;
+- ``cpu_s``: server CPU time spent while the watchers were idle;
+- ``searches``: upstream searches made meanwhile (the route is polled once
+  per ``availability`` tick, however many watch it);
+- ``early``: watchers answered before their timeout (should be 0, since the
+  seats never change).
+
+Then the stand-in starts answering free seats and it reports how many
+watchers the change woke (``woken``), how long the last one took and how many
+upstream searches that cost.
+
+Linux only (reads ``/proc``); needs uvicorn.
+
+Usage:
+    python benchmarks/watchers.py [--watchers 1000] [--hold 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer
+from urllib import parse
+from urllib import request as urlrequest
+
+from loadtest import API_DIR, BENCH_DIR, Upstream, free_port, stub_handler, wait_ready
+
+WATCH_TIMEOUT = 50  # seconds a watcher waits; above --hold so none returns while measured
+
+
+class SteadyUpstream(Upstream):
+    """The stand-in with seats that change only when told, counting searches."""
+
+    searches = 0
+    seats = "매진"
+
+    def search(self, form: dict) -> dict:
+        self.searches += 1
+        body = super().search(form)
+        for row in body["outDataSets"]["dsOutput1"]:
+            row["gnrmRsvPsbStr"] = self.seats
+        return body
+
+
+def proc_status(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.split()
+    with open(f"/proc/{pid}/stat") as f:
+        stat = f.read().rsplit(")", 1)[1].split()
+    return {
+        "threads": int(fields["Threads"][0]),
+        "rss_mb": round(int(fields["VmRSS"][0]) / 1024, 1),
+        "cpu_s": (int(stat[11]) + int(stat[12])) / os.sysconf("SC_CLK_TCK"),
+    }
+
+
+def get_json(base: str, path: str) -> dict:
+    with urlrequest.urlopen(base + path, timeout=30) as response:
+        return json.loads(response.read())
+
+
+async def watch(port: int, path: str, answered: list) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    try:
+        await reader.read()
+        answered.append(time.monotonic())
+    finally:
+        writer.close()
+
+
+async def hold(args: argparse.Namespace, port: int, path: str, sample, upstream: SteadyUpstream) -> dict:
+    answered: list = []
+    tasks = [asyncio.create_task(watch(port, path, answered)) for _ in range(args.watchers)]
+    await asyncio.sleep(args.settle)
+    before = await asyncio.to_thread(sample)
+    started = time.monotonic()
+    await asyncio.sleep(args.hold)
+    after = await asyncio.to_thread(sample)
+    elapsed = time.monotonic() - started
+    early = len(answered)
+
+    upstream.seats = "예약가능"
+    changed, searches = time.monotonic(), upstream.searches
+    _, pending = await asyncio.wait(tasks, timeout=args.wake_timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "watchers": after["watchers"],
+        "threads": after["threads"],
+        "rss_mb": after["rss_mb"],
+        "cpu_s": round(after["cpu_s"] - before["cpu_s"], 2),
+        "searches": after["searches"] - before["searches"],
+        "seconds": round(elapsed, 1),
+        "early": early,
+        "woken": len(answered) - early,
+        "wake_s": round(max(answered[early:], default=changed) - changed, 2),
+        "wake_searches": upstream.searches - searches,
+    }
+
+
+def run(args: argparse.Namespace) -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, args.watchers * 2 + 256)), hard))
+
+    upstream = SteadyUpstream(0.05, 0.0, 0.0, 4, 12)
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), stub_handler(upstream))
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ, LOADTEST_UPSTREAM=f"http://127.0.0.1:{stub.server_port}",
+        SRT_ACCOUNTS=json.dumps([{"id": "loadtest0", "pw": "-"}]), TRAIN_HANDLE_SECRET="loadtest",
+        PYTHONPATH=os.pathsep.join(filter(None, [str(BENCH_DIR), str(API_DIR), os.environ.get("PYTHONPATH")])),
+    )
+    proc = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "--factory", "--port", str(port), "--app-dir", str(BENCH_DIR),
+        "--log-level", "warning", "--backlog", str(args.watchers + 128), "loadtest:create_asgi",
+    ], env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(base, proc)
+        query = {
+            "type": "SRT", "dep": "수서", "arr": "부산",
+            "date": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d"), "time": "06:00",
+        }
+        first = get_json(base, "/api/watch/availability?" + parse.urlencode(dict(query, timeout=0)))
+        path = "/api/watch/availability?" + parse.urlencode(dict(query, etag=first["etag"], timeout=WATCH_TIMEOUT))
+
+        def sample() -> dict:
+            return dict(proc_status(proc.pid), searches=upstream.searches,
+                        watchers=get_json(base, "/api/asgi-status")["watchers"])
+
+        idle = sample()
+        print(f"baseline: threads {idle['threads']}  rss {idle['rss_mb']} MB")
+        report = asyncio.run(hold(args, port, path, sample, upstream))
+        print(f"{args.watchers} watchers for {report['seconds']} s: registered {report['watchers']}  "
+              f"threads {report['threads']}  rss {report['rss_mb']} MB  cpu {report['cpu_s']} s  "
+              f"upstream searches {report['searches']}  answered early {report['early']}")
+        print(f"seats freed: woke {report['woken']}/{args.watchers} within {report['wake_s']} s  "
+              f"upstream searches {report['wake_searches']}")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        stub.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--watchers", type=int, default=1000)
+    parser.add_argument("--hold", type=float, default=20.0, help="seconds measured while the watchers wait")
+    parser.add_argument("--settle", type=float, default=3.0, help="seconds to let every watcher connect")
+    parser.add_argument("--wake-timeout", type=float, default=15.0, help="seconds to wait for the change to wake them")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
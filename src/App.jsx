@@ -130,14 +130,17 @@ function SearchAndBookingFlow() {
     const [searchParams, setSearchParams] = useState(null);
     const [searchResults, setSearchResults] = useState([]);
     const [autoRetryData, setAutoRetryData] = useState(null);
+    // 예약 의도(열차·좌석 등급)마다 멱등성 키 하나를 씁니다. 두 번 누르거나 자동 재시도가 겹쳐도 같은 키를 보내므로
+    // 서버가 이미 성공한 예약을 다시 보내지 않고 그 결과를 돌려줍니다. 예약이 끝나거나 재시도를 취소하면 지웁니다.
+    const bookingKeys = useRef({});
     const [reservationResult, setReservationResult] = useState(null); // Used for the popup
     const [favorites, setFavorites] = useState([]);
 
     useEffect(() => {
         // 브라우저가 서비스 워커와 알림 기능을 지원하는지 확인
         if ('serviceWorker' in navigator && 'Notification' in window) {
-            // 사용자에게 아직 권한을 묻지 않은 상태('default')일 때만 요청
-            if (Notification.permission === 'default') {
+            // 아직 권한을 묻지 않았으면 요청하고, 이미 허용했으면 서버에 구독을 다시 등록
+            if (Notification.permission !== 'denied') {
                 subscribeUserToPush();
             }
         }
@@ -173,13 +176,47 @@ function SearchAndBookingFlow() {
     };
 
     useEffect(() => {
+        if (!autoRetryData) return;
+        // 다시 예약을 시도하기 전에 좌석 상태를 감시합니다. 서버(asgi.py)는 좌석 상태가 바뀔 때까지 응답을 붙잡아 두므로
+        // 브라우저가 검색을 반복하지 않아도 되고, 같은 구간을 보는 사용자들은 서버의 구간 검색 하나를 나눠 씁니다.
+        const { train, seatType } = autoRetryData;
+        const trainNumber = train.train_number || train.train_no;
+        const seatKey = seatType === 'GENERAL' ? 'general' : 'special';
+        const startedAt = Date.now();
+        const controller = new AbortController();
         let timer;
-        if (autoRetryData) {
-            timer = setTimeout(() => {
-                handleReserve(autoRetryData.train, autoRetryData.seatType, true);
-            }, 5000);
-        }
-        return () => clearTimeout(timer);
+
+        // 좌석이 보이면 시도하되, 직전 시도에서 5초는 지나야 합니다(오래된 상태로 연달아 시도하지 않도록).
+        const retry = () => {
+            timer = setTimeout(() => handleReserve(train, seatType, true), Math.max(0, 5000 - (Date.now() - startedAt)));
+        };
+
+        const watchSeats = async (etag) => {
+            const query = new URLSearchParams({
+                type: searchParams.type, dep: searchParams.dep, arr: searchParams.arr,
+                date: searchParams.date, time: searchParams.time, train: trainNumber, timeout: 25,
+            });
+            if (etag) query.set('etag', etag);
+            try {
+                const response = await fetch(`/api/watch/availability?${query}`, { signal: controller.signal });
+                const data = await response.json();
+                if (!response.ok) throw new Error(data.error_message);
+                if (data.trains?.[trainNumber]?.[seatKey]) {
+                    retry();
+                } else {
+                    // WSGI 서버는 기다리지 않고 바로 응답하므로, 바뀐 것이 없으면 잠시 쉬었다가 다시 묻습니다.
+                    timer = setTimeout(() => watchSeats(data.etag), data.changed ? 0 : 3000);
+                }
+            } catch (err) {
+                // 감시를 쓸 수 없으면 예전처럼 5초 뒤 예약을 다시 시도합니다.
+                if (!controller.signal.aborted) retry();
+            }
+        };
+        watchSeats(null);
+        return () => {
+            controller.abort();
+            clearTimeout(timer);
+        };
     }, [autoRetryData]);
 
     const handleSearch = async (e) => {
@@ -222,13 +259,20 @@ function SearchAndBookingFlow() {
             ...searchParams,
             train_number: train.train_number || train.train_no,
             seat_type: seatType,
+            handle: train.handle || '',
         };
         const endpoint = isRetry ? '/api/auto-retry' : '/api/reserve';
+        const intent = `${body.train_number}|${seatType}`;
+        bookingKeys.current[intent] ||= crypto.randomUUID();
+        const finish = () => { delete bookingKeys.current[intent]; };
 
         try {
             const response = await fetch(endpoint, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+                headers: {
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                    'Idempotency-Key': bookingKeys.current[intent],
+                },
                 body: new URLSearchParams(body),
             });
             const result = await response.json();
@@ -239,17 +283,20 @@ function SearchAndBookingFlow() {
                  setAutoRetryData({ train, seatType, attempt });
                  setView('autoRetry');
             } else if (result.reservation) {
+                finish();
                 setAutoRetryData(null);
                 playSuccessSound();
                 setReservationResult({ success: true, data: result.reservation });
                 setView('results'); // Prevent crash
                 setIsLoading(false);
             } else {
+                 finish();
                  setAutoRetryData(null);
                  setReservationResult({ success: false, message: result.error_message || '알 수 없는 오류가 발생했습니다.' });
                  setIsLoading(false);
             }
         } catch (err) {
+            finish();
             setAutoRetryData(null);
             setReservationResult({ success: false, message: err.message });
             setIsLoading(false);
@@ -259,7 +306,7 @@ function SearchAndBookingFlow() {
     const renderMainView = () => {
         switch (view) {
             case 'results': return <ResultsView data={searchResults} onReserve={handleReserve} onBack={() => setView('search')} isLoading={isLoading} />;
-            case 'autoRetry': return <AutoRetryView key={autoRetryData?.attempt} train={autoRetryData?.train} searchParams={searchParams} onCancel={() => { setAutoRetryData(null); setView('results'); setIsLoading(false); }} />;
+            case 'autoRetry': return <AutoRetryView key={autoRetryData?.attempt} train={autoRetryData?.train} searchParams={searchParams} onCancel={() => { bookingKeys.current = {}; setAutoRetryData(null); setView('results'); setIsLoading(false); }} />;
             default: return <SearchForm onSubmit={handleSearch} isLoading={isLoading} favorites={favorites} onAddFavorite={addFavorite} onRemoveFavorite={removeFavorite} />;
         }
     };
@@ -313,7 +360,7 @@ function ReservationsScreen() {
         fetchReservations();
     }, []);
 
-    const handleCancel = async (pnr_no, train_type, is_ticket) => {
+    const handleCancel = async (pnr_no, train_type, is_ticket, account) => {
         if (!pnr_no || !train_type) {
             alert('오류: 취소에 필요한 예약번호 또는 열차 종류 정보가 없습니다.');
             return;
@@ -324,7 +371,7 @@ function ReservationsScreen() {
         setError('');
         setMessage('');
         try {
-            const body = new URLSearchParams({ pnr_no, train_type, is_ticket: String(is_ticket === true) });
+            const body = new URLSearchParams({ pnr_no, train_type, is_ticket: String(is_ticket === true), account: account || '' });
             const response = await fetch('/api/cancel', { method: 'POST', body });
             const result = await response.json();
             if (!response.ok) throw new Error(result.error_message || '취소 중 오류 발생');
@@ -701,7 +748,7 @@ function ReservationCard({ reservation, type, onCancel, onPay, isLoading }) {
                         </button>
                     )}
                     <button 
-                        onClick={() => onCancel(pnrNo, type, isTicket)} 
+                        onClick={() => onCancel(pnrNo, type, isTicket, reservation.account)} 
                         disabled={isLoading} 
                         className="flex-1 bg-red-600 text-white font-bold py-2 px-4 rounded-lg hover:bg-red-700 transition disabled:bg-slate-400"
                     >
@@ -784,6 +831,7 @@ function PaymentModal({ reservation, trainType, onClose, onSubmit, isLoading })
         const paymentDetails = Object.fromEntries(formData.entries());
         paymentDetails.pnr_no = pnrNo;
         paymentDetails.train_type = trainType;
+        paymentDetails.account = reservation.account || '';
         onSubmit(paymentDetails);
     };
 
@@ -868,14 +916,6 @@ function ResultMessage({ result, onBack }) {
 
 
 function AutoRetryView({ train, searchParams, onCancel }) {
-    const [countdown, setCountdown] = useState(5);
-    useEffect(() => {
-        if (countdown > 0) {
-            const timer = setTimeout(() => setCountdown(countdown - 1), 1000);
-            return () => clearTimeout(timer);
-        }
-    }, [countdown]);
-
     return (
         <div className="text-center p-4">
             <div className="animate-spin rounded-full h-16 w-16 border-b-4 border-blue-600 mx-auto mb-6"></div>
@@ -884,7 +924,7 @@ function AutoRetryView({ train, searchParams, onCancel }) {
             <div className="bg-slate-50 p-4 rounded-lg shadow-inner border">
                 <p className="font-semibold text-slate-800 text-lg">{train.dep_station_name || train.dep_name} → {train.arr_station_name || train.arr_name}</p>
                 <p className="text-slate-500 text-sm">{searchParams.date} {searchParams.time}</p>
-                <p className="mt-4 font-bold text-blue-600 text-lg">{countdown}초 후 다시 시도합니다.</p>
+                <p className="mt-4 font-bold text-blue-600 text-lg">좌석이 생기면 바로 다시 시도합니다.</p>
             </div>
             <button onClick={onCancel} className="mt-8 w-full bg-slate-500 text-white font-bold py-3 px-4 rounded-lg hover:bg-slate-600 transition duration-300">중단하기</button>
         </div>
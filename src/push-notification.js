@@ -21,24 +21,28 @@ export async function subscribeUserToPush() {
       let subscription = await registration.pushManager.getSubscription();
       if (subscription) {
         console.log("User IS already subscribed.");
-        return; // 이미 구독 상태이면 조용히 종료
+      } else {
+        const response = await fetch('/api/vapid_public_key');
+        const vapidPublicKey = await response.text();
+        const convertedVapidKey = urlBase64ToUint8Array(vapidPublicKey);
+  
+        subscription = await registration.pushManager.subscribe({
+          userVisibleOnly: true,
+          applicationServerKey: convertedVapidKey,
+        });
       }
   
-      const response = await fetch('/api/vapid_public_key');
-      const vapidPublicKey = await response.text();
-      const convertedVapidKey = urlBase64ToUint8Array(vapidPublicKey);
-  
-      subscription = await registration.pushManager.subscribe({
-        userVisibleOnly: true,
-        applicationServerKey: convertedVapidKey,
-      });
-  
+      // 이미 구독 중이어도 다시 등록합니다. 서버는 기기별로 덮어쓰므로 중복되지 않고,
+      // 서버가 재시작되었거나 만료된 구독을 지운 경우에도 다시 알림을 받을 수 있습니다.
+      // 사용자는 watcher 쿠키로 정해지므로(없으면 서버가 발급) 쿠키를 함께 보냅니다.
+      // 같은 쿠키가 실린 예약 요청의 알림만 이 기기로 옵니다.
       await fetch("/api/subscribe", {
         method: "POST",
+        credentials: "same-origin",
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify(subscription),
+        body: JSON.stringify({ subscription }),
       });
   
       console.log("User is subscribed.");